@@ -1,20 +1,60 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Dict, List, Optional
 
 class ChatRequest(BaseModel):
     question: str
-    user_id: Optional[int] = None
+    session_id: Optional[int] = None
+    # Required to continue an anonymous session
+    session_token: Optional[str] = None
 
 class ChatResponse(BaseModel):
     answer: str
     sources: List[str]
     disclaimer: str
+    session_id: Optional[int] = None
+    session_token: Optional[str] = None
+
+class ChatSessionResponse(BaseModel):
+    id: int
+    title: Optional[str] = None
+    summary: Optional[str] = None
+    message_count: int
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class ChatMessageResponse(BaseModel):
+    id: int
+    role: str
+    content: str
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class ChatSessionPage(BaseModel):
+    items: List[ChatSessionResponse]
+    next_before_id: Optional[int] = None
+
+class ChatMessagePage(BaseModel):
+    items: List[ChatMessageResponse]
+    next_before_id: Optional[int] = None
 
 class TaxAdviceRequest(BaseModel):
     revenue: float
     expenses: float
     business_type: str = "food_service"
+    # Capped at ADVICE_MAX_BUDGET_MS
+    ai_budget_ms: Optional[int] = Field(None, ge=0)
+    defer_ai: bool = True
 
 class TaxAdviceResponse(BaseModel):
     advice: List[str]
     recommendation: str
+    advice_id: Optional[str] = None
+    ai_status: str = "complete"
+    ai_error: Optional[str] = None
+    timings: Dict[str, float] = {}
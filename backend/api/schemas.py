@@ -1,6 +1,7 @@
 from pydantic import BaseModel
+import datetime
 from datetime import date
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 class InvoiceItem(BaseModel):
     name: str
@@ -12,20 +13,68 @@ class InvoiceCreate(BaseModel):
     invoice_type: str
     invoice_number: Optional[str] = None
     seller_name: Optional[str] = None
+    seller_tax_code: Optional[str] = None
     buyer_name: Optional[str] = None
+    buyer_tax_code: Optional[str] = None
     date: date
     subtotal: float = 0
     vat: float = 0
     total: float
     payment_method: Optional[str] = None
     items: Optional[List[InvoiceItem]] = None
+    business_type: Optional[str] = None
 
 class InvoiceResponse(InvoiceCreate):
     id: int
+    confidence: Optional[float] = None
+    review_status: Optional[str] = None
     
     class Config:
         from_attributes = True
 
+class InvoiceUploadResponse(InvoiceResponse):
+    # How the fields were extracted: source, path taken and timings
+    extraction: Optional[dict] = None
+
+class InvoiceSearchResult(InvoiceResponse):
+    score: float
+    snippet: Optional[str] = None
+
+class InvoiceReviewRequest(BaseModel):
+    # Corrected values; fields left out keep what OCR extracted
+    invoice_number: Optional[str] = None
+    seller_name: Optional[str] = None
+    seller_tax_code: Optional[str] = None
+    # Qualified: a field named date shadows the type once it defaults to None
+    date: Optional[datetime.date] = None
+    subtotal: Optional[float] = None
+    vat: Optional[float] = None
+    total: Optional[float] = None
+    items: Optional[List[InvoiceItem]] = None
+
+class EInvoiceImportError(BaseModel):
+    source: str
+    error: str
+    duplicate_of: Optional[int] = None
+
+class EInvoiceImportResponse(BaseModel):
+    imported: List[InvoiceResponse]
+    errors: List[EInvoiceImportError]
+
+class DirectUploadRequest(BaseModel):
+    content_type: str
+    size: Optional[int] = None
+
+class DirectUploadResponse(BaseModel):
+    upload_id: str
+    url: str
+    fields: Dict[str, str]
+    expires_in: int
+
+class FinalizeUploadRequest(BaseModel):
+    business_type: Optional[str] = None
+    allow_duplicate: bool = False
+
 class ExpenseCreate(BaseModel):
     invoice_id: Optional[int] = None
     category: str
@@ -44,6 +93,7 @@ class TaxCalculationRequest(BaseModel):
     revenue: float
     expenses: float
     business_type: str = "food_service"
+    tax_year: Optional[int] = None
 
 class TaxCalculationResponse(BaseModel):
     estimated_revenue: float
@@ -51,3 +101,90 @@ class TaxCalculationResponse(BaseModel):
     estimated_tax: dict
     notes: List[str]
     disclaimer: str
+
+class TaxBreakdown(BaseModel):
+    vat: float
+    pit: float
+    license_fee: float
+    total: float
+
+class BusinessTypeLiability(BaseModel):
+    business_type: str
+    revenue: float
+    deductible_expenses: float
+    vat_rate: float
+    pit_rate: float
+    # Household revenue at or below the threshold: no VAT/PIT, only the license fee
+    exempt: bool = False
+    estimated_tax: TaxBreakdown
+
+class QuarterLiability(BaseModel):
+    quarter: int
+    revenue: float
+    deductible_expenses: float
+    estimated_tax: TaxBreakdown
+
+class TaxLiabilityResponse(BaseModel):
+    year: int
+    quarter: Optional[int] = None
+    period_start: date
+    period_end: date
+    rules_version: str
+    revenue: float
+    deductible_expenses: float
+    by_business_type: List[BusinessTypeLiability]
+    estimated_tax: TaxBreakdown
+    quarters: List[QuarterLiability]
+    disclaimer: str
+
+class TopItem(BaseModel):
+    name: str
+    normalized_name: str
+    category: str
+    count: int
+    quantity: float
+    amount: float
+    average_unit_price: float
+
+class CategorySpendPoint(BaseModel):
+    period: str
+    year: int
+    category: str
+    count: int
+    amount: float
+
+class DashboardCounts(BaseModel):
+    invoices: int
+    sale_invoices: int
+    purchase_invoices: int
+    expenses: int
+    revenue: float
+    expense_total: float
+    profit: float
+
+class RecentInvoice(BaseModel):
+    id: int
+    invoice_type: str
+    invoice_number: Optional[str] = None
+    seller_name: Optional[str] = None
+    date: date
+    total: float
+
+class CategoryTotal(BaseModel):
+    category: str
+    count: int
+    total: float
+
+class MonthlyTrendPoint(BaseModel):
+    year: int
+    month: int
+    revenue: float
+    purchases: float
+    expenses: float
+
+class DashboardResponse(BaseModel):
+    counts: DashboardCounts
+    recent_invoices: List[RecentInvoice]
+    category_totals: List[CategoryTotal]
+    monthly_trend: List[MonthlyTrendPoint]
+    tax_estimate: TaxLiabilityResponse
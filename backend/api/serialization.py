@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+from datetime import date, datetime
+import enum
+from functools import lru_cache
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+if not ORJSON_AVAILABLE:
+    logger.warning("⚠️ orjson is not installed, list responses use the much slower stdlib encoder (pip install -r requirements.txt)")
+
+# Rows we wrote ourselves already match the response schemas; set to 0 to validate them anyway
+TRUSTED_SERIALIZATION = os.getenv("TRUSTED_SERIALIZATION", "1") == "1"
+# Responses at least this large are gzipped when the client accepts it; 0 disables compression
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "0"))
+
+def _default(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when installed, the stdlib encoder otherwise"""
+
+    def render(self, content):
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(content, default=_default)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+@lru_cache(maxsize=None)
+def type_adapter(schema):
+    """One TypeAdapter per schema; building them is far more expensive than using them"""
+    return TypeAdapter(schema)
+
+def schema_columns(model, schema):
+    """The model columns backing a response schema, in field order"""
+    return [getattr(model, name) for name in schema.model_fields]
+
+def select_dicts(db, schema, model, *criteria, converters=None):
+    """Column-only select of a schema's fields straight into dicts, skipping ORM objects"""
+    statement = select(*schema_columns(model, schema)).where(*criteria).order_by(model.id)
+    rows = [dict(row._mapping) for row in db.execute(statement)]
+    if converters:
+        for row in rows:
+            for name, convert in converters.items():
+                if row[name] is not None:
+                    row[name] = convert(row[name])
+    return rows
+
+def list_response(rows, schema, headers=None):
+    """Serialize trusted rows directly; validate them through a cached adapter when not trusted"""
+    if not TRUSTED_SERIALIZATION:
+        adapter = type_adapter(list[schema])
+        rows = adapter.dump_python(adapter.validate_python(rows), mode="json")
+    return FastJSONResponse(rows, headers=headers)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""
+Archive old receipt images: recompress originals older than ARCHIVE_AFTER_DAYS
+into the archive tier, keep a thumbnail, and repoint Invoice.image_path.
+Safe to run repeatedly (e.g. nightly from cron).
+
+Usage: python archive_uploads.py [--older-than DAYS] [--limit N] [--dry-run]
+"""
+import argparse
+import logging
+
+from db.database import SessionLocal, init_db
+from services.storage.archiver import UploadArchiver, ARCHIVE_AFTER_DAYS
+from services.storage.upload_store import UploadStore
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old receipt images")
+    parser.add_argument("--older-than", type=int, default=ARCHIVE_AFTER_DAYS, help="age in days (invoice date)")
+    parser.add_argument("--limit", type=int, default=None, help="archive at most this many images")
+    parser.add_argument("--dry-run", action="store_true", help="only list what would be archived")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    init_db()
+    archiver = UploadArchiver(UploadStore(), after_days=args.older_than)
+    db = SessionLocal()
+    try:
+        stats = archiver.run(db, limit=args.limit, dry_run=args.dry_run)
+    finally:
+        db.close()
+
+    if stats["bytes_before"]:
+        ratio = stats["bytes_before"] / max(stats["bytes_after"], 1)
+        print(f"✅ Archived {stats['archived']}/{stats['images']} images, "
+              f"{stats['bytes_before']} -> {stats['bytes_after']} bytes ({ratio:.1f}x smaller)")
+    else:
+        print(f"✅ {stats['images']} images to archive, {stats['failed']} failed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+"""
+Fill the invoice_items table from Invoice.items for invoices saved before it
+existed. New and edited invoices are kept in sync automatically; running this
+again rebuilds every invoice's rows, so it is safe to repeat.
+
+Usage: python backfill_invoice_items.py [--batch-size N]
+"""
+import argparse
+import logging
+
+from db.database import SessionLocal, init_db
+from services.invoice.line_items import LineItemIndex
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the invoice_items table")
+    parser.add_argument("--batch-size", type=int, default=1000, help="invoices per commit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    init_db()
+    db = SessionLocal()
+    try:
+        stats = LineItemIndex().backfill(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+
+    print(f"✅ Indexed {stats['items']} line items from {stats['invoices']} invoices")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+"""
+Check the amount lexer against the regex-based _normalize_amount it replaced,
+then benchmark both. Random amount strings in every shape OCR produces
+(grouped by dots, commas or spaces, decimal, mixed, glued, padded with
+whitespace, with currency suffixes) are generated from a
+fixed seed. Every string the lexer reads must match the old value; strings it
+reports as ambiguous are counted by reason next to the value the old code
+guessed.
+
+Usage: python benchmark_amounts.py [tokens]
+"""
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+from services.ocr.amount_lexer import AmountLexer
+
+SUFFIXES = ["", "", "", "đ", " đ", "VNĐ", " VNĐ", " vnd", " dong"]
+
+def legacy_normalize_amount(amount_str):
+    """OCRService._normalize_amount before the lexer, minus its logging"""
+    if not amount_str:
+        return 0.0
+    amount_str = str(amount_str).strip()
+    amount_str = re.sub(r'[VNĐđdD\s]', '', amount_str, flags=re.IGNORECASE)
+    amount_str = re.sub(r'[^\d,\.]', '', amount_str)
+    if not amount_str:
+        return 0.0
+    digits_only = re.sub(r'[^\d]', '', amount_str)
+    if len(digits_only) > 10:
+        if '.' in amount_str or ',' in amount_str:
+            parts = re.split(r'[,\.]', amount_str)
+            for part in reversed(parts):
+                part_digits = re.sub(r'[^\d]', '', part)
+                if 4 <= len(part_digits) <= 8:
+                    amount_str = part
+                    digits_only = part_digits
+                    break
+            else:
+                digits_only = digits_only[-8:]
+                amount_str = digits_only
+        else:
+            digits_only = digits_only[-8:]
+            amount_str = digits_only
+    if '.' in amount_str and ',' in amount_str:
+        dot_count = amount_str.count('.')
+        comma_count = amount_str.count(',')
+        if dot_count == 1 and comma_count == 1:
+            if amount_str.find('.') < amount_str.find(','):
+                amount_str = amount_str.replace('.', '').replace(',', '.')
+            else:
+                amount_str = amount_str.replace(',', '')
+        else:
+            parts = re.split(r'[,\.]', amount_str)
+            if len(parts) > 1 and len(parts[-1]) <= 2:
+                amount_str = ''.join(parts[:-1]) + '.' + parts[-1]
+            else:
+                amount_str = amount_str.replace('.', '').replace(',', '')
+    elif '.' in amount_str:
+        parts = amount_str.split('.')
+        if len(parts) == 2:
+            if len(parts[1]) > 2:
+                amount_str = amount_str.replace('.', '')
+        elif len(parts[-1]) <= 2:
+            amount_str = ''.join(parts[:-1]) + '.' + parts[-1]
+        else:
+            amount_str = amount_str.replace('.', '')
+    elif ',' in amount_str:
+        parts = amount_str.split(',')
+        if len(parts) == 2:
+            if len(parts[1]) == 3:
+                amount_str = amount_str.replace(',', '')
+            elif len(parts[1]) <= 2:
+                amount_str = amount_str.replace(',', '.')
+            else:
+                amount_str = amount_str.replace(',', '')
+        elif len(parts) > 2:
+            if len(parts[-1]) <= 2:
+                amount_str = ''.join(parts[:-1]) + '.' + parts[-1]
+            else:
+                amount_str = amount_str.replace(',', '')
+        else:
+            amount_str = amount_str.replace(',', '')
+    try:
+        result = float(amount_str)
+        return result if result > 0 else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+def grouped(value, separator):
+    text = f"{value:,}"
+    return text.replace(",", separator)
+
+def random_amount(rng):
+    shape = rng.random()
+    value = rng.randint(0, 10 ** rng.randint(1, 9))
+    separator = rng.choice(".,")
+    if shape < 0.2:
+        text = str(value)
+    elif shape < 0.45:
+        text = grouped(value, separator)
+    elif shape < 0.55:
+        # Grouped by spaces ("68 391"), no-break ones included, sometimes with a decimal part
+        text = grouped(value, rng.choice([" ", "\u00a0"]))
+        if rng.random() < 0.3:
+            text += f"{separator}{rng.randint(0, 99):02d}"
+    elif shape < 0.65:
+        text = f"{value}{separator}{rng.randint(0, 99):0{rng.randint(1, 2)}d}"
+    elif shape < 0.75:
+        decimal = "," if separator == "." else "."
+        text = f"{grouped(value, separator)}{decimal}{rng.randint(0, 99):02d}"
+    elif shape < 0.85:
+        # Two amounts glued together by OCR
+        text = grouped(value, separator) + grouped(rng.randint(1000, 10 ** 7), separator)
+    else:
+        # Irregular grouping
+        digits = str(value) + str(rng.randint(0, 9999))
+        cut = rng.randint(1, max(1, len(digits) - 1))
+        text = f"{digits[:cut]}{separator}{digits[cut:]}"
+    text += rng.choice(SUFFIXES)
+    if rng.random() < 0.1:
+        # Cells cut out of a table keep the whitespace around them
+        text = f"{' ' * rng.randint(1, 3)}{text}{' ' * rng.randint(0, 2)}"
+    return text
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    rng = random.Random(20240506)
+    tokens = [random_amount(rng) for _ in range(count)]
+    lexer = AmountLexer()
+
+    agreed, mismatches = 0, []
+    ambiguous = Counter()
+    for text in tokens:
+        token = lexer.parse(text)
+        old = legacy_normalize_amount(text)
+        if token.ambiguity:
+            ambiguous[token.ambiguity] += 1
+        elif (token.value if token.value > 0 else 0.0) == old:
+            agreed += 1
+        else:
+            mismatches.append((text, token.value, old))
+
+    print(f"🔢 {count} amount strings: {agreed} identical, {sum(ambiguous.values())} ambiguous, {len(mismatches)} different")
+    for reason, number in ambiguous.most_common():
+        print(f"   ambiguous {reason:<20} {number}")
+
+    for name, fn in (("legacy", legacy_normalize_amount), ("lexer", lexer.value)):
+        started = time.perf_counter()
+        for text in tokens:
+            fn(text)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<8} {elapsed * 1000:9.1f} ms   {elapsed / count * 1e9:7.1f} ns/token")
+
+    if mismatches:
+        for text, new, old in mismatches[:20]:
+            print(f"❌ {text!r}: lexer {new}, legacy {old}")
+        sys.exit(1)
+    print("✅ Every unambiguous amount matches the legacy parser")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Benchmark list serialization: the response_model path (ORM objects validated by
+Pydantic, then the stdlib JSON encoder) against the trusted path (column-only
+select into dicts, then orjson). Runs on a throwaway SQLite database.
+
+Usage: python benchmark_serialization.py [rows]
+"""
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from api.schemas import InvoiceResponse
+from api.serialization import ORJSON_AVAILABLE, FastJSONResponse, select_dicts, type_adapter
+from db.models import Base, Invoice, InvoiceType
+
+def seed(session, rows):
+    items = [
+        {"name": "Cà phê sữa đá", "quantity": 2.0, "unit_price": 25000.0, "amount": 50000.0},
+        {"name": "Bánh mì thịt", "quantity": 1.0, "unit_price": 20000.0, "amount": 20000.0},
+    ]
+    start = date(2024, 1, 1)
+    session.execute(insert(Invoice), [
+        {
+            "invoice_type": InvoiceType.SALE if i % 3 else InvoiceType.PURCHASE,
+            "invoice_number": f"HD{i:07d}",
+            "seller_name": "Cửa hàng Minh Anh",
+            "date": start + timedelta(days=i % 365),
+            "subtotal": 63636.0,
+            "vat": 6364.0,
+            "total": 70000.0,
+            "payment_method": "cash",
+            "items": items,
+            "user_id": 1,
+        }
+        for i in range(rows)
+    ])
+    session.commit()
+
+def response_model_path(session):
+    """What FastAPI does for response_model=list[InvoiceResponse] with ORM objects"""
+    adapter = type_adapter(list[InvoiceResponse])
+    invoices = session.query(Invoice).all()
+    content = adapter.dump_python(adapter.validate_python(invoices, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def trusted_path(session):
+    return FastJSONResponse(select_dicts(session, InvoiceResponse, Invoice)).body
+
+def measure(name, fn, session_factory, repeat):
+    timings = []
+    for _ in range(repeat):
+        session = session_factory()
+        started = time.perf_counter()
+        body = fn(session)
+        timings.append((time.perf_counter() - started) * 1000)
+        session.close()
+
+    session = session_factory()
+    tracemalloc.start()
+    fn(session)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    session.close()
+
+    print(f"{name:<16} best {min(timings):8.1f} ms   median {sorted(timings)[len(timings) // 2]:8.1f} ms   "
+          f"peak {peak / 1024 / 1024:7.1f} MiB   body {len(body) / 1024 / 1024:6.1f} MiB   "
+          f"gzip {len(gzip.compress(body, 6)) / 1024 / 1024:6.1f} MiB")
+    return body
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    repeat = 5
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+        session = session_factory()
+        seed(session, rows)
+        session.close()
+
+        print(f"📊 {rows} invoices, best/median of {repeat} runs, orjson={'yes' if ORJSON_AVAILABLE else 'no'}")
+        baseline = measure("response_model", response_model_path, session_factory, repeat)
+        fast = measure("trusted", trusted_path, session_factory, repeat)
+        if json.loads(baseline) != json.loads(fast):
+            print("❌ Outputs differ")
+            sys.exit(1)
+        print("✅ Outputs are identical")
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime, Index, JSON
+from datetime import datetime
+from .database import Base
+
+class ChatSession(Base):
+    __tablename__ = "chat_sessions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=True)
+    # Anonymous sessions are resumed with this secret instead of a user
+    token = Column(String(64), nullable=True)
+    title = Column(String, nullable=True)
+    # Running summary of every message up to and including summarized_until
+    summary = Column(Text, nullable=True)
+    summarized_until = Column(Integer, default=0, nullable=False)
+    summarized_count = Column(Integer, default=0, nullable=False)
+    message_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_chat_sessions_user_id_id", "user_id", "id"),
+    )
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, nullable=False)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_chat_messages_session_id_id", "session_id", "id"),
+    )
+
+class AdviceResult(Base):
+    """AI advice that missed its request's budget; fetched later, possibly by another worker"""
+    __tablename__ = "advice_results"
+    
+    id = Column(String(32), primary_key=True)
+    revenue = Column(Float, nullable=False)
+    rule_advice = Column(JSON, nullable=False)
+    # Written by the worker running the AI call once it finishes
+    ai_status = Column(String(16), nullable=False, default="pending")
+    ai_advice = Column(JSON, nullable=True)
+    ai_error = Column(Text, nullable=True)
+    timings = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, Date, JSON, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, JSON, Index, LargeBinary, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
-from datetime import date
+from datetime import date, datetime
 import enum
 
 Base = declarative_base()
@@ -16,7 +16,9 @@ class Invoice(Base):
     invoice_type = Column(SQLEnum(InvoiceType), nullable=False)
     invoice_number = Column(String, nullable=True)
     seller_name = Column(String, nullable=True)
+    seller_tax_code = Column(String, nullable=True)
     buyer_name = Column(String, nullable=True)
+    buyer_tax_code = Column(String, nullable=True)
     date = Column(Date, nullable=False)
     subtotal = Column(Float, default=0)
     vat = Column(Float, default=0)
@@ -24,7 +26,56 @@ class Invoice(Base):
     payment_method = Column(String, nullable=True)
     items = Column(JSON, nullable=True)
     image_path = Column(String, nullable=True)
+    image_sha256 = Column(String(64), nullable=True, index=True)
+    image_archived_at = Column(DateTime, nullable=True)
     user_id = Column(Integer, nullable=True)
+    business_type = Column(String, nullable=True)
+    # Overall OCR confidence (0-1); review_status is "pending" for low-confidence invoices, "reviewed" once checked
+    confidence = Column(Float, nullable=True)
+    review_status = Column(String(20), nullable=True)
+    # Duplicate detection (see DuplicateDetector): hash of seller, number, date and total,
+    # and the 64-bit perceptual hash of the image as four separately indexed 16-bit chunks
+    invoice_key = Column(String(40), nullable=True)
+    image_dhash_0 = Column(Integer, nullable=True)
+    image_dhash_1 = Column(Integer, nullable=True)
+    image_dhash_2 = Column(Integer, nullable=True)
+    image_dhash_3 = Column(Integer, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_invoices_user_type_date", "user_id", "invoice_type", "date"),
+        Index("ix_invoices_user_review", "user_id", "review_status"),
+        Index("ix_invoices_user_sha256", "user_id", "image_sha256"),
+        Index("ix_invoices_user_key", "user_id", "invoice_key"),
+        Index("ix_invoices_user_dhash_0", "user_id", "image_dhash_0"),
+        Index("ix_invoices_user_dhash_1", "user_id", "image_dhash_1"),
+        Index("ix_invoices_user_dhash_2", "user_id", "image_dhash_2"),
+        Index("ix_invoices_user_dhash_3", "user_id", "image_dhash_3"),
+    )
+
+class InvoiceLineItem(Base):
+    """One row of Invoice.items, kept in sync on every flush so item reports can aggregate in SQL"""
+    __tablename__ = "invoice_items"
+    
+    id = Column(Integer, primary_key=True)
+    invoice_id = Column(Integer, nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    # Copied from the invoice so reports filter and group without a join
+    user_id = Column(Integer, nullable=True)
+    invoice_type = Column(SQLEnum(InvoiceType), nullable=False)
+    date = Column(Date, nullable=False)
+    name = Column(String, nullable=False, index=True)
+    # Lower case, no diacritics or punctuation: "Cà phê sữa" and "CA PHE SUA" group together
+    name_normalized = Column(String, nullable=False)
+    category = Column(String(32), nullable=False)
+    quantity = Column(Float, default=0)
+    unit_price = Column(Float, default=0)
+    amount = Column(Float, default=0)
+    
+    __table_args__ = (
+        Index("ix_invoice_items_user_type_date", "user_id", "invoice_type", "date"),
+        Index("ix_invoice_items_user_name", "user_id", "name_normalized"),
+        Index("ix_invoice_items_user_category_date", "user_id", "category", "date"),
+    )
 
 class Expense(Base):
     __tablename__ = "expenses"
@@ -37,3 +88,36 @@ class Expense(Base):
     description = Column(String, nullable=True)
     is_deductible = Column(Integer, default=1)
     user_id = Column(Integer, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_expenses_user_date", "user_id", "date"),
+    )
+
+class StoredFile(Base):
+    __tablename__ = "stored_files"
+    
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class InvoiceOCR(Base):
+    """Raw OCR output of an invoice, compressed, so it can be re-parsed without calling OCR again"""
+    __tablename__ = "invoice_ocr"
+    
+    invoice_id = Column(Integer, primary_key=True)
+    engine = Column(String(32), nullable=False)
+    parser_version = Column(Integer, nullable=False, index=True)
+    codec = Column(String(8), nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class DataVersion(Base):
+    """Version of data not owned by one user; rows without an owner are shown to every user"""
+    __tablename__ = "data_versions"
+    
+    name = Column(String(32), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    modified_at = Column(DateTime, nullable=True)
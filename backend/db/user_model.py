@@ -11,3 +11,6 @@ class User(Base):
     picture = Column(String, nullable=True)
     google_id = Column(String, unique=True, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped on every write to the user's invoices or expenses (see DataVersionTracker)
+    data_version = Column(Integer, nullable=True, default=0, server_default="0")
+    data_modified_at = Column(DateTime, nullable=True)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Fill the duplicate-detection columns (invoice key and image hash) for invoices
+saved before duplicate detection existed, so new uploads are also checked
+against them. Only invoices missing a value are touched; safe to repeat.
+
+Usage: python index_duplicates.py [--batch-size N] [--skip-images]
+"""
+import argparse
+import logging
+
+from db.database import SessionLocal, init_db
+from db.models import Invoice
+from services.invoice.duplicates import DuplicateDetector
+from services.storage.archiver import UploadArchiver
+from services.storage.upload_store import UploadStore
+
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill duplicate-detection keys and image hashes")
+    parser.add_argument("--batch-size", type=int, default=500, help="invoices per commit")
+    parser.add_argument("--skip-images", action="store_true", help="only compute invoice keys, do not read images")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    init_db()
+    detector = DuplicateDetector()
+    archiver = UploadArchiver(UploadStore())
+    stats = {"invoices": 0, "keys": 0, "hashes": 0, "unreadable": 0}
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            invoices = db.query(Invoice).filter(Invoice.id > last_id).order_by(Invoice.id).limit(args.batch_size).all()
+            if not invoices:
+                break
+            for invoice in invoices:
+                if invoice.invoice_key is None:
+                    invoice.invoice_key = detector.key_of(invoice)
+                    stats["keys"] += invoice.invoice_key is not None
+                if args.skip_images or not invoice.image_path or invoice.image_dhash_0 is not None:
+                    continue
+                try:
+                    with archiver.original(invoice) as local_path:
+                        image_hash = detector.image_hash(local_path)
+                except FileNotFoundError:
+                    image_hash = None
+                if image_hash is None:
+                    stats["unreadable"] += 1
+                    continue
+                for column, chunk in detector.hash_columns(image_hash).items():
+                    setattr(invoice, column, chunk)
+                stats["hashes"] += 1
+            stats["invoices"] += len(invoices)
+            last_id = invoices[-1].id
+            db.commit()
+            db.expunge_all()
+            logger.info(f"🔎 {stats['invoices']} invoices checked")
+    finally:
+        db.close()
+
+    print(f"✅ {stats['invoices']} invoices: {stats['keys']} keys and {stats['hashes']} image hashes added, "
+          f"{stats['unreadable']} images without a usable hash (PDFs, missing or blank)")
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,71 @@
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Header
+from fastapi import FastAPI, UploadFile, File, Form, Query, Depends, HTTPException, Header, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
-from pathlib import Path
-import shutil
-from datetime import datetime
+import threading
+import logging
+from datetime import date, datetime
 from typing import Optional
 
-from db.database import get_db, init_db
-from db.models import Invoice, Expense, InvoiceType
+from db.database import SessionLocal, engine, get_db, init_db
+from db.models import Invoice, InvoiceOCR, Expense, InvoiceType
 from db.user_model import User
-from api.schemas import InvoiceResponse, ExpenseResponse, TaxCalculationRequest, TaxCalculationResponse
-from services.ocr.ocr_service import OCRService
+from api.schemas import (
+    InvoiceResponse, ExpenseResponse, TaxCalculationRequest, TaxCalculationResponse, TaxLiabilityResponse,
+    DashboardResponse, InvoiceUploadResponse, EInvoiceImportResponse, DirectUploadRequest, DirectUploadResponse, FinalizeUploadRequest,
+    InvoiceReviewRequest, InvoiceSearchResult, TopItem, CategorySpendPoint
+)
+from api.serialization import GZIP_MIN_SIZE, select_dicts, list_response
+from services.ocr.ocr_service import OCRService, PARSER_VERSION
+from services.ocr.raw_store import RawOCRStore
 from services.expense.classifier import ExpenseClassifier
+from services.invoice.einvoice import EInvoiceParser
+from services.invoice.duplicates import DuplicateDetector
+from services.invoice.line_items import LineItemIndex
 from services.tax_engine.tax_calculator import TaxEngine
+from services.tax_engine.rules import TaxRuleError
+from services.tax_engine.liability import LiabilityService
+from services.report.dashboard import DashboardService
+from services.search.invoice_search import InvoiceSearch
+from services.report.item_analytics import ItemAnalytics, ITEM_ORDERS, SPEND_PERIODS
+from services.report.data_version import DataVersionTracker
+from services.storage.upload_store import UploadStore
+from services.storage.backends import LocalStorageBackend, UploadRejectedError
+from services.storage.archiver import UploadArchiver
 from services.auth.auth_service import create_access_token, verify_token
+from services.chatbot.intent_router import TaxIntentRouter
+from services.chatbot.llm_gateway import LLMGateway, LLMGatewayError
+from services.chatbot.session_store import ChatSessionStore
 
 # Chatbot import - optional, will be loaded on demand
 try:
-    from api.chatbot_schemas import ChatRequest, ChatResponse, TaxAdviceRequest, TaxAdviceResponse
+    from api.chatbot_schemas import (
+        ChatRequest, ChatResponse, TaxAdviceRequest, TaxAdviceResponse, ChatSessionPage, ChatMessagePage
+    )
     from services.chatbot.chatbot_service import TaxChatbot
+    from services.chatbot.advice_pipeline import AdvicePipeline
     CHATBOT_AVAILABLE = True
 except ImportError:
     CHATBOT_AVAILABLE = False
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="AI Tax Assistant API", version="1.0.0")
 
+# Registered before CORS so that CORS headers still wrap its 413 responses
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    """Refuse oversized uploads from Content-Length, before the body is read"""
+    if request.method == "POST" and request.url.path in ("/api/invoices/upload", "/api/invoices/einvoice", "/api/uploads/content"):
+        content_length = request.headers.get("content-length")
+        # Allow some room for the multipart envelope around the file
+        if content_length and content_length.isdigit() and int(content_length) > upload_store.max_size + 64 * 1024:
+            return JSONResponse(status_code=413, content={"detail": f"File exceeds the {upload_store.max_size} byte limit"})
+    return await call_next(request)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -33,24 +74,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+if GZIP_MIN_SIZE > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
 
 ocr_service = OCRService()
+raw_ocr_store = RawOCRStore()
+upload_store = UploadStore()
+upload_archiver = UploadArchiver(upload_store)
 expense_classifier = ExpenseClassifier()
+einvoice_parser = EInvoiceParser()
+duplicate_detector = DuplicateDetector()
+duplicate_detector.register()
 tax_engine = TaxEngine()
+liability_service = LiabilityService(tax_engine)
+liability_service.register_invalidation()
+dashboard_service = DashboardService(liability_service)
+data_versions = DataVersionTracker()
+data_versions.register()
+line_item_index = LineItemIndex(expense_classifier)
+line_item_index.register()
+item_analytics = ItemAnalytics()
+invoice_search = InvoiceSearch(engine)
+invoice_search.register()
+intent_router = TaxIntentRouter(tax_engine)
+# LLM calls get their own bounded pool so they cannot starve other endpoints
+llm_gateway = LLMGateway()
+chat_sessions = ChatSessionStore()
 tax_chatbot = None
+advice_pipeline = None
 
 if CHATBOT_AVAILABLE:
-    tax_chatbot = TaxChatbot()
+    # Construction is cheap; Gemini setup runs in the background after startup
+    tax_chatbot = TaxChatbot(tax_engine)
+    advice_pipeline = AdvicePipeline(tax_engine, tax_chatbot, llm_gateway)
 
 @app.on_event("startup")
 def startup_event():
     init_db()
-    from db.database import engine
     User.metadata.create_all(bind=engine)
+    invoice_search.ensure_schema()
+    db = SessionLocal()
+    try:
+        data_versions.ensure_shared(db)
+    finally:
+        db.close()
     if CHATBOT_AVAILABLE and tax_chatbot:
-        tax_chatbot.setup_qa_chain()
+        threading.Thread(target=tax_chatbot.initialize, name="chatbot-init", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    llm_gateway.shutdown()
+
+@app.exception_handler(LLMGatewayError)
+def llm_gateway_error_handler(request, exc: LLMGatewayError):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 @app.get("/")
 def root():
@@ -66,6 +147,11 @@ def get_current_user(authorization: Optional[str] = Header(None), db: Session =
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
+def get_optional_user(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    if not authorization:
+        return None
+    return get_current_user(authorization, db)
+
 @app.post("/api/auth/google")
 async def google_auth(request: dict, db: Session = Depends(get_db)):
     import os
@@ -111,46 +197,360 @@ async def google_auth(request: dict, db: Session = Depends(get_db)):
         }
     }
 
-@app.post("/api/invoices/upload", response_model=InvoiceResponse)
-async def upload_invoice(file: UploadFile = File(...), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    file_path = UPLOAD_DIR / f"{datetime.now().timestamp()}_{file.filename}"
+@app.post("/api/invoices/upload", response_model=InvoiceUploadResponse)
+def upload_invoice(
+    file: UploadFile = File(...),
+    business_type: Optional[str] = Form(None),
+    allow_duplicate: bool = Form(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        stored = upload_store.save(db, file.file, declared_size=file.size)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    return create_invoice_from_upload(db, stored, current_user, business_type, allow_duplicate)
+
+def reject_duplicate(db, stored, match):
+    """409 naming the user's existing invoice; the upload is rolled back so nothing is recorded twice"""
+    upload_store.discard(db, stored)
+    logger.info(f"🚫 Upload {stored.sha256[:12]} is a duplicate of invoice {match.invoice_id} ({match.reason})")
+    raise HTTPException(status_code=409, detail={
+        "message": "This invoice was already uploaded; resend with allow_duplicate to keep both",
+        "duplicate_of": match.invoice_id,
+        "reason": match.reason,
+        "distance": match.distance
+    })
+
+def create_invoice_from_upload(db, stored, user, business_type, allow_duplicate=False):
+    """OCR a stored upload (or reuse the result for an identical image) and save the invoice"""
+    try:
+        return save_invoice_from_upload(db, stored, user, business_type, allow_duplicate)
+    except HTTPException:
+        # Duplicates are rejected through reject_duplicate, which has already discarded the upload
+        raise
+    except Exception:
+        # OCR or the insert failed: no invoice will reference the stored file
+        upload_store.discard(db, stored)
+        raise
+
+def save_invoice_from_upload(db, stored, user, business_type, allow_duplicate):
+    # The same image was OCR'd before: reuse that result instead of calling OCR again
+    previous = raw_ocr = None
+    if stored.deduplicated:
+        same_image = db.query(Invoice).filter(Invoice.image_sha256 == stored.sha256)
+        # Fields, confidence and review corrections only come from the user's own or unowned invoices
+        previous = same_image.filter(visible_to(Invoice, user)).order_by(Invoice.id.desc()).first()
+        if previous is None:
+            # Another user's upload: only its raw OCR output is reused, parsed afresh for this user
+            raw_ocr = (
+                db.query(InvoiceOCR)
+                .join(Invoice, Invoice.id == InvoiceOCR.invoice_id)
+                .filter(Invoice.image_sha256 == stored.sha256)
+                .order_by(InvoiceOCR.invoice_id.desc())
+                .first()
+            )
+    if previous:
+        image_hash = duplicate_detector.stored_hash(previous)
+        match = None if allow_duplicate else duplicate_detector.find_by_image(db, user.id, stored.sha256, image_hash)
+        if match:
+            reject_duplicate(db, stored, match)
+        invoice_data = {
+            "invoice_number": previous.invoice_number,
+            "seller_name": previous.seller_name,
+            "seller_tax_code": previous.seller_tax_code,
+            "date": previous.date.strftime("%Y-%m-%d"),
+            "subtotal": previous.subtotal,
+            "vat": previous.vat,
+            "total": previous.total,
+            "items": previous.items,
+            "extraction": {"source": "cache", "path": "deduplicated", "total_ms": 0.0}
+        }
+        confidence, review_status = previous.confidence, previous.review_status
+    else:
+        with upload_store.local_path(stored) as image_path:
+            # Checked before OCR, so a re-upload costs no OCR call
+            image_hash = None if stored.content_type == "application/pdf" else duplicate_detector.image_hash(image_path)
+            match = None if allow_duplicate else duplicate_detector.find_by_image(db, user.id, stored.sha256, image_hash)
+            if match:
+                reject_duplicate(db, stored, match)
+            if raw_ocr is not None:
+                invoice_data = ocr_service.parse_stored(
+                    {"engine": raw_ocr.engine, **raw_ocr_store.decompress(raw_ocr.codec, raw_ocr.payload)}
+                )
+            else:
+                invoice_data = ocr_service.parse_document(image_path, stored.content_type)
+        extraction = invoice_data["extraction"]
+        confidence = extraction["confidence"]["overall"]
+        review_status = "pending" if extraction["review"] else None
     
-    invoice_data = ocr_service.parse_invoice(str(file_path))
+    # A different photo or scan of an invoice that is already recorded
+    invoice_key = duplicate_detector.invoice_key(invoice_data)
+    match = None if allow_duplicate else duplicate_detector.find_by_key(db, user.id, invoice_key)
+    if match:
+        reject_duplicate(db, stored, match)
     
     invoice = Invoice(
         invoice_type=InvoiceType.PURCHASE,
         invoice_number=invoice_data.get("invoice_number"),
         seller_name=invoice_data.get("seller_name"),
+        seller_tax_code=invoice_data.get("seller_tax_code"),
         date=datetime.strptime(invoice_data.get("date"), "%Y-%m-%d").date(),
         subtotal=invoice_data.get("subtotal", 0),
         vat=invoice_data.get("vat", 0),
         total=invoice_data.get("total", 0),
         items=invoice_data.get("items", []),
-        image_path=str(file_path)
+        image_path=stored.path,
+        image_sha256=stored.sha256,
+        user_id=user.id,
+        business_type=business_type,
+        confidence=confidence,
+        review_status=review_status,
+        invoice_key=invoice_key,
+        **duplicate_detector.hash_columns(image_hash)
     )
     
     db.add(invoice)
+    db.flush()
+    if previous:
+        raw_ocr_store.copy(db, previous.id, invoice.id)
+    elif invoice_data.get("ocr_output"):
+        raw_ocr_store.save(db, invoice.id, invoice_data["ocr_output"], PARSER_VERSION)
     db.commit()
     db.refresh(invoice)
     
+    invoice.extraction = invoice_data.get("extraction")
     return invoice
 
+@app.post("/api/invoices/einvoice", response_model=EInvoiceImportResponse)
+def import_einvoices(
+    file: UploadFile = File(...),
+    invoice_type: InvoiceType = Form(InvoiceType.PURCHASE),
+    business_type: Optional[str] = Form(None),
+    allow_duplicate: bool = Form(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Import e-invoice XML (HĐĐT), one file or a zip batch; no OCR involved"""
+    if file.size is not None and file.size > upload_store.max_size:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {upload_store.max_size} byte limit")
+    
+    imported = []
+    errors = []
+    batch_keys = set()
+    for source, invoice_data, error in einvoice_parser.parse_upload(file.file, file.filename):
+        if error:
+            errors.append({"source": source, "error": error})
+            continue
+        invoice_key = duplicate_detector.invoice_key(invoice_data)
+        if not allow_duplicate:
+            match = duplicate_detector.find_by_key(db, current_user.id, invoice_key)
+            if match:
+                errors.append({"source": source, "error": f"Duplicate of invoice {match.invoice_id}", "duplicate_of": match.invoice_id})
+                continue
+            if invoice_key and invoice_key in batch_keys:
+                errors.append({"source": source, "error": "Duplicate of another invoice in this upload"})
+                continue
+        batch_keys.add(invoice_key)
+        imported.append(Invoice(
+            invoice_type=invoice_type,
+            user_id=current_user.id,
+            business_type=business_type,
+            invoice_key=invoice_key,
+            **invoice_data
+        ))
+    
+    db.add_all(imported)
+    db.commit()
+    for invoice in imported:
+        db.refresh(invoice)
+    logger.info(f"📥 Imported {len(imported)} e-invoices, {len(errors)} rejected")
+    return {"imported": imported, "errors": errors}
+
+@app.post("/api/uploads/presign", response_model=DirectUploadResponse)
+def presign_upload(request: DirectUploadRequest, current_user: User = Depends(get_current_user)):
+    try:
+        return upload_store.presign(current_user.id, request.content_type, request.size)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@app.post("/api/uploads/content", status_code=204)
+def receive_direct_upload(
+    key: str = Form(...),
+    token: str = Form(...),
+    content_type: str = Form(..., alias="Content-Type"),
+    file: UploadFile = File(...)
+):
+    """Stand-in for the object store's presigned POST when files are stored locally"""
+    if not isinstance(upload_store.backend, LocalStorageBackend):
+        raise HTTPException(status_code=404, detail="Direct uploads go to object storage")
+    try:
+        upload_store.backend.accept_upload(key, token, content_type, file.file)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return Response(status_code=204)
+
+@app.post("/api/uploads/{upload_id}/finalize", response_model=InvoiceUploadResponse)
+def finalize_upload(
+    upload_id: str,
+    request: FinalizeUploadRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        with upload_store.finalize(db, current_user.id, upload_id) as stored:
+            return create_invoice_from_upload(db, stored, current_user, request.business_type, request.allow_duplicate)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+def visible_to(model, user):
+    """Rows owned by the user plus rows without an owner"""
+    return or_(model.user_id == user.id, model.user_id.is_(None))
+
+def cached_response(db, user, resource, if_none_match, if_modified_since):
+    """(304 response or None, validator headers) for a resource that includes rows without an owner.
+
+    The check only reads the user row and the shared data version.
+    """
+    shared = data_versions.shared(db)
+    headers = data_versions.headers(user, resource, shared)
+    if data_versions.not_modified(user, resource, if_none_match, if_modified_since, shared):
+        return Response(status_code=304, headers=headers), headers
+    return None, headers
+
 @app.get("/api/invoices", response_model=list[InvoiceResponse])
-def get_invoices(db: Session = Depends(get_db)):
-    return db.query(Invoice).all()
+def get_invoices(
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    if not current_user:
+        return list_response(select_dicts(db, InvoiceResponse, Invoice), InvoiceResponse)
+    cached, headers = cached_response(db, current_user, "invoices", if_none_match, if_modified_since)
+    if cached:
+        return cached
+    rows = select_dicts(db, InvoiceResponse, Invoice, visible_to(Invoice, current_user))
+    return list_response(rows, InvoiceResponse, headers=headers)
+
+@app.get("/api/invoices/search", response_model=list[InvoiceSearchResult])
+def search_invoices(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Invoices whose seller, items or printed text match every word of q (accents optional, prefixes match)"""
+    if not invoice_search.available:
+        raise HTTPException(status_code=503, detail="Invoice search is not available on this database")
+    hits = invoice_search.search(db, current_user.id, q, limit, offset)
+    invoices = {invoice.id: invoice for invoice in db.query(Invoice).filter(Invoice.id.in_([hit[0] for hit in hits]))}
+    results = []
+    for invoice_id, score, snippet in hits:
+        invoice = invoices.get(invoice_id)
+        if invoice:
+            invoice.score, invoice.snippet = score, snippet
+            results.append(invoice)
+    return results
+
+@app.get("/api/invoices/review", response_model=list[InvoiceResponse])
+def get_review_queue(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """The user's invoices whose OCR confidence was too low to trust, least confident first"""
+    return (
+        db.query(Invoice)
+        .filter(Invoice.user_id == current_user.id, Invoice.review_status == "pending")
+        .order_by(Invoice.confidence, Invoice.id)
+        .all()
+    )
+
+@app.post("/api/invoices/{invoice_id}/review", response_model=InvoiceResponse)
+def review_invoice(
+    invoice_id: int,
+    review: InvoiceReviewRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    invoice = db.query(Invoice).filter(Invoice.id == invoice_id, Invoice.user_id == current_user.id).first()
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    
+    for field, value in review.model_dump(exclude_unset=True).items():
+        setattr(invoice, field, value)
+    invoice.review_status = "reviewed"
+    invoice.confidence = 1.0
+    db.commit()
+    db.refresh(invoice)
+    return invoice
 
 @app.get("/api/invoices/{invoice_id}", response_model=InvoiceResponse)
-def get_invoice(invoice_id: int, db: Session = Depends(get_db)):
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+def get_invoice(
+    invoice_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    query = db.query(Invoice).filter(Invoice.id == invoice_id)
+    if current_user:
+        cached, headers = cached_response(db, current_user, f"invoice-{invoice_id}", if_none_match, if_modified_since)
+        if cached:
+            return cached
+        query = query.filter(visible_to(Invoice, current_user))
+    invoice = query.first()
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
+    if current_user:
+        response.headers.update(headers)
     return invoice
 
+@app.delete("/api/invoices/{invoice_id}", status_code=204)
+def delete_invoice(invoice_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    invoice = db.query(Invoice).filter(Invoice.id == invoice_id, Invoice.user_id == current_user.id).first()
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    
+    sha256 = invoice.image_sha256
+    db.query(InvoiceOCR).filter(InvoiceOCR.invoice_id == invoice_id).delete(synchronize_session=False)
+    # The image is shared by content; its file goes only with the last invoice using it
+    released = upload_store.release(db, sha256) if sha256 else None
+    db.delete(invoice)
+    db.commit()
+    if released:
+        upload_archiver.delete_image(db, sha256, released)
+    return Response(status_code=204)
+
+@app.get("/api/invoices/{invoice_id}/thumbnail")
+def get_invoice_thumbnail(
+    invoice_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    invoice = db.query(Invoice).filter(Invoice.id == invoice_id, visible_to(Invoice, current_user)).first()
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    
+    # Thumbnails are derived from the image hash, so they never change for a given hash
+    etag = f'"thumb-{invoice.image_sha256 or invoice.id}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+    if invoice.image_sha256 and if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    
+    thumbnail = upload_archiver.get_thumbnail(invoice)
+    if thumbnail is None:
+        raise HTTPException(status_code=404, detail="Invoice has no image")
+    if not invoice.image_sha256:
+        headers = {"Cache-Control": "private, max-age=3600"}
+    return Response(content=thumbnail, media_type="image/jpeg", headers=headers)
+
 @app.post("/api/expenses", response_model=ExpenseResponse)
-def create_expense(description: str, amount: float, date: str, db: Session = Depends(get_db)):
+def create_expense(description: str, amount: float, date: str, db: Session = Depends(get_db), current_user: Optional[User] = Depends(get_optional_user)):
     classification = expense_classifier.classify(description)
     
     expense = Expense(
@@ -158,7 +558,8 @@ def create_expense(description: str, amount: float, date: str, db: Session = Dep
         amount=amount,
         date=datetime.strptime(date, "%Y-%m-%d").date(),
         description=description,
-        is_deductible=classification["is_deductible"]
+        is_deductible=classification["is_deductible"],
+        user_id=current_user.id if current_user else None
     )
     
     db.add(expense)
@@ -168,25 +569,77 @@ def create_expense(description: str, amount: float, date: str, db: Session = Dep
     return expense
 
 @app.get("/api/expenses", response_model=list[ExpenseResponse])
-def get_expenses(db: Session = Depends(get_db)):
-    return db.query(Expense).all()
+def get_expenses(
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    converters = {"is_deductible": bool}
+    if not current_user:
+        return list_response(select_dicts(db, ExpenseResponse, Expense, converters=converters), ExpenseResponse)
+    cached, headers = cached_response(db, current_user, "expenses", if_none_match, if_modified_since)
+    if cached:
+        return cached
+    rows = select_dicts(db, ExpenseResponse, Expense, visible_to(Expense, current_user), converters=converters)
+    return list_response(rows, ExpenseResponse, headers=headers)
 
 @app.post("/api/tax/calculate", response_model=TaxCalculationResponse)
 def calculate_tax(request: TaxCalculationRequest):
-    result = tax_engine.calculate_tax(
-        revenue=request.revenue,
-        expenses=request.expenses,
-        business_type=request.business_type
-    )
+    try:
+        result = tax_engine.calculate_tax(
+            revenue=request.revenue,
+            expenses=request.expenses,
+            business_type=request.business_type,
+            tax_year=request.tax_year
+        )
+    except TaxRuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
+@app.get("/api/ocr/health")
+def ocr_health():
+    """Circuit state of each OCR engine; uploads skip engines whose circuit is open"""
+    return {**ocr_service.orchestrator.health(), "qr_decoder": ocr_service.qr_decoder.backend if ocr_service.qr_decoder else None}
+
+@app.get("/api/ocr/metrics")
+def ocr_metrics():
+    return ocr_service.orchestrator.metrics()
+
+@app.get("/api/tax/liability", response_model=TaxLiabilityResponse)
+def get_tax_liability(
+    year: Optional[int] = None,
+    quarter: Optional[int] = Query(None, ge=1, le=4),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        return liability_service.compute(db, current_user.id, year or datetime.now().year, quarter)
+    except TaxRuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/api/reports/summary")
-def get_summary(db: Session = Depends(get_db)):
-    total_revenue = db.query(Invoice).filter(Invoice.invoice_type == "sale").count()
-    total_expenses = db.query(Expense).count()
+def get_summary(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    invoice_query = db.query(func.count(Invoice.id), func.coalesce(func.sum(Invoice.total), 0.0)).filter(
+        Invoice.invoice_type == InvoiceType.SALE
+    )
+    expense_query = db.query(func.count(Expense.id), func.coalesce(func.sum(Expense.amount), 0.0))
+    if current_user:
+        cached, headers = cached_response(db, current_user, "summary", if_none_match, if_modified_since)
+        if cached:
+            return cached
+        response.headers.update(headers)
+        invoice_query = invoice_query.filter(visible_to(Invoice, current_user))
+        expense_query = expense_query.filter(visible_to(Expense, current_user))
     
-    revenue_sum = sum([inv.total for inv in db.query(Invoice).filter(Invoice.invoice_type == "sale").all()])
-    expense_sum = sum([exp.amount for exp in db.query(Expense).all()])
+    total_revenue, revenue_sum = invoice_query.one()
+    total_expenses, expense_sum = expense_query.one()
     
     return {
         "total_invoices": total_revenue,
@@ -196,20 +649,134 @@ def get_summary(db: Session = Depends(get_db)):
         "profit": revenue_sum - expense_sum
     }
 
-@app.post("/api/chatbot/ask", response_model=ChatResponse)
-def ask_chatbot(request: ChatRequest):
+@app.get("/api/reports/items/top", response_model=list[TopItem])
+def get_top_items(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    invoice_type: InvoiceType = InvoiceType.PURCHASE,
+    order_by: str = Query("amount", pattern=f"^({'|'.join(ITEM_ORDERS)})$"),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Most bought (or, with invoice_type=SALE, sold) items by amount, quantity or number of lines"""
+    return item_analytics.top_items(db, current_user.id, start, end, invoice_type, order_by, limit)
+
+@app.get("/api/reports/items/categories", response_model=list[CategorySpendPoint])
+def get_spend_by_category(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    period: str = Query("month", pattern=f"^({'|'.join(SPEND_PERIODS)})$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Purchased item amounts per category for each month, quarter or year"""
+    return item_analytics.spend_by_category(db, current_user.id, start, end, period)
+
+@app.get("/api/dashboard", response_model=DashboardResponse)
+def get_dashboard(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    etag = dashboard_service.etag(current_user)
+    headers = {"ETag": etag, "Cache-Control": data_versions.CACHE_CONTROL, "Vary": "Authorization"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        dashboard = dashboard_service.build(db, current_user.id)
+    except TaxRuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers.update(headers)
+    return dashboard
+
+def require_chatbot():
     if not CHATBOT_AVAILABLE or not tax_chatbot:
         raise HTTPException(status_code=503, detail="Chatbot not available. Install: pip install -r requirements-chatbot.txt")
-    response = tax_chatbot.ask(request.question)
-    return response
+    if tax_chatbot.status == TaxChatbot.STATUS_INITIALIZING:
+        raise HTTPException(status_code=503, detail="Chatbot is initializing, please retry shortly", headers={"Retry-After": "5"})
+    if tax_chatbot.status == TaxChatbot.STATUS_UNAVAILABLE:
+        raise HTTPException(status_code=503, detail=f"Chatbot unavailable: {tax_chatbot.error}")
 
-@app.post("/api/chatbot/advice", response_model=TaxAdviceResponse)
-def get_tax_advice(request: TaxAdviceRequest):
+@app.get("/api/chatbot/health")
+def chatbot_health():
     if not CHATBOT_AVAILABLE or not tax_chatbot:
+        return {"status": "not_installed", "model": None, "error": "Install: pip install -r requirements-chatbot.txt", "gateway": llm_gateway.stats()}
+    return {**tax_chatbot.health(), "gateway": llm_gateway.stats()}
+
+@app.post("/api/chatbot/ask", response_model=ChatResponse)
+async def ask_chatbot(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    # Numeric tax questions are answered from the tax rules, no LLM call needed
+    response = intent_router.answer(request.question)
+    if not response:
+        require_chatbot()
+    
+    # The user comes from the token only; anonymous sessions are resumed with their session token
+    user_id = current_user.id if current_user else None
+    session = await run_in_threadpool(
+        chat_sessions.get_or_create, db, request.session_id, user_id, request.session_token
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    
+    if not response:
+        summary, history = await run_in_threadpool(chat_sessions.get_context, db, session)
+        prompt = tax_chatbot.build_question_prompt(request.question, summary, history)
+        try:
+            answer = await llm_gateway.submit(tax_chatbot.generate, prompt, key=prompt)
+        except LLMGatewayError:
+            raise
+        except Exception as e:
+            return {**tax_chatbot.error_response(request.question, e), "session_id": session.id, "session_token": session.token}
+        response = tax_chatbot.format_answer(request.question, answer)
+    
+    await run_in_threadpool(chat_sessions.record_turn, db, session, request.question, response["answer"])
+    if chat_sessions.needs_compaction(session):
+        background_tasks.add_task(chat_sessions.compact, session.id, summarize_chat)
+    
+    return {**response, "session_id": session.id, "session_token": session.token}
+
+async def summarize_chat(summary, messages):
+    if not CHATBOT_AVAILABLE or not tax_chatbot or tax_chatbot.status != TaxChatbot.STATUS_READY:
+        return None
+    return await llm_gateway.submit(tax_chatbot.generate, tax_chatbot.build_summary_prompt(summary, messages))
+
+@app.get("/api/chatbot/sessions", response_model=ChatSessionPage)
+def get_chat_sessions(limit: int = 20, before_id: Optional[int] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return chat_sessions.list_sessions(db, current_user.id, limit=min(limit, 100), before_id=before_id)
+
+@app.get("/api/chatbot/sessions/{session_id}/messages", response_model=ChatMessagePage)
+def get_chat_messages(session_id: int, limit: int = 50, before_id: Optional[int] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    session = chat_sessions.get(db, session_id, current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return chat_sessions.list_messages(db, session, limit=min(limit, 200), before_id=before_id)
+
+@app.post("/api/chatbot/advice", response_model=TaxAdviceResponse)
+async def get_tax_advice(request: TaxAdviceRequest):
+    if not CHATBOT_AVAILABLE or not advice_pipeline:
         raise HTTPException(status_code=503, detail="Chatbot not available. Install: pip install -r requirements-chatbot.txt")
-    advice = tax_chatbot.get_tax_advice(
+    # Rule-based advice is always returned; AI advice only if it fits the budget
+    return await advice_pipeline.advise(
         revenue=request.revenue,
         expenses=request.expenses,
-        business_type=request.business_type
+        business_type=request.business_type,
+        budget_ms=request.ai_budget_ms,
+        defer_ai=request.defer_ai
     )
-    return advice
+
+@app.get("/api/chatbot/advice/{advice_id}", response_model=TaxAdviceResponse)
+def get_deferred_tax_advice(advice_id: str):
+    if not CHATBOT_AVAILABLE or not advice_pipeline:
+        raise HTTPException(status_code=503, detail="Chatbot not available. Install: pip install -r requirements-chatbot.txt")
+    result = advice_pipeline.get_result(advice_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Advice not found or expired")
+    return result
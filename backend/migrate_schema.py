@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""
+Migration script to add new columns and indexes to an existing database.
+create_all() only creates missing tables, so columns and indexes added to
+existing models are applied here. Safe to run repeatedly.
+"""
+from sqlalchemy import inspect, text
+from db.database import engine, init_db
+from db.models import Base
+import db.user_model  # noqa: F401 - register all tables on Base.metadata
+import db.chat_model  # noqa: F401
+
+def migrate():
+    """Create missing tables, then add missing nullable columns and indexes"""
+    init_db()
+    inspector = inspect(engine)
+    
+    try:
+        with engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                existing = {column["name"] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    if column.server_default is not None:
+                        column_type += f" DEFAULT {column.server_default.arg}"
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    print(f"➕ Added column {table.name}.{column.name}")
+                
+                existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in existing_indexes:
+                        index.create(bind=conn)
+                        print(f"➕ Created index {index.name}")
+        
+        print("✅ Migration successful! Schema is up to date.")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+
+if __name__ == "__main__":
+    migrate()
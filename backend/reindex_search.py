@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""
+Rebuild the invoice search index (seller, items and stored OCR text) from
+scratch. New and edited invoices are indexed as they are saved; run this once
+after upgrading, or after changing how documents are built.
+
+Usage: python reindex_search.py [--batch-size N]
+"""
+import argparse
+import logging
+
+from db.database import SessionLocal, engine, init_db
+from services.search.invoice_search import InvoiceSearch
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the invoice search index")
+    parser.add_argument("--batch-size", type=int, default=1000, help="invoices per commit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    init_db()
+    search = InvoiceSearch(engine)
+    search.ensure_schema()
+    if not search.available:
+        print(f"❌ Invoice search is not available on {engine.dialect.name}")
+        return
+    db = SessionLocal()
+    try:
+        stats = search.rebuild(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+
+    print(f"✅ Indexed {stats['documents']} invoices")
+
+if __name__ == "__main__":
+    main()
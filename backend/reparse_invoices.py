@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Re-parse invoices from their stored OCR output after a parser change, without
+calling any OCR engine. Only rows parsed by an older PARSER_VERSION are read
+unless --all is given; changed fields are written back batch by batch.
+Invoices a user has reviewed are left untouched.
+
+Usage: python reparse_invoices.py [--batch-size N] [--workers N] [--limit N] [--all] [--dry-run]
+"""
+import argparse
+import logging
+
+from db.database import SessionLocal, engine, init_db
+from services.report.data_version import DataVersionTracker
+from services.invoice.duplicates import DuplicateDetector
+from services.invoice.line_items import LineItemIndex
+from services.ocr.ocr_service import PARSER_VERSION
+from services.search.invoice_search import InvoiceSearch
+from services.ocr.reparser import InvoiceReparser
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-parse invoices from stored OCR output")
+    parser.add_argument("--batch-size", type=int, default=500, help="invoices per worker task and commit")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count, 0 = in-process)")
+    parser.add_argument("--limit", type=int, default=None, help="re-parse at most this many invoices")
+    parser.add_argument("--all", action="store_true", help=f"also re-parse rows already at parser version {PARSER_VERSION}")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    init_db()
+    # Changed invoices must invalidate the cached reports of their users and rewrite their line items, keys and search documents
+    DataVersionTracker().register()
+    LineItemIndex().register()
+    DuplicateDetector().register()
+    search = InvoiceSearch(engine)
+    search.ensure_schema()
+    search.register()
+    reparser = InvoiceReparser(batch_size=args.batch_size, workers=args.workers)
+    db = SessionLocal()
+    try:
+        stats, changes = reparser.run(db, dry_run=args.dry_run, reparse_all=args.all, limit=args.limit)
+    finally:
+        db.close()
+
+    verb = "would change" if args.dry_run else "changed"
+    print(f"✅ Re-parsed {stats['parsed']} invoices in {stats['seconds']}s: {stats['changed']} {verb}, "
+          f"{stats['unchanged']} unchanged, {stats['skipped_reviewed']} reviewed (skipped), {stats['failed']} failed")
+    for field, count in changes.most_common():
+        print(f"   {field:<16} {count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from starlette.concurrency import run_in_threadpool
+
+from db.chat_model import AdviceResult
+from db.database import SessionLocal
+from services.chatbot.llm_gateway import LLMGatewayError
+
+logger = logging.getLogger(__name__)
+
+ADVICE_AI_BUDGET_MS = int(os.getenv("ADVICE_AI_BUDGET_MS", "3000"))
+# Longer budgets would hold the request open for the whole LLM call; defer_ai covers slow answers
+ADVICE_MAX_BUDGET_MS = int(os.getenv("ADVICE_MAX_BUDGET_MS", "10000"))
+ADVICE_RESULT_TTL = int(os.getenv("ADVICE_RESULT_TTL", "600"))
+
+class AdvicePipeline:
+    """Rule-based advice immediately, AI advice concurrently under a latency budget.
+
+    AI advice that misses the budget is either dropped or kept running under
+    an advice id. Deferred results live in advice_results, not in memory: the
+    worker running the call writes the result there when it finishes, and any
+    worker can answer the follow-up fetch.
+    """
+
+    def __init__(self, tax_engine, chatbot, gateway, budget_ms=ADVICE_AI_BUDGET_MS, result_ttl=ADVICE_RESULT_TTL,
+                 session_factory=SessionLocal):
+        self.tax_engine = tax_engine
+        self.chatbot = chatbot
+        self.gateway = gateway
+        self.budget_ms = budget_ms
+        self.result_ttl = result_ttl
+        self.session_factory = session_factory
+        # Strong references to the tasks saving deferred results, which nothing else awaits
+        self._saving = set()
+
+    async def advise(self, revenue, expenses, business_type, budget_ms=None, defer_ai=True):
+        started = time.perf_counter()
+        budget_ms = self.budget_ms if budget_ms is None else min(budget_ms, ADVICE_MAX_BUDGET_MS)
+        timings = {"budget_ms": budget_ms}
+
+        # Start the slow part first so it overlaps with the rules
+        ai_task = None
+        ai_status = "unavailable"
+        if self._chatbot_usable():
+            ai_task = asyncio.ensure_future(self._ai_advice(revenue, expenses, business_type, timings))
+
+        rules_started = time.perf_counter()
+        rule_advice = self.tax_engine.get_rule_advice(revenue, expenses, business_type)
+        timings["rules_ms"] = self._elapsed_ms(rules_started)
+
+        ai_advice = []
+        ai_error = None
+        advice_id = None
+        if ai_task:
+            done, _ = await asyncio.wait({ai_task}, timeout=budget_ms / 1000)
+            if done:
+                ai_status, ai_advice, ai_error = self._task_result(ai_task)
+            elif defer_ai:
+                advice_id = await run_in_threadpool(self._store_pending, revenue, rule_advice, timings)
+                saving = asyncio.ensure_future(self._save_when_done(advice_id, ai_task, timings))
+                self._saving.add(saving)
+                saving.add_done_callback(self._saving.discard)
+                ai_status = "pending"
+            else:
+                # The gateway call keeps its slot until it finishes; we only stop waiting
+                ai_task.add_done_callback(self._task_result)
+                ai_status = "dropped"
+
+        timings["total_ms"] = self._elapsed_ms(started)
+        logger.info(f"⏱️ Advice: rules={timings['rules_ms']}ms ai={timings.get('ai_ms', '-')}ms "
+                    f"total={timings['total_ms']}ms status={ai_status}")
+
+        response = self.chatbot.build_advice_response(revenue, rule_advice + ai_advice)
+        response.update({
+            "advice_id": advice_id,
+            "ai_status": ai_status,
+            "ai_error": ai_error,
+            "timings": dict(timings)
+        })
+        return response
+
+    def get_result(self, advice_id):
+        """Follow-up fetch for AI advice that missed the budget; None if unknown or expired"""
+        db = self.session_factory()
+        try:
+            entry = db.get(AdviceResult, advice_id)
+            if not entry or entry.created_at < datetime.utcnow() - timedelta(seconds=self.result_ttl):
+                return None
+            response = self.chatbot.build_advice_response(entry.revenue, entry.rule_advice + (entry.ai_advice or []))
+            response.update({
+                "advice_id": advice_id,
+                "ai_status": entry.ai_status,
+                "ai_error": entry.ai_error,
+                "timings": dict(entry.timings or {})
+            })
+            return response
+        finally:
+            db.close()
+
+    async def _ai_advice(self, revenue, expenses, business_type, timings):
+        ai_started = time.perf_counter()
+        try:
+            prompt = self.chatbot.build_advice_prompt(revenue, expenses, business_type)
+            text = await self.gateway.submit(self.chatbot.generate, prompt, key=prompt)
+            return self.chatbot.parse_ai_advice(text)
+        finally:
+            timings["ai_ms"] = self._elapsed_ms(ai_started)
+
+    def _task_result(self, task):
+        """(status, advice, error) of a finished AI task - failures are reported, not swallowed"""
+        try:
+            return "complete", task.result(), None
+        except asyncio.CancelledError:
+            return "dropped", [], None
+        except LLMGatewayError as e:
+            logger.warning(f"⚠️ AI advice shed by gateway: {str(e)}")
+            return "failed", [], str(e)
+        except Exception as e:
+            logger.warning(f"⚠️ AI advice failed: {str(e)}")
+            return "failed", [], str(e)
+
+    def _chatbot_usable(self):
+        return self.chatbot.status not in (
+            self.chatbot.STATUS_INITIALIZING, self.chatbot.STATUS_UNAVAILABLE
+        )
+
+    def _store_pending(self, revenue, rule_advice, timings):
+        db = self.session_factory()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=self.result_ttl)
+            db.query(AdviceResult).filter(AdviceResult.created_at < cutoff).delete(synchronize_session=False)
+            advice_id = uuid.uuid4().hex
+            db.add(AdviceResult(id=advice_id, revenue=revenue, rule_advice=rule_advice, timings=dict(timings)))
+            db.commit()
+            return advice_id
+        finally:
+            db.close()
+
+    async def _save_when_done(self, advice_id, ai_task, timings):
+        await asyncio.wait({ai_task})
+        ai_status, ai_advice, ai_error = self._task_result(ai_task)
+        try:
+            await run_in_threadpool(self._save_result, advice_id, ai_status, ai_advice, ai_error, timings)
+        except Exception as e:
+            logger.error(f"❌ Saving deferred AI advice {advice_id} failed: {str(e)}")
+
+    def _save_result(self, advice_id, ai_status, ai_advice, ai_error, timings):
+        db = self.session_factory()
+        try:
+            entry = db.get(AdviceResult, advice_id)
+            if entry is None:
+                # Expired and cleaned up while the call was running
+                return
+            entry.ai_status = ai_status
+            entry.ai_advice = ai_advice
+            entry.ai_error = ai_error
+            entry.timings = dict(timings)
+            db.commit()
+        finally:
+            db.close()
+
+    def _elapsed_ms(self, started):
+        return round((time.perf_counter() - started) * 1000, 1)
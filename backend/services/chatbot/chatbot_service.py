@@ -1,39 +1,19 @@
 import google.generativeai as genai
+import json
+import logging
 import os
+import threading
+import time
 from pathlib import Path
 
-class TaxChatbot:
-    def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found")
-        
-        genai.configure(api_key=api_key)
-        
-        # Try to find available model
-        try:
-            models = genai.list_models()
-            available_model = None
-            for m in models:
-                if 'generateContent' in m.supported_generation_methods:
-                    available_model = m.name
-                    print(f"Using model: {available_model}")
-                    break
-            
-            if not available_model:
-                available_model = 'gemini-pro'
-        except:
-            available_model = 'gemini-pro'
-        
-        # Configure model with system instructions
-        self.model = genai.GenerativeModel(
-            available_model,
-            generation_config={
-                "temperature": 0.3,
-                "top_p": 0.95,
-                "max_output_tokens": 2048,
-            },
-            system_instruction="""Bạn là chuyên gia tư vấn thuế cho hộ kinh doanh cá thể tại Việt Nam.
+from services.tax_engine.tax_calculator import TaxEngine
+
+logger = logging.getLogger(__name__)
+
+MODEL_CACHE_PATH = Path(os.getenv("CHATBOT_MODEL_CACHE", ".cache/gemini_model.json"))
+MODEL_CACHE_TTL = int(os.getenv("CHATBOT_MODEL_CACHE_TTL", "86400"))
+
+SYSTEM_INSTRUCTION = """Bạn là chuyên gia tư vấn thuế cho hộ kinh doanh cá thể tại Việt Nam.
 
 NHIỆM VỤ:
 - Trả lời câu hỏi về luật thuế, chi phí, hóa đơn theo quy định mới nhất của Việt Nam
@@ -50,10 +30,105 @@ CÁCH TRẢ LỜI:
 6. KHÔNG dùng dấu ** (bold) trong câu trả lời
 7. Dùng ngôn ngữ thân thiện, gần gũi như đang tư vấn trực tiếp
 8. Trả lời ĐẦY ĐỦ, CHI TIẾT, CHÍNH XÁC theo quy định Việt Nam"""
-        )
+
+class TaxChatbot:
+    # Lifecycle: pending -> initializing -> ready | unavailable
+    STATUS_PENDING = "pending"
+    STATUS_INITIALIZING = "initializing"
+    STATUS_READY = "ready"
+    STATUS_UNAVAILABLE = "unavailable"
+    
+    def __init__(self, tax_engine=None):
+        """Cheap constructor - Gemini setup and model discovery happen in initialize()"""
+        self.tax_engine = tax_engine or TaxEngine()
+        self.model = None
+        self.model_name = None
+        self.status = self.STATUS_PENDING
+        self.error = None
+        self._init_lock = threading.Lock()
         
         self.knowledge_base = self._load_knowledge_base()
         
+    def initialize(self):
+        """Configure Gemini and discover a model; blocks other callers until done"""
+        with self._init_lock:
+            if self.status in (self.STATUS_READY, self.STATUS_UNAVAILABLE):
+                return self.status == self.STATUS_READY
+            
+            self.status = self.STATUS_INITIALIZING
+            try:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY not found")
+                
+                genai.configure(api_key=api_key)
+                self.model_name = self._discover_model()
+                
+                # Configure model with system instructions
+                self.model = genai.GenerativeModel(
+                    self.model_name,
+                    generation_config={
+                        "temperature": 0.3,
+                        "top_p": 0.95,
+                        "max_output_tokens": 2048,
+                    },
+                    system_instruction=SYSTEM_INSTRUCTION
+                )
+                self.status = self.STATUS_READY
+                logger.info(f"✅ Chatbot ready with model: {self.model_name}")
+            except Exception as e:
+                self.error = str(e)
+                self.status = self.STATUS_UNAVAILABLE
+                logger.warning(f"⚠️ Chatbot unavailable: {self.error}")
+        
+        return self.status == self.STATUS_READY
+    
+    def ensure_ready(self):
+        """Initialize on first use; raise if the chatbot cannot be used"""
+        if self.status != self.STATUS_READY and not self.initialize():
+            raise RuntimeError(f"Chatbot unavailable: {self.error}")
+    
+    def health(self):
+        return {
+            "status": self.status,
+            "model": self.model_name,
+            "error": self.error
+        }
+    
+    def _discover_model(self):
+        """Find a model supporting generateContent, cached on disk for MODEL_CACHE_TTL seconds"""
+        try:
+            with open(MODEL_CACHE_PATH, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if time.time() - cached["discovered_at"] < MODEL_CACHE_TTL:
+                return cached["model"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        
+        try:
+            available_model = None
+            for m in genai.list_models():
+                if 'generateContent' in m.supported_generation_methods:
+                    available_model = m.name
+                    break
+        except Exception as e:
+            logger.warning(f"⚠️ Model discovery failed: {str(e)}")
+            return 'gemini-pro'
+        
+        if not available_model:
+            return 'gemini-pro'
+        
+        try:
+            MODEL_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = MODEL_CACHE_PATH.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"model": available_model, "discovered_at": time.time()}, f)
+            os.replace(tmp_path, MODEL_CACHE_PATH)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not cache model name: {str(e)}")
+        
+        return available_model
+    
     def _load_knowledge_base(self):
         kb_path = Path(__file__).parent / "knowledge_base.md"
         try:
@@ -120,29 +195,72 @@ CÁCH TRẢ LỜI:
     
     def ask(self, question):
         """Ask question with knowledge base context"""
-        # Create prompt with knowledge base
-        prompt = f"""Dựa trên kiến thức sau về thuế Việt Nam:
+        prompt = self.build_question_prompt(question)
+        try:
+            answer = self.generate(prompt)
+        except Exception as e:
+            return self.error_response(question, e)
+        return self.format_answer(question, answer)
+    
+    def generate(self, prompt):
+        """Blocking LLM call - the only place the model is invoked"""
+        self.ensure_ready()
+        response = self.model.generate_content(prompt)
+        return response.text
+    
+    def build_question_prompt(self, question, summary=None, history=None):
+        # Create prompt with knowledge base and the bounded session context
+        context = ""
+        if summary:
+            context += f"""
+Tóm tắt cuộc trò chuyện trước đó:
+{summary}
+"""
+        if history:
+            turns = "\n".join(
+                f"{'Khách hàng' if role == 'user' else 'Tư vấn viên'}: {content}" for role, content in history
+            )
+            context += f"""
+Các lượt hỏi đáp gần đây:
+{turns}
+"""
+        return f"""Dựa trên kiến thức sau về thuế Việt Nam:
 
 {self.knowledge_base}
-
+{context}
 Câu hỏi của khách hàng: {question}
 
 Hãy trả lời ngắn gọn, dễ hiểu với ví dụ cụ thể:"""
+    
+    def build_summary_prompt(self, summary, messages):
+        turns = "\n".join(
+            f"{'Khách hàng' if role == 'user' else 'Tư vấn viên'}: {content}" for role, content in messages
+        )
+        return f"""Tóm tắt cuộc trò chuyện tư vấn thuế dưới đây trong tối đa 120 từ.
+Giữ lại các số liệu (doanh thu, chi phí, ngành nghề) và kết luận quan trọng, không thêm thông tin mới.
 
-        try:
-            response = self.model.generate_content(prompt)
-            answer = response.text
-            
-            # Remove bold formatting
-            answer = answer.replace('**', '')
-            
-            # Ensure disclaimer
-            if "⚠️" not in answer:
-                answer += "\n\n⚠️ Thông tin mang tính tham khảo. Vui lòng kiểm tra với cơ quan thuế địa phương."
-                
-        except Exception as e:
-            answer = f"Xin lỗi, tôi gặp lỗi: {str(e)}\n\nVui lòng kiểm tra API key hoặc thử lại."
+Tóm tắt trước đó:
+{summary or "(chưa có)"}
+
+Các lượt mới:
+{turns}
+
+Bản tóm tắt mới:"""
+    
+    def format_answer(self, question, answer):
+        # Remove bold formatting
+        answer = answer.replace('**', '')
+        
+        # Ensure disclaimer
+        if "⚠️" not in answer:
+            answer += "\n\n⚠️ Thông tin mang tính tham khảo. Vui lòng kiểm tra với cơ quan thuế địa phương."
         
+        return self._response(question, answer)
+    
+    def error_response(self, question, error):
+        return self._response(question, f"Xin lỗi, tôi gặp lỗi: {str(error)}\n\nVui lòng kiểm tra API key hoặc thử lại.")
+    
+    def _response(self, question, answer):
         return {
             "answer": answer,
             "sources": ["Knowledge Base - Luật thuế VN"],
@@ -152,35 +270,30 @@ Hãy trả lời ngắn gọn, dễ hiểu với ví dụ cụ thể:"""
     
     def get_tax_advice(self, revenue, expenses, business_type):
         """Get personalized tax advice"""
-        advice = []
-        
         # Rule-based advice
-        if revenue < 100_000_000:
-            advice.append("✅ Doanh thu dưới 100 triệu, chỉ nộp lệ phí môn bài 1 triệu/năm")
-        elif revenue < 3_000_000_000:
-            advice.append(f"📊 Doanh thu {revenue:,.0f} VNĐ - nên nộp thuế khoán")
-            advice.append("💡 Cân nhắc đăng ký HĐĐT để minh bạch")
-        else:
-            advice.append("⚠️ Doanh thu vượt 3 tỷ - cần chuyển thành doanh nghiệp")
-        
-        if expenses > revenue * 0.7:
-            advice.append("💡 Chi phí cao, nên chuyển sang kê khai để giảm thuế")
+        advice = self.tax_engine.get_rule_advice(revenue, expenses, business_type)
         
         # AI-powered advice
-        prompt = f"""Phân tích tài chính hộ kinh doanh:
+        try:
+            advice.extend(self.parse_ai_advice(self.generate(self.build_advice_prompt(revenue, expenses, business_type))))
+        except Exception as e:
+            logger.warning(f"⚠️ AI advice failed: {str(e)}")
+        
+        return self.build_advice_response(revenue, advice)
+    
+    def build_advice_prompt(self, revenue, expenses, business_type):
+        return f"""Phân tích tài chính hộ kinh doanh:
 - Doanh thu: {revenue:,.0f} VNĐ/năm
 - Chi phí: {expenses:,.0f} VNĐ/năm  
 - Loại hình: {business_type}
 
 Đưa ra 2 khuyến nghị ngắn gọn về tối ưu thuế (mỗi khuyến nghị 1 dòng):"""
-
-        try:
-            response = self.model.generate_content(prompt)
-            ai_advice = response.text.strip().split('\n')
-            advice.extend([a.strip() for a in ai_advice if a.strip() and len(a.strip()) > 10])
-        except:
-            pass
-        
+    
+    def parse_ai_advice(self, text):
+        ai_advice = text.strip().split('\n')
+        return [a.strip() for a in ai_advice if a.strip() and len(a.strip()) > 10]
+    
+    def build_advice_response(self, revenue, advice):
         return {
             "advice": advice[:6],
             "recommendation": "Nên tham khảo chuyên gia thuế" if revenue > 500_000_000 else "Có thể tự kê khai"
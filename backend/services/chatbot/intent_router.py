@@ -0,0 +1,202 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+DISCLAIMER = "⚠️ Thông tin mang tính tham khảo. Vui lòng kiểm tra với cơ quan thuế địa phương."
+
+class TaxIntentRouter:
+    """Answer numeric tax questions locally from tax_rules.yaml, without the LLM"""
+
+    UNITS = {
+        "tỷ": 1_000_000_000, "tỉ": 1_000_000_000, "ty": 1_000_000_000, "ti": 1_000_000_000,
+        "triệu": 1_000_000, "trieu": 1_000_000, "tr": 1_000_000,
+        "nghìn": 1_000, "ngàn": 1_000, "nghin": 1_000, "ngan": 1_000, "k": 1_000,
+        "đồng": 1, "dong": 1, "vnđ": 1, "vnd": 1, "đ": 1,
+    }
+
+    BUSINESS_TYPES = {
+        "food_service": ["ăn uống", "quán ăn", "nhà hàng", "cà phê", "cafe", "quán nước", "ẩm thực"],
+        "retail": ["bán lẻ", "tạp hóa", "thương mại", "bán hàng", "cửa hàng", "buôn bán"],
+        "service": ["dịch vụ", "cắt tóc", "sửa chữa", "spa", "tư vấn"],
+    }
+
+    BUSINESS_TYPE_NAMES = {
+        "food_service": "ăn uống",
+        "retail": "thương mại, bán lẻ",
+        "service": "dịch vụ",
+    }
+
+    # Questions asking "why"/"how to" need an explanation, not a number
+    OPEN_ENDED = ["tại sao", "vì sao", "như thế nào", "thế nào", "cách nào", "làm sao", "so sánh", "khác nhau", "thì sao"]
+    # Penalties and salary income tax are not household business tax; the LLM handles them
+    OTHER_TOPICS = ["phạt", "lương", "tncn"]
+    TAX_KEYWORDS = ["thuế", "nộp bao nhiêu", "phải nộp", "môn bài"]
+    REVENUE_KEYWORDS = ["doanh thu", "doanh số", "bán được", "thu về"]
+    EXPENSE_KEYWORDS = ["chi phí", "chi tiêu", "tiền chi"]
+    MONTHLY_KEYWORDS = ["/tháng", "/ tháng", "mỗi tháng", "một tháng", "1 tháng", "hàng tháng", "/th"]
+
+    YEAR_PREFIX = re.compile(r'năm\s*$')
+    AMOUNT_PATTERN = re.compile(
+        r'(\d+(?:[.,]\d+)*)\s*(tỷ|tỉ|triệu|trieu|tr|nghìn|ngàn|nghin|ngan|k|đồng|dong|vnđ|vnd|đ|ty|ti)?(?![\wà-ỹ])',
+        re.IGNORECASE
+    )
+
+    def __init__(self, tax_engine):
+        self.tax_engine = tax_engine
+
+    def answer(self, question):
+        """Return a templated answer for numeric tax questions, None if the LLM is needed"""
+        intent = self.extract(question)
+        if not intent:
+            return None
+
+        logger.info(f"🧮 Answering locally: revenue={intent['revenue']}, business_type={intent['business_type']}")
+        return {
+            "answer": self._render(intent),
+            "sources": ["Biểu thuế - configs/tax_rules.yaml"],
+            "disclaimer": DISCLAIMER,
+        }
+
+    def extract(self, question):
+        """Extract intent and entities (revenue, expenses, business type) from a question"""
+        if not question:
+            return None
+
+        text = question.lower()
+        if any(kw in text for kw in self.OPEN_ENDED + self.OTHER_TOPICS):
+            return None
+        if not any(kw in text for kw in self.TAX_KEYWORDS):
+            return None
+
+        business_type = self._detect_business_type(text)
+        revenue = None
+        expenses = 0.0
+        for start, end, amount in self._find_amounts(text):
+            kind = self._nearest_keyword(text, start, end)
+            if kind == "expense":
+                expenses = amount
+            elif revenue is None and (kind == "revenue" or (kind is None and business_type)):
+                # Without a revenue keyword only a business type ("quán ăn thuế 200 triệu") makes it revenue
+                revenue = amount
+
+        if revenue is None:
+            return None
+
+        monthly = any(kw in text for kw in self.MONTHLY_KEYWORDS)
+        if monthly:
+            revenue *= 12
+            expenses *= 12
+
+        return {
+            "intent": "tax_liability",
+            "revenue": revenue,
+            "expenses": expenses,
+            "business_type": business_type or self.tax_engine.rules.default_business_type,
+            "business_type_assumed": business_type is None,
+            "monthly": monthly,
+        }
+
+    def parse_amount(self, text):
+        """Parse the first Vietnamese amount in text ("200 triệu", "1,5 tỷ") into VNĐ"""
+        amounts = self._find_amounts(text.lower())
+        return amounts[0][2] if amounts else None
+
+    def _nearest_keyword(self, text, start, end):
+        """Kind ("revenue"/"expense") of the keyword closest to an amount, the earlier one on a tie; None without keywords"""
+        nearest = None
+        for kind, keywords in (("revenue", self.REVENUE_KEYWORDS), ("expense", self.EXPENSE_KEYWORDS)):
+            for kw in keywords:
+                before = text.rfind(kw, 0, start)
+                if before >= 0:
+                    candidate = (max(start - before - len(kw), 0), 0, kind)
+                    nearest = min(nearest, candidate) if nearest else candidate
+                after = text.find(kw, end)
+                if after >= 0:
+                    candidate = (after - end, 1, kind)
+                    nearest = min(nearest, candidate) if nearest else candidate
+        return nearest[2] if nearest else None
+
+    def _find_amounts(self, text):
+        """Find (start, end, value) of every amount, merging compounds like "1 tỷ 200 triệu" """
+        amounts = []
+        last_end = None
+        last_unit = None
+        for match in self.AMOUNT_PATTERN.finditer(text):
+            number, unit = match.group(1), (match.group(2) or "").lower()
+            multiplier = self.UNITS.get(unit, 1)
+            value = self._parse_number(number, has_unit=multiplier > 1) * multiplier
+
+            # "1 tỷ 200 triệu" -> a smaller unit right after a larger one continues the amount
+            if (amounts and last_end is not None and multiplier > 1 and last_unit
+                    and multiplier < last_unit and not text[last_end:match.start()].strip()):
+                amounts[-1] = (amounts[-1][0], match.end(), amounts[-1][2] + value)
+            elif value >= 1000 and not (unit == "" and self._is_year(text, match)):
+                amounts.append((match.start(), match.end(), value))
+            else:
+                # Bare small numbers ("1 tháng", "2 người") and years ("năm 2024") are not amounts
+                last_end, last_unit = None, None
+                continue
+
+            last_end = match.end()
+            last_unit = multiplier if multiplier > 1 else None
+        return amounts
+
+    def _is_year(self, text, match):
+        number = match.group(1)
+        return len(number) == 4 and 1900 <= int(number) <= 2100 and bool(self.YEAR_PREFIX.search(text, 0, match.start()))
+
+    def _parse_number(self, number, has_unit):
+        """Parse digits with Vietnamese separators; with a unit a short tail is a decimal part"""
+        parts = re.split(r'[.,]', number)
+        if len(parts) == 2 and has_unit and len(parts[1]) <= 2:
+            return float(f"{parts[0]}.{parts[1]}")
+        if len(parts) == 2 and len(parts[1]) != 3:
+            return float(f"{parts[0]}.{parts[1]}")
+        return float("".join(parts))
+
+    def _detect_business_type(self, text):
+        for business_type, keywords in self.BUSINESS_TYPES.items():
+            if business_type in self.tax_engine.rules.business_types() and any(kw in text for kw in keywords):
+                return business_type
+        return None
+
+    def _render(self, intent):
+        revenue = intent["revenue"]
+        expenses = intent["expenses"]
+        business_type = intent["business_type"]
+        result = self.tax_engine.calculate_tax(revenue, expenses, business_type)
+        tax = result["estimated_tax"]
+        rule = self.tax_engine.get_rule(business_type)
+        type_name = self.BUSINESS_TYPE_NAMES.get(business_type, business_type)
+
+        lines = [f"Chào bạn, với doanh thu {self._format_vnd(revenue)}/năm (ngành {type_name}), số thuế ước tính như sau:"]
+        if intent["monthly"]:
+            lines.append(f"(Doanh thu theo tháng đã được quy ra năm: {self._format_vnd(revenue / 12)} × 12 tháng)")
+        lines.append("")
+        if rule.exempt(revenue):
+            # At or below the threshold there is no VAT/PIT to show, and no rate advice that would contradict it
+            lines.append(f"- Doanh thu không vượt ngưỡng {self._format_vnd(rule.threshold)}/năm nên không phải nộp thuế GTGT, TNCN")
+            lines.append(f"- Chỉ nộp lệ phí môn bài: {self._format_vnd(tax['license_fee'])}/năm")
+        else:
+            lines.append(f"- Thuế GTGT: {self._format_vnd(revenue)} × {rule.vat_rate * 100:g}% = {self._format_vnd(tax['vat'])}")
+            lines.append(f"- Thuế TNCN: {self._format_vnd(revenue)} × {rule.pit_rate * 100:g}% = {self._format_vnd(tax['pit'])}")
+            lines.append(f"- Lệ phí môn bài: {self._format_vnd(tax['license_fee'])}")
+            lines.append(f"Tổng cộng: {self._format_vnd(tax['total'])}/năm (khoảng {self._format_vnd(tax['total'] / 12)}/tháng)")
+
+            notes = result["notes"] + self.tax_engine.get_rule_advice(revenue, expenses, business_type)
+            if notes:
+                lines.append("")
+                lines.extend(f"- {note}" for note in notes)
+
+        if intent["business_type_assumed"]:
+            lines.append("")
+            lines.append(f"Bạn chưa nêu ngành nghề nên tôi tạm tính theo ngành {type_name}. "
+                         "Hãy cho biết ngành nghề (bán lẻ, dịch vụ, ăn uống...) để có kết quả chính xác hơn.")
+
+        lines.append("")
+        lines.append(DISCLAIMER)
+        return "\n".join(lines)
+
+    def _format_vnd(self, amount):
+        return f"{amount:,.0f} VNĐ".replace(",", ".")
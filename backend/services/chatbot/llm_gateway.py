@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "30"))
+
+class LLMGatewayError(Exception):
+    """Request shed by the gateway; maps to an HTTP status with Retry-After"""
+    status_code = 503
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+class LLMOverloadedError(LLMGatewayError):
+    status_code = 429
+
+class LLMTimeoutError(LLMGatewayError):
+    status_code = 503
+
+class LLMGateway:
+    """Runs blocking LLM calls on a dedicated thread pool with bounded concurrency.
+
+    Calls never touch FastAPI's shared threadpool, so slow LLM responses cannot
+    starve other endpoints. At most ``max_concurrency`` calls run at once, at most
+    ``max_queue`` wait for a slot, and identical in-flight calls (same key) share
+    one result.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE,
+                 queue_timeout=LLM_QUEUE_TIMEOUT, call_timeout=LLM_CALL_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._in_flight = {}
+        self._admitted = 0
+        self._running = 0
+        self._avg_latency = 2.0
+        self.counters = {"calls": 0, "coalesced": 0, "shed": 0, "timeouts": 0, "errors": 0}
+
+    async def submit(self, fn, *args, key=None):
+        """Run fn(*args) through the gateway; calls with the same key are coalesced"""
+        if key is not None and key in self._in_flight:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(self._in_flight[key])
+
+        task = asyncio.ensure_future(self._run(fn, *args))
+        if key is not None:
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shielded so one client disconnecting does not cancel a shared call
+        return await asyncio.shield(task)
+
+    async def _run(self, fn, *args):
+        # Admitted = running + queued; counted before awaiting so bursts are shed deterministically
+        if self._admitted >= self.max_concurrency + self.max_queue:
+            self.counters["shed"] += 1
+            logger.warning(f"⚠️ LLM gateway full ({self._admitted} admitted), shedding request")
+            raise LLMOverloadedError("LLM queue is full, please retry later", self._retry_after())
+
+        self._admitted += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except BaseException as e:
+            self._admitted -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.counters["shed"] += 1
+                raise LLMTimeoutError("Timed out waiting for an LLM slot", self._retry_after())
+            raise
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self._running += 1
+        self.counters["calls"] += 1
+        future = asyncio.wrap_future(self._executor.submit(fn, *args))
+        # The slot is freed when the thread finishes, not when we stop waiting,
+        # so timed-out calls still count against the concurrency limit
+        future.add_done_callback(lambda _: self._release(loop.time() - started))
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.call_timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise LLMTimeoutError("LLM call timed out", self._retry_after())
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+
+    def _release(self, elapsed):
+        self._running -= 1
+        self._admitted -= 1
+        self._avg_latency = 0.8 * self._avg_latency + 0.2 * elapsed
+        self._slots.release()
+
+    def _retry_after(self):
+        """Rough time until a queued call would get a slot"""
+        return self._avg_latency * (self._admitted / self.max_concurrency + 1)
+
+    def stats(self):
+        return {
+            "running": self._running,
+            "waiting": self._admitted - self._running,
+            "in_flight_keys": len(self._in_flight),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "avg_latency_s": round(self._avg_latency, 3),
+            **self.counters
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
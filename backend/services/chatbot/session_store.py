@@ -0,0 +1,186 @@
+import logging
+import os
+import secrets
+
+from starlette.concurrency import run_in_threadpool
+
+from db.database import SessionLocal
+from db.chat_model import ChatSession, ChatMessage
+
+logger = logging.getLogger(__name__)
+
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "3"))
+CHAT_SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "1500"))
+CHAT_MESSAGE_MAX_CHARS = 800
+
+class ChatSessionStore:
+    """Server-side chat sessions with a running summary of older turns.
+
+    The prompt carries the summary plus the messages not folded into it yet.
+    Compaction starts as soon as those exceed the last CHAT_HISTORY_TURNS
+    turns, so the prompt size stays flat however long the session gets. If
+    compaction keeps failing, only the newest max_context_messages of them are
+    sent; the rest are folded in once a compaction succeeds.
+    """
+
+    USER = "user"
+    ASSISTANT = "assistant"
+
+    def __init__(self, history_turns=CHAT_HISTORY_TURNS, summary_max_chars=CHAT_SUMMARY_MAX_CHARS):
+        self.history_turns = history_turns
+        self.summary_max_chars = summary_max_chars
+        # The window plus as many turns again for those arriving while a compaction runs
+        self.max_context_messages = history_turns * 4
+        self._compacting = set()
+
+    def get_or_create(self, db, session_id, user_id, token=None):
+        """Load an accessible session (see get), or start a new one when session_id is None"""
+        if session_id is None:
+            # Anonymous sessions get a secret token; their ids are sequential and must not be enough
+            session = ChatSession(user_id=user_id, token=secrets.token_urlsafe(32) if user_id is None else None)
+            db.add(session)
+            db.commit()
+            db.refresh(session)
+            return session
+        return self.get(db, session_id, user_id, token)
+
+    def get(self, db, session_id, user_id, token=None):
+        """A session owned by user_id, or an anonymous one whose token matches; None otherwise"""
+        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        if not session:
+            return None
+        if session.user_id is not None:
+            return session if user_id is not None and session.user_id == user_id else None
+        if token and session.token and secrets.compare_digest(session.token, token):
+            return session
+        return None
+
+    def get_context(self, db, session):
+        """(summary, messages not in the summary) to put in the prompt"""
+        # Unsummarized messages beyond the window too: until a compaction has run, older ones
+        # are in neither the window nor the summary. Capped in case compaction keeps failing.
+        recent = (
+            db.query(ChatMessage)
+            .filter(ChatMessage.session_id == session.id, ChatMessage.id > session.summarized_until)
+            .order_by(ChatMessage.id.desc())
+            .limit(self.max_context_messages + 1)
+            .all()
+        )
+        if len(recent) > self.max_context_messages:
+            logger.warning(f"⚠️ Chat session {session.id} has more unsummarized messages than fit the prompt, sending the newest {self.max_context_messages}")
+            recent = recent[:self.max_context_messages]
+        history = [(m.role, m.content[:CHAT_MESSAGE_MAX_CHARS]) for m in reversed(recent)]
+        return session.summary, history
+
+    def record_turn(self, db, session, question, answer):
+        db.add(ChatMessage(session_id=session.id, role=self.USER, content=question))
+        db.add(ChatMessage(session_id=session.id, role=self.ASSISTANT, content=answer))
+        # Incremented in SQL: concurrent turns in one session must not overwrite each other's count
+        db.query(ChatSession).filter(ChatSession.id == session.id).update(
+            {ChatSession.message_count: ChatSession.message_count + 2}, synchronize_session=False
+        )
+        db.query(ChatSession).filter(ChatSession.id == session.id, ChatSession.title.is_(None)).update(
+            {ChatSession.title: question[:80]}, synchronize_session=False
+        )
+        db.commit()
+
+    def needs_compaction(self, session):
+        unsummarized = (session.message_count or 0) - (session.summarized_count or 0)
+        return unsummarized > self.history_turns * 2
+
+    def messages_to_fold(self, db, session):
+        """Messages older than the verbatim window that are not in the summary yet"""
+        keep = (
+            db.query(ChatMessage.id)
+            .filter(ChatMessage.session_id == session.id)
+            .order_by(ChatMessage.id.desc())
+            .offset(self.history_turns * 2 - 1)
+            .limit(1)
+            .scalar()
+        )
+        if keep is None:
+            return []
+        return (
+            db.query(ChatMessage)
+            .filter(
+                ChatMessage.session_id == session.id,
+                ChatMessage.id > session.summarized_until,
+                ChatMessage.id < keep
+            )
+            .order_by(ChatMessage.id)
+            .all()
+        )
+
+    async def compact(self, session_id, summarize):
+        """Fold turns that left the verbatim window into the running summary.
+
+        Runs as a background task with its own DB session. ``summarize`` is an
+        async callable (summary, [(role, content)]) -> str or None; when it fails
+        an extractive summary is used instead.
+        """
+        if session_id in self._compacting:
+            return
+        self._compacting.add(session_id)
+        db = SessionLocal()
+        try:
+            session = await run_in_threadpool(db.get, ChatSession, session_id)
+            folded = await run_in_threadpool(self.messages_to_fold, db, session) if session else []
+            if not folded:
+                return
+
+            summary = None
+            try:
+                summary = await summarize(
+                    session.summary, [(m.role, m.content[:CHAT_MESSAGE_MAX_CHARS]) for m in folded]
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Chat summary failed for session {session_id}: {str(e)}")
+            if not summary or not summary.strip():
+                summary = self.fallback_summary(session.summary, folded)
+
+            await run_in_threadpool(self.apply_summary, db, session, summary.strip(), folded)
+        finally:
+            db.close()
+            self._compacting.discard(session_id)
+
+    def apply_summary(self, db, session, summary, folded):
+        """Store the new running summary covering everything up to the last folded message"""
+        # Only over the state the messages were folded from: another worker may have compacted meanwhile
+        db.query(ChatSession).filter(
+            ChatSession.id == session.id, ChatSession.summarized_until == session.summarized_until
+        ).update({
+            ChatSession.summary: summary[-self.summary_max_chars:],
+            ChatSession.summarized_until: folded[-1].id,
+            ChatSession.summarized_count: ChatSession.summarized_count + len(folded)
+        }, synchronize_session=False)
+        db.commit()
+
+    def fallback_summary(self, summary, folded):
+        """Extractive summary used when the LLM cannot summarize"""
+        lines = [summary] if summary else []
+        lines.extend(f"- Khách hàng hỏi: {m.content[:150]}" for m in folded if m.role == self.USER)
+        return "\n".join(lines)
+
+    def list_sessions(self, db, user_id, limit=20, before_id=None):
+        """Newest sessions first, keyset-paginated on id"""
+        query = db.query(ChatSession).filter(ChatSession.user_id == user_id)
+        if before_id is not None:
+            query = query.filter(ChatSession.id < before_id)
+        items = query.order_by(ChatSession.id.desc()).limit(limit + 1).all()
+        return self._page(items, limit)
+
+    def list_messages(self, db, session, limit=50, before_id=None):
+        """Newest messages first, keyset-paginated on id"""
+        query = db.query(ChatMessage).filter(ChatMessage.session_id == session.id)
+        if before_id is not None:
+            query = query.filter(ChatMessage.id < before_id)
+        items = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+        return self._page(items, limit)
+
+    def _page(self, items, limit):
+        has_more = len(items) > limit
+        items = items[:limit]
+        return {
+            "items": items,
+            "next_before_id": items[-1].id if has_more else None
+        }
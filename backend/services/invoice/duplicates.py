@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+import re
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps
+from sqlalchemy import bindparam, event, inspect, select, union_all
+from sqlalchemy.orm import Session
+
+from db.models import Invoice
+from services.invoice.line_items import normalize_item_name
+from services.ocr.confidence import GENERATED_NUMBER
+
+logger = logging.getLogger(__name__)
+
+# Hamming distance under which two receipt images count as the same photo (rescaled, recompressed)
+DUPLICATE_HASH_RADIUS = int(os.getenv("DUPLICATE_HASH_RADIUS", "3"))
+# The 64-bit hash is indexed as four 16-bit chunks; two hashes within distance 3 share at least one
+HASH_CHUNKS = 4
+CHUNK_BITS = 16
+MAX_RADIUS = HASH_CHUNKS - 1
+# Near-blank images hash to (almost) all zeros or ones and would all match each other
+MIN_HASH_BITS = 8
+NON_ALNUM = re.compile(r'[^0-9A-Z]+')
+KEY_ATTRIBUTES = ("invoice_number", "seller_name", "seller_tax_code", "date", "total")
+
+@dataclass(frozen=True, slots=True)
+class DuplicateMatch:
+    invoice_id: int
+    # "same_image" (identical bytes), "similar_image" (perceptual hash) or "same_invoice" (seller, number, date, total)
+    reason: str
+    distance: int = 0
+
+class DuplicateDetector:
+    """Finds a user's existing invoice for a new upload or import.
+
+    Before OCR the image is compared by SHA-256 and by a 64-bit difference
+    hash (dHash); near matches are found with multi-index hashing, i.e. an
+    exact index lookup on each 16-bit chunk of the hash followed by a Hamming
+    distance check of the few candidates. After OCR the parsed seller,
+    invoice number, date and total form an exact key with its own index.
+    """
+
+    def __init__(self, radius=DUPLICATE_HASH_RADIUS):
+        if radius > MAX_RADIUS:
+            logger.warning(f"⚠️ DUPLICATE_HASH_RADIUS={radius} is above {MAX_RADIUS}, the most the chunk index can search; using {MAX_RADIUS}")
+        self.radius = max(0, min(radius, MAX_RADIUS))
+        # Built once: lookups run on every upload, and statement construction costs more than the query
+        columns = [Invoice.id, Invoice.image_sha256] + [getattr(Invoice, f"image_dhash_{index}") for index in range(HASH_CHUNKS)]
+        user_id = bindparam("user_id")
+        self._by_sha256 = select(*columns).where(Invoice.user_id == user_id, Invoice.image_sha256 == bindparam("sha256"))
+        # Exact sha256 match, plus one indexed lookup per hash chunk (with OR, planners scan the user's invoices)
+        self._by_image = union_all(self._by_sha256, *(
+            select(*columns).where(Invoice.user_id == user_id, columns[2 + index] == bindparam(f"chunk_{index}"))
+            for index in range(HASH_CHUNKS)
+        ))
+        self._by_key = select(Invoice.id).where(
+            Invoice.user_id == bindparam("user_id"), Invoice.invoice_key == bindparam("invoice_key")
+        ).limit(1)
+
+    def register(self):
+        """Recompute invoice_key whenever a flush changes the fields it is made of (reviews, re-parses)"""
+        event.listen(Session, "before_flush", self._refresh_keys)
+
+    def _refresh_keys(self, session, flush_context, instances):
+        for obj in session.dirty:
+            if isinstance(obj, Invoice) and any(
+                inspect(obj).attrs[attribute].history.has_changes() for attribute in KEY_ATTRIBUTES
+            ):
+                obj.invoice_key = self.key_of(obj)
+
+    def image_hash(self, image_path):
+        """64-bit dHash of an image (None for PDFs, unreadable or near-blank images)"""
+        try:
+            with Image.open(image_path) as image:
+                # JPEG decoders can downscale while decoding, which is most of the work here
+                image.draft("L", (64, 64))
+                image = ImageOps.exif_transpose(image).convert("L").resize((9, 8), Image.LANCZOS)
+                pixels = list(image.getdata())
+        except Exception:
+            return None
+        value = 0
+        for row in range(8):
+            for column in range(8):
+                left, right = pixels[row * 9 + column], pixels[row * 9 + column + 1]
+                value = (value << 1) | (left > right)
+        if not MIN_HASH_BITS <= bin(value).count("1") <= 64 - MIN_HASH_BITS:
+            return None
+        return value
+
+    def hash_columns(self, image_hash):
+        """{"image_dhash_0": ..., ...} for an Invoice; all None without a hash"""
+        chunks = _chunks(image_hash) if image_hash is not None else [None] * HASH_CHUNKS
+        return {f"image_dhash_{index}": chunk for index, chunk in enumerate(chunks)}
+
+    def stored_hash(self, invoice):
+        chunks = [getattr(invoice, f"image_dhash_{index}") for index in range(HASH_CHUNKS)]
+        if any(chunk is None for chunk in chunks):
+            return None
+        value = 0
+        for chunk in chunks:
+            value = (value << CHUNK_BITS) | chunk
+        return value
+
+    def invoice_key(self, invoice_data):
+        """Hex key of (seller, invoice number, date, total); None without a real invoice number"""
+        number = NON_ALNUM.sub("", str(invoice_data.get("invoice_number") or "").upper())
+        if not number or GENERATED_NUMBER.match(number):
+            return None
+        # The tax code identifies the seller better than an OCR'd name
+        seller = NON_ALNUM.sub("", str(invoice_data.get("seller_tax_code") or "").upper())
+        if not seller:
+            seller = normalize_item_name(str(invoice_data.get("seller_name") or ""))
+        issued_on = invoice_data.get("date")
+        issued_on = issued_on.isoformat() if hasattr(issued_on, "isoformat") else str(issued_on or "")
+        total = round(float(invoice_data.get("total") or 0))
+        return hashlib.sha1(f"{seller}|{number}|{issued_on}|{total}".encode("utf-8")).hexdigest()
+
+    def key_of(self, invoice):
+        """invoice_key of a saved Invoice row"""
+        return self.invoice_key({attribute: getattr(invoice, attribute) for attribute in KEY_ATTRIBUTES})
+
+    def find_by_image(self, db, user_id, sha256, image_hash):
+        """The user's invoice with the same image bytes, else the nearest one within the radius"""
+        if image_hash is None:
+            rows = db.execute(self._by_sha256, {"user_id": user_id, "sha256": sha256})
+        else:
+            chunks = _chunks(image_hash)
+            rows = db.execute(self._by_image, {
+                "user_id": user_id, "sha256": sha256,
+                **{f"chunk_{index}": chunk for index, chunk in enumerate(chunks)}
+            })
+        best = None
+        for invoice_id, row_sha256, *row_chunks in rows:
+            if row_sha256 == sha256:
+                return DuplicateMatch(invoice_id, "same_image")
+            if image_hash is None or None in row_chunks:
+                continue
+            distance = sum(bin(a ^ b).count("1") for a, b in zip(row_chunks, chunks))
+            if distance <= self.radius and (best is None or distance < best.distance):
+                best = DuplicateMatch(invoice_id, "similar_image", distance)
+        return best
+
+    def find_by_key(self, db, user_id, invoice_key):
+        if invoice_key is None:
+            return None
+        existing = db.execute(self._by_key, {"user_id": user_id, "invoice_key": invoice_key}).scalar()
+        return DuplicateMatch(existing, "same_invoice") if existing is not None else None
+
+def _chunks(value):
+    mask = (1 << CHUNK_BITS) - 1
+    return [(value >> (CHUNK_BITS * (HASH_CHUNKS - 1 - index))) & mask for index in range(HASH_CHUNKS)]
@@ -0,0 +1,204 @@
+import logging
+import os
+import zipfile
+from datetime import datetime
+
+try:
+    # Hardened against entity expansion attacks; XML is not parsed at all without it
+    from defusedxml.ElementTree import iterparse
+    DEFUSEDXML_AVAILABLE = True
+except ImportError:
+    DEFUSEDXML_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+EINVOICE_MAX_FILES = int(os.getenv("EINVOICE_MAX_FILES", "1000"))
+EINVOICE_MAX_FILE_SIZE = int(os.getenv("EINVOICE_MAX_FILE_SIZE", str(5 * 1024 * 1024)))
+
+# Header, seller, buyer and totals sections of an HĐĐT (Decision 1450/QĐ-TCT) document
+SECTIONS = {"TTChung", "NBan", "NMua", "TToan"}
+# TChat (tính chất) 4 is a free-text note line, not goods or services
+NOTE_LINE = "4"
+
+class EInvoiceError(ValueError):
+    """Raised when a document is not a readable e-invoice"""
+
+class EInvoiceParser:
+    """Streaming parser for Vietnamese e-invoice XML (HĐĐT), single files or zip batches.
+
+    Elements are cleared as soon as they are consumed, so memory stays flat
+    whatever the number of invoices or item lines.
+    """
+
+    def parse_upload(self, fileobj, filename=None):
+        """Yield (source name, invoice dict or None, error or None) for an XML file or a zip of them"""
+        if not DEFUSEDXML_AVAILABLE:
+            yield filename or "upload.xml", None, "E-invoice import requires defusedxml (pip install -r requirements.txt)"
+            return
+        head = fileobj.read(4)
+        fileobj.seek(0)
+        if head == b"PK\x03\x04":
+            yield from self.parse_zip(fileobj)
+        else:
+            yield from self._parse_source(fileobj, filename or "upload.xml")
+
+    def parse_zip(self, fileobj):
+        try:
+            archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile:
+            yield "upload.zip", None, "Not a valid zip file"
+            return
+
+        with archive:
+            members = [info for info in archive.infolist() if not info.is_dir() and info.filename.lower().endswith(".xml")]
+            if len(members) > EINVOICE_MAX_FILES:
+                yield "upload.zip", None, f"Zip contains {len(members)} XML files, the limit is {EINVOICE_MAX_FILES}"
+                return
+            for info in members:
+                # Checked before decompressing: the declared size is all a zip bomb has to lie about
+                if info.file_size > EINVOICE_MAX_FILE_SIZE:
+                    yield info.filename, None, f"File exceeds the {EINVOICE_MAX_FILE_SIZE} byte limit"
+                    continue
+                with archive.open(info) as member:
+                    yield from self._parse_source(_LimitedReader(member, EINVOICE_MAX_FILE_SIZE), info.filename)
+
+    def _parse_source(self, fileobj, source):
+        try:
+            found = False
+            for index, invoice, error in self.parse(fileobj):
+                found = True
+                if error:
+                    # One bad invoice is reported on its own; the rest of the file still imports
+                    logger.warning(f"⚠️ E-invoice {source} #{index} rejected: {error}")
+                    yield f"{source}#{index}", None, error
+                else:
+                    yield source, invoice, None
+            if not found:
+                yield source, None, "No HDon element found"
+        except Exception as e:
+            # Unreadable XML: nothing after the error can be parsed
+            logger.warning(f"⚠️ E-invoice {source} rejected: {str(e)}")
+            yield source, None, str(e)
+
+    def parse(self, fileobj):
+        """Yield (position, invoice dict, None) per HDon element, (position, None, error) for one that is invalid"""
+        sections = {}
+        items = []
+        item = None
+        path = []
+        index = 0
+
+        for event, elem in iterparse(fileobj, events=("start", "end")):
+            tag = _local_name(elem.tag)
+            if event == "start":
+                path.append(tag)
+                if tag == "HDon":
+                    sections, items = {name: {} for name in SECTIONS}, []
+                elif tag == "HHDVu":
+                    item = {}
+                continue
+
+            path.pop()
+            if tag == "HHDVu":
+                if item is not None and item.get("TChat") != NOTE_LINE:
+                    items.append(item)
+                item = None
+                elem.clear()
+            elif tag == "HDon":
+                index += 1
+                try:
+                    invoice = self._build(sections, items)
+                except EInvoiceError as e:
+                    yield index, None, str(e)
+                else:
+                    yield index, invoice, None
+                elem.clear()
+            elif len(elem) == 0:
+                text = (elem.text or "").strip()
+                if item is not None and "HHDVu" in path:
+                    item.setdefault(tag, text)
+                else:
+                    # First match wins, so nested blocks (e.g. TTKhac) cannot shadow the direct fields
+                    section = next((name for name in reversed(path) if name in SECTIONS), None)
+                    if section and sections:
+                        sections[section].setdefault(tag, text)
+            elif tag in SECTIONS or tag in ("DSHHDVu", "DSCKS"):
+                elem.clear()
+
+    def _build(self, sections, items):
+        header, seller, buyer, totals = sections["TTChung"], sections["NBan"], sections["NMua"], sections["TToan"]
+        number = header.get("SHDon")
+        issued = header.get("NLap")
+        if not number or not issued:
+            raise EInvoiceError("Missing invoice number (SHDon) or issue date (NLap)")
+        try:
+            issued_on = datetime.strptime(issued[:10], "%Y-%m-%d").date()
+        except ValueError:
+            raise EInvoiceError(f"Invalid issue date '{issued}'")
+
+        # Amounts in a foreign currency are converted with the invoice's exchange rate
+        rate = 1.0
+        if header.get("DVTTe", "VND").upper() != "VND":
+            rate = _amount(header.get("TGia")) or 1.0
+        parsed_items = []
+        for line in items:
+            amount = _amount(line.get("ThTien"))
+            if amount is None:
+                continue
+            quantity = _amount(line.get("SLuong")) or 1.0
+            unit_price = _amount(line.get("DGia"))
+            parsed_items.append({
+                "name": line.get("THHDVu") or "",
+                "quantity": quantity,
+                "unit_price": (unit_price if unit_price is not None else amount / quantity) * rate,
+                "amount": amount * rate
+            })
+
+        subtotal = _amount(totals.get("TgTCThue"))
+        if subtotal is None:
+            subtotal = sum(item["amount"] for item in parsed_items) / rate
+        vat = _amount(totals.get("TgTThue")) or 0.0
+        total = _amount(totals.get("TgTTTBSo"))
+        if total is None:
+            total = subtotal + vat
+
+        symbol = header.get("KHHDon")
+        return {
+            "invoice_number": f"{symbol}-{number}" if symbol else number,
+            "date": issued_on,
+            "seller_name": seller.get("Ten"),
+            "seller_tax_code": seller.get("MST"),
+            "buyer_name": buyer.get("Ten") or buyer.get("HVTNMHang"),
+            "buyer_tax_code": buyer.get("MST"),
+            "payment_method": header.get("HTTToan"),
+            "subtotal": subtotal * rate,
+            "vat": vat * rate,
+            "total": total * rate,
+            "items": parsed_items
+        }
+
+class _LimitedReader:
+    """Stops reading a zip member past max_size, whatever its header claimed"""
+
+    def __init__(self, fileobj, max_size):
+        self.fileobj = fileobj
+        self.remaining = max_size
+
+    def read(self, size=-1):
+        size = self.remaining + 1 if size is None or size < 0 else min(size, self.remaining + 1)
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        if self.remaining < 0:
+            raise EInvoiceError("File exceeds the size limit once decompressed")
+        return data
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+def _amount(text):
+    if text is None or text == "":
+        return None
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return None
@@ -0,0 +1,107 @@
+import logging
+import re
+
+from sqlalchemy import delete, event, insert, inspect
+from sqlalchemy.orm import Session
+
+from db.models import Invoice, InvoiceLineItem
+from services.expense.classifier import ExpenseClassifier
+from services.ocr.layout_parser import fold
+
+logger = logging.getLogger(__name__)
+
+# Invoice columns copied into invoice_items; a change to any of them rewrites the invoice's rows
+SYNCED_ATTRIBUTES = ("items", "user_id", "invoice_type", "date")
+NON_WORD = re.compile(r'[^0-9a-z]+')
+
+def normalize_item_name(name):
+    """'Cà Phê Sữa (ly)' -> 'ca phe sua ly'"""
+    return NON_WORD.sub(" ", fold(name)).strip()
+
+class LineItemIndex:
+    """Mirrors Invoice.items into the invoice_items table.
+
+    register() rewrites an invoice's rows in the same flush that inserts,
+    edits or deletes the invoice, so every write path (uploads, e-invoice
+    imports, reviews, re-parses) stays in sync without calling it.
+    backfill() fills the table for invoices written before it existed.
+    """
+
+    def __init__(self, classifier=None):
+        self.classifier = classifier or ExpenseClassifier()
+
+    def register(self):
+        event.listen(Session, "after_flush", self._sync_flushed)
+
+    def _sync_flushed(self, session, flush_context):
+        changed, deleted = [], []
+        for obj in session.new:
+            if isinstance(obj, Invoice):
+                changed.append(obj)
+        for obj in session.dirty:
+            if isinstance(obj, Invoice) and any(
+                inspect(obj).attrs[attribute].history.has_changes() for attribute in SYNCED_ATTRIBUTES
+            ):
+                changed.append(obj)
+        for obj in session.deleted:
+            if isinstance(obj, Invoice):
+                deleted.append(obj.id)
+        if changed or deleted:
+            self.write(session.connection(), changed, deleted)
+
+    def write(self, connection, invoices, deleted_ids=()):
+        """Replace the rows of the given invoices; returns the number of rows inserted"""
+        ids = [invoice.id for invoice in invoices] + list(deleted_ids)
+        connection.execute(delete(InvoiceLineItem.__table__).where(InvoiceLineItem.__table__.c.invoice_id.in_(ids)))
+        rows = [row for invoice in invoices for row in self.rows(invoice)]
+        if rows:
+            connection.execute(insert(InvoiceLineItem.__table__), rows)
+        return len(rows)
+
+    def rows(self, invoice):
+        rows = []
+        for position, item in enumerate(invoice.items or []):
+            if not isinstance(item, dict):
+                continue
+            name = str(item.get("name") or "").strip()
+            if not name:
+                continue
+            rows.append({
+                "invoice_id": invoice.id,
+                "position": position,
+                "user_id": invoice.user_id,
+                "invoice_type": invoice.invoice_type,
+                "date": invoice.date,
+                "name": name,
+                "name_normalized": normalize_item_name(name),
+                "category": self.classifier.classify(name)["category"],
+                "quantity": _number(item.get("quantity")),
+                "unit_price": _number(item.get("unit_price")),
+                "amount": _number(item.get("amount")),
+            })
+        return rows
+
+    def backfill(self, db, batch_size=1000):
+        """Rebuild the rows of every invoice, a batch at a time; safe to run repeatedly"""
+        stats = {"invoices": 0, "items": 0}
+        last_id = 0
+        while True:
+            invoices = (
+                db.query(Invoice).filter(Invoice.id > last_id).order_by(Invoice.id).limit(batch_size).all()
+            )
+            if not invoices:
+                break
+            stats["items"] += self.write(db.connection(), invoices)
+            stats["invoices"] += len(invoices)
+            last_id = invoices[-1].id
+            db.commit()
+            # Committed rows are expired anyway; dropping them keeps memory flat on large tables
+            db.expunge_all()
+            logger.info(f"🧾 Indexed {stats['items']} items of {stats['invoices']} invoices")
+        return stats
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,209 @@
+from dataclasses import dataclass
+
+DIGITS = frozenset("0123456789")
+# Thousands or decimal separators
+POINTS = frozenset(".,")
+# Thousands separators only, and only between regular 3-digit groups, or a space
+# would join neighbouring numbers ("SL 2 50.000")
+SPACES = frozenset(" \u00a0\u202f")
+# Tried in this order; "đồng" before "đ" so the longer one is consumed
+SUFFIXES = ("vnđ", "vnd", "đồng", "dong", "đ", "₫")
+# Longer digit runs are two amounts OCR glued together far more often than one real amount
+MAX_DIGITS = 10
+
+@dataclass(frozen=True, slots=True)
+class AmountToken:
+    text: str
+    start: int
+    end: int
+    # None when the token cannot be read without guessing; ambiguity says why
+    value: float = None
+    kind: str = None
+    currency: bool = False
+    ambiguity: str = None
+
+class AmountLexer:
+    """Deterministic reader for Vietnamese amounts (68.391 / 68,391 / 68 391 / 1.234.567,50 / 55.000đ).
+
+    A single left-to-right scan splits each number into digit groups and the
+    separators between them, then reads an optional currency suffix. A number
+    never starts right after a point ("v1.2" is not "2"), and a space only
+    continues one when a 3-digit group follows it. The shape (separator
+    characters and group lengths) is looked up in a fixed rule table; shapes
+    that fit no rule are reported as ambiguous instead of being forced into a
+    value:
+
+        kind         shape                             example
+        integer      digits only, at most 10          68391
+        thousands    one separator, 1-3 then 3s       68.391, 1,234,567, 68 391
+        decimal      one separator once, then 1-2      68,50, 68.5
+        mixed        thousands, then the other one     1.234.567,50, 68,391.50, 68 391,50
+                     separator and 1-2 digits
+
+    Any whitespace between digit groups (space, no-break space) is a
+    thousands separator; it is never a decimal one.
+    """
+
+    def tokenize(self, text):
+        """Yield an AmountToken for every number in text, left to right"""
+        pos = 0
+        while True:
+            scanned = self._scan(text, pos)
+            if scanned is None:
+                return
+            start, groups, separators, pos, currency = scanned
+            kind, value, ambiguity = self.classify(groups, separators)
+            yield AmountToken(
+                text=text[start:pos], start=start, end=pos,
+                value=value, kind=kind, currency=currency, ambiguity=ambiguity
+            )
+
+    def parse(self, text):
+        """The single amount in text; an ambiguous token when there is none or several"""
+        tokens = list(self.tokenize(str(text or "")))
+        if len(tokens) == 1:
+            return tokens[0]
+        return AmountToken(text=str(text or ""), start=0, end=len(str(text or "")),
+                           ambiguity="no_number" if not tokens else "multiple_numbers")
+
+    def value(self, text):
+        """Float for an amount string, 0.0 when it is missing or ambiguous"""
+        # Same result as parse(), without building tokens: this runs for every candidate number
+        text = str(text or "")
+        first = self._scan(text, 0)
+        if first is None or self._scan(text, first[3]) is not None:
+            return 0.0
+        value = self.classify(first[1], first[2])[1]
+        return value if value and value > 0 else 0.0
+
+    def _scan(self, text, pos):
+        """(start, digit groups, separators, end, currency) of the first number from pos on; None when there is none"""
+        length = len(text)
+        while pos < length:
+            if text[pos] not in DIGITS:
+                pos += 1
+                continue
+            start = pos
+            pos = self._digits(text, pos)
+            if start and text[start - 1] in POINTS:
+                # The tail of something else, such as a version or a code: skip the whole run
+                continue
+
+            groups = [text[start:pos]]
+            separators = []
+            if pos - start <= 3 and pos < length and text[pos] in SPACES:
+                end = self._space_groups(text, pos, groups, separators)
+            else:
+                end = None
+            if end is None:
+                end = pos
+                while end + 1 < length and text[end] in POINTS and text[end + 1] in DIGITS:
+                    group_end = self._digits(text, end + 1)
+                    separators.append(text[end])
+                    groups.append(text[end + 1:group_end])
+                    end = group_end
+
+            suffix_end = self._suffix(text, end)
+            if suffix_end is None:
+                return start, groups, separators, end, False
+            return start, groups, separators, suffix_end, True
+        return None
+
+    def _space_groups(self, text, pos, groups, separators):
+        """End of the space-grouped number whose first group ends at pos, appending its groups; None when it is not one"""
+        length = len(text)
+        group_ends = []
+        while (
+            pos + 3 < length and text[pos] in SPACES
+            and text[pos + 1] in DIGITS and text[pos + 2] in DIGITS and text[pos + 3] in DIGITS
+        ):
+            pos += 4
+            group_ends.append(pos)
+        if not group_ends:
+            return None
+
+        # The last group must end the digits, optionally followed by a 1-2 digit decimal part
+        decimal_end = None
+        if pos < length and text[pos] in POINTS and pos + 1 < length and text[pos + 1] in DIGITS:
+            decimal_end = self._digits(text, pos + 1)
+            if decimal_end - pos > 3 or self._continues(text, decimal_end):
+                decimal_end = None
+            last_ok = decimal_end is not None
+        else:
+            last_ok = not (pos < length and text[pos] in DIGITS)
+        if not last_ok:
+            # Without the last group the number ends at a space, which always works
+            group_ends.pop()
+            if not group_ends:
+                return None
+            decimal_end = None
+
+        group_start = group_ends[0] - 4
+        for group_end in group_ends:
+            separators.append(" ")
+            groups.append(text[group_start + 1:group_end])
+            group_start = group_end
+        if decimal_end is None:
+            return group_ends[-1]
+        separators.append(text[group_start])
+        groups.append(text[group_start + 1:decimal_end])
+        return decimal_end
+
+    def _suffix(self, text, pos):
+        """End of a currency suffix (whitespace allowed before it) after the number ending at pos; None without one"""
+        length = len(text)
+        while pos < length and text[pos].isspace():
+            pos += 1
+        if pos == length or text[pos] not in "vVdDđĐ₫":
+            return None
+        head = text[pos:pos + 4].lower()
+        for suffix in SUFFIXES:
+            end = pos + len(suffix)
+            # Not when the word goes on: "dong" in "dongtien" is not a currency
+            if head.startswith(suffix) and (end == length or not self._is_letter(text[end])):
+                return end
+        return None
+
+    def _digits(self, text, pos):
+        """End of the digit run at pos"""
+        length = len(text)
+        while pos < length and text[pos] in DIGITS:
+            pos += 1
+        return pos
+
+    def _continues(self, text, pos):
+        """Whether the number would go on at pos: a digit, or a point followed by one"""
+        length = len(text)
+        if pos >= length:
+            return False
+        return text[pos] in DIGITS or (text[pos] in POINTS and pos + 1 < length and text[pos + 1] in DIGITS)
+
+    def _is_letter(self, char):
+        lower = char.lower()
+        return "a" <= lower <= "z" or "à" <= lower <= "ỹ"
+
+    def classify(self, groups, separators):
+        """(kind, value, ambiguity) for a number's digit groups and the separators between them"""
+        digits = "".join(groups)
+        if len(digits.lstrip("0")) > MAX_DIGITS:
+            return None, None, "too_long"
+        if not separators:
+            return "integer", float(digits), None
+
+        head, tail = groups[0], groups[1:]
+        thousands_head = 1 <= len(head) <= 3
+        if len(set(separators)) == 1:
+            if thousands_head and all(len(group) == 3 for group in tail):
+                return "thousands", float(digits), None
+            if len(separators) == 1 and len(tail[0]) <= 2:
+                return "decimal", float(f"{head}.{tail[0]}"), None
+            return None, None, "irregular_grouping"
+
+        # Two separator characters: only valid as thousands groups followed by a decimal part
+        *grouping, decimal_separator = separators
+        if (
+            len(set(grouping)) == 1 and grouping[0] != decimal_separator
+            and thousands_head and all(len(group) == 3 for group in tail[:-1]) and len(tail[-1]) <= 2
+        ):
+            return "mixed", float(f"{''.join(groups[:-1])}.{groups[-1]}"), None
+        return None, None, "irregular_grouping"
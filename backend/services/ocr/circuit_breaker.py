@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+OCR_BREAKER_WINDOW = float(os.getenv("OCR_BREAKER_WINDOW", "60"))
+OCR_BREAKER_MIN_CALLS = int(os.getenv("OCR_BREAKER_MIN_CALLS", "5"))
+OCR_BREAKER_ERROR_RATE = float(os.getenv("OCR_BREAKER_ERROR_RATE", "0.5"))
+# Calls slower than OCR_BREAKER_SLOW_MS count towards the slow rate; a backend that
+# answers but only near the HTTP timeout is as bad for uploads as one that fails
+OCR_BREAKER_SLOW_MS = float(os.getenv("OCR_BREAKER_SLOW_MS", "10000"))
+OCR_BREAKER_SLOW_RATE = float(os.getenv("OCR_BREAKER_SLOW_RATE", "0.8"))
+OCR_BREAKER_OPEN_SECONDS = float(os.getenv("OCR_BREAKER_OPEN_SECONDS", "30"))
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for one OCR backend.
+
+    closed: calls go through, outcomes are recorded over the last ``window`` seconds.
+    open: calls are refused for ``open_seconds`` once the error or slow rate trips.
+    half_open: one probe call is let through; success closes, failure re-opens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, window=OCR_BREAKER_WINDOW, min_calls=OCR_BREAKER_MIN_CALLS,
+                 error_rate=OCR_BREAKER_ERROR_RATE, slow_ms=OCR_BREAKER_SLOW_MS,
+                 slow_rate=OCR_BREAKER_SLOW_RATE, open_seconds=OCR_BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_ms = slow_ms
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.probing = False
+        self.calls = deque()
+        self.lock = threading.Lock()
+        self.counters = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+
+    def available(self):
+        """Whether a call would be let through now, without claiming the half-open probe"""
+        with self.lock:
+            self._refresh()
+            return self.state == self.CLOSED or (self.state == self.HALF_OPEN and not self.probing)
+
+    def acquire(self):
+        """Claim permission for one call; every True must be followed by record()"""
+        with self.lock:
+            self._refresh()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record(self, ok, ms):
+        with self.lock:
+            now = time.monotonic()
+            slow = ms >= self.slow_ms
+            self.counters["calls"] += 1
+            self.counters["failures"] += 0 if ok else 1
+            self.counters["slow"] += 1 if slow else 0
+
+            if self.state == self.HALF_OPEN:
+                self.probing = False
+                if ok and not slow:
+                    logger.info(f"✅ OCR backend {self.name} recovered, circuit closed")
+                    self.state = self.CLOSED
+                    self.calls.clear()
+                else:
+                    self._open(now, "probe failed")
+                return
+
+            self.calls.append((now, ok, slow))
+            self._trim(now)
+            if self.state == self.CLOSED and len(self.calls) >= self.min_calls:
+                failures = sum(1 for _, call_ok, _ in self.calls if not call_ok)
+                slow_calls = sum(1 for _, _, call_slow in self.calls if call_slow)
+                if failures / len(self.calls) >= self.error_rate:
+                    self._open(now, f"{failures}/{len(self.calls)} calls failed")
+                elif slow_calls / len(self.calls) >= self.slow_rate:
+                    self._open(now, f"{slow_calls}/{len(self.calls)} calls slower than {self.slow_ms:.0f}ms")
+
+    def stats(self):
+        with self.lock:
+            now = time.monotonic()
+            self._refresh()
+            self._trim(now)
+            window_calls = len(self.calls)
+            return {
+                "state": self.state,
+                "window_calls": window_calls,
+                "window_error_rate": round(sum(1 for _, ok, _ in self.calls if not ok) / window_calls, 3) if window_calls else 0.0,
+                "window_slow_rate": round(sum(1 for _, _, slow in self.calls if slow) / window_calls, 3) if window_calls else 0.0,
+                "retry_in_s": round(max(0.0, self.opened_at + self.open_seconds - now), 1) if self.state == self.OPEN else None,
+                **self.counters
+            }
+
+    def _open(self, now, reason):
+        logger.warning(f"⚠️ OCR backend {self.name} circuit opened for {self.open_seconds:.0f}s: {reason}")
+        self.state = self.OPEN
+        self.opened_at = now
+        self.calls.clear()
+        self.counters["opened"] += 1
+
+    def _refresh(self):
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = self.HALF_OPEN
+            self.probing = False
+
+    def _trim(self, now):
+        while self.calls and now - self.calls[0][0] > self.window:
+            self.calls.popleft()
@@ -0,0 +1,99 @@
+import os
+import re
+from datetime import date, datetime, timedelta
+
+# Below this an OCR result is escalated (other engines, higher-resolution re-OCR)
+OCR_CONFIDENCE_THRESHOLD = float(os.getenv("OCR_CONFIDENCE_THRESHOLD", "0.7"))
+# Below this, after escalation, the invoice is queued for manual review
+OCR_REVIEW_THRESHOLD = float(os.getenv("OCR_REVIEW_THRESHOLD", "0.5"))
+
+# Relative tolerance of the arithmetic checks; receipts round per line
+AMOUNT_TOLERANCE = 0.01
+# Vietnamese VAT rates (including the temporary 8% reduction)
+VAT_RATES = (0.0, 0.05, 0.08, 0.1)
+VAT_RATE_TOLERANCE = 0.005
+# Dates further back than this are suspicious for a receipt being uploaded
+MAX_AGE_DAYS = 3 * 365
+
+WEIGHTS = {"total": 0.35, "date": 0.15, "invoice_number": 0.1, "seller_name": 0.1, "subtotal": 0.1, "vat": 0.1, "items": 0.1}
+GENERATED_NUMBER = re.compile(r'^INV\d{14}$')
+
+class ConfidenceScorer:
+    """Per-field confidence (0-1) for a parsed invoice, from consistency checks between the fields.
+
+    The arithmetic (items ≈ subtotal, subtotal + VAT ≈ total, VAT at a legal
+    rate) is what makes amounts trustworthy; values the parser had to patch
+    or fill with defaults score low.
+    """
+
+    def score(self, invoice_data, today=None):
+        """{"overall", "fields": {field: confidence}, "checks": {check: passed or None}}"""
+        today = today or date.today()
+        if not invoice_data or invoice_data.get("error"):
+            return {"overall": 0.0, "fields": {field: 0.0 for field in WEIGHTS}, "checks": {}}
+
+        subtotal = invoice_data.get("subtotal") or 0.0
+        vat = invoice_data.get("vat") or 0.0
+        total = invoice_data.get("total") or 0.0
+        items = invoice_data.get("items") or []
+        items_sum = sum(item.get("amount") or 0.0 for item in items)
+        corrected = set(invoice_data.get("corrected") or ())
+
+        checks = {
+            "subtotal_plus_vat": _close(subtotal + vat, total) if subtotal and total else None,
+            "items_sum": (_close(items_sum, subtotal) or _close(items_sum, total)) if items and (subtotal or total) else None,
+            "vat_rate": any(abs(vat / subtotal - rate) <= VAT_RATE_TOLERANCE for rate in VAT_RATES) if subtotal else None,
+            "date_plausible": self._date_plausible(invoice_data.get("date"), today),
+        }
+        agreements = sum(1 for check in ("subtotal_plus_vat", "items_sum") if checks[check])
+
+        fields = {
+            "total": 0.0 if total <= 0 else min(1.0, 0.5 + 0.25 * agreements),
+            "subtotal": 0.0 if subtotal <= 0 else (0.9 if agreements else 0.5),
+            "vat": 0.9 if checks["vat_rate"] and checks["subtotal_plus_vat"] else (0.5 if checks["vat_rate"] else 0.2),
+            "items": 0.0 if not items else (0.9 if checks["items_sum"] else 0.4),
+            "date": 0.9 if checks["date_plausible"] else (0.3 if checks["date_plausible"] is None else 0.1),
+            "invoice_number": 0.0 if not invoice_data.get("invoice_number") or GENERATED_NUMBER.match(invoice_data["invoice_number"]) else 0.8,
+            "seller_name": 0.0 if invoice_data.get("seller_name") in (None, "", "Unknown") else 0.7,
+        }
+        # Values the parser patched (e.g. total recomputed from subtotal + VAT) only look consistent
+        for field in corrected:
+            if field in fields:
+                fields[field] = min(fields[field], 0.4)
+
+        overall = sum(WEIGHTS[field] * confidence for field, confidence in fields.items())
+        return {
+            "overall": round(overall, 2),
+            "fields": {field: round(confidence, 2) for field, confidence in fields.items()},
+            "checks": checks
+        }
+
+    def authoritative(self, invoice_data, fields=None):
+        """Confidence for fields read from a machine-readable source (QR code, e-invoice XML).
+
+        With fields, only those are certain and the rest are scored as usual.
+        """
+        if fields is None:
+            fields = {field: 1.0 if invoice_data.get(field) else 0.0 for field in WEIGHTS}
+            return {"overall": 1.0, "fields": fields, "checks": {}}
+        scored = self.score(invoice_data)
+        for field in fields:
+            if field in scored["fields"] and invoice_data.get(field):
+                scored["fields"][field] = 1.0
+        scored["overall"] = round(sum(WEIGHTS[field] * confidence for field, confidence in scored["fields"].items()), 2)
+        return scored
+
+    def _date_plausible(self, value, today):
+        """True for a date in the last few years and not in the future; None when it is today (maybe a default)"""
+        try:
+            parsed = datetime.strptime(value, "%Y-%m-%d").date() if isinstance(value, str) else value
+        except (TypeError, ValueError):
+            return False
+        if parsed is None:
+            return False
+        if parsed == today:
+            return None
+        return today - timedelta(days=MAX_AGE_DAYS) <= parsed <= today
+
+def _close(a, b):
+    return abs(a - b) <= AMOUNT_TOLERANCE * max(abs(a), abs(b), 1.0)
@@ -0,0 +1,256 @@
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Label phrases, diacritics folded; the longest match in a row wins, so
+# "tổng cộng tiền hàng" is a subtotal even though it starts like a total.
+# Within a field, earlier phrases are preferred over later ones.
+LABELS = {
+    "total": ["tong tien thanh toan", "tong cong tien thanh toan", "tong thanh toan", "tong cong",
+              "thanh toan", "tong tien", "grand total", "amount due", "total"],
+    "subtotal": ["tong cong tien hang", "cong tien hang", "tong tien hang", "tien hang", "tam tinh",
+                 "sub total", "subtotal"],
+    "vat": ["tong tien thue", "tien thue gtgt", "thue gtgt", "tien thue", "thue vat", "vat"],
+}
+# Item table column headers, mapped to the item field their column holds
+COLUMNS = {
+    "so luong": "quantity", "sl": "quantity", "qty": "quantity",
+    "don gia": "unit_price", "dg": "unit_price", "gia": "unit_price", "price": "unit_price",
+    "thanh tien": "amount", "tt": "amount", "amount": "amount",
+}
+CURRENCY_SUFFIX = re.compile(r'(vnd|vnđ|đ|₫|d)$', re.IGNORECASE)
+AMOUNT = re.compile(r'^\d{1,3}([.,]\d{3})+([.,]\d{1,2})?$|^\d{4,10}$')
+SEPARATED = re.compile(r'\d[.,]\d{3}')
+QUANTITY = re.compile(r'^\d{1,3}([.,]\d{1,3})?$')
+MAX_LABEL_WORDS = max(len(phrase.split()) for phrases in LABELS.values() for phrase in phrases)
+
+@dataclass(frozen=True, slots=True)
+class Word:
+    text: str
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+    @property
+    def cx(self):
+        return (self.x0 + self.x1) / 2
+
+    @property
+    def cy(self):
+        return (self.y0 + self.y1) / 2
+
+    @property
+    def height(self):
+        return self.y1 - self.y0
+
+class GridIndex:
+    """Uniform grid over word centres; region queries only visit the cells they cover"""
+
+    def __init__(self, words, cell):
+        self.cell = max(cell, 1.0)
+        self.cells = defaultdict(list)
+        for word in words:
+            self.cells[(int(word.cx // self.cell), int(word.cy // self.cell))].append(word)
+
+    def query(self, x0, y0, x1, y1):
+        found = []
+        for column in range(int(x0 // self.cell), int(x1 // self.cell) + 1):
+            for row in range(int(y0 // self.cell), int(y1 // self.cell) + 1):
+                found.extend(word for word in self.cells.get((column, row), ())
+                             if x0 <= word.cx <= x1 and y0 <= word.cy <= y1)
+        return found
+
+class LayoutParser:
+    """Reads totals and item rows from OCR word boxes instead of regexes over the flattened text.
+
+    Words are clustered into rows (one sort by vertical centre), label phrases
+    are matched within rows, and each label takes the right-most amount on its
+    row, or failing that the nearest amount just below it, found through a
+    grid index. Item rows are the rows between the table header and the first
+    totals label. Everything is O(n log n) in the number of words.
+    """
+
+    def __init__(self, normalize_amount):
+        self.normalize_amount = normalize_amount
+
+    def parse(self, boxes):
+        """boxes: [(text, x0, y0, x1, y1)]; returns rows, amounts and items, or None without usable geometry"""
+        words = [Word(text.strip(), *box) for text, *box in boxes if text and text.strip()]
+        if not words:
+            return None
+
+        line_height = sorted(word.height for word in words)[len(words) // 2] or 1.0
+        rows = self.cluster_rows(words, line_height)
+        index = GridIndex(words, line_height * 2)
+        right_edge = max(word.x1 for word in words)
+
+        labels = self.find_labels(rows)
+        amounts = {"subtotal": 0.0, "vat": 0.0, "total": 0.0}
+        found = {}
+        # Labels without an amount ("Phiếu thanh toán" as a title) do not end the item table
+        first_label_row = len(rows)
+        for field, priority, row_index, label_words in labels:
+            amount = self.amount_for(label_words, rows[row_index], index, line_height, right_edge)
+            if amount is None:
+                continue
+            first_label_row = min(first_label_row, row_index)
+            # Preferred phrase first; for equally good phrases the lowest one on the page
+            if field not in found or (priority, -row_index) < found[field][0]:
+                found[field] = ((priority, -row_index), amount)
+        for field, (_, amount) in found.items():
+            amounts[field] = amount
+
+        items = self.extract_items(rows[:first_label_row])
+        logger.info(f"📐 Layout parse: {len(words)} words, {len(rows)} rows, {len(items)} items, "
+                    f"total={amounts['total']} subtotal={amounts['subtotal']} vat={amounts['vat']}")
+        return {"rows": [" ".join(word.text for word in row) for row in rows], "items": items, **amounts}
+
+    def cluster_rows(self, words, line_height):
+        """Group words whose vertical centres are within half a line of the row's, left to right"""
+        rows = []
+        current, current_cy = [], None
+        for word in sorted(words, key=lambda word: word.cy):
+            if current and abs(word.cy - current_cy) > line_height / 2:
+                rows.append(sorted(current, key=lambda word: word.x0))
+                current = []
+            current.append(word)
+            current_cy = sum(w.cy for w in current) / len(current)
+        if current:
+            rows.append(sorted(current, key=lambda word: word.x0))
+        return rows
+
+    def find_labels(self, rows):
+        """[(field, priority, row index, label words)], longest phrase first at each position"""
+        phrases = {}
+        for field, field_phrases in LABELS.items():
+            for priority, phrase in enumerate(field_phrases):
+                phrases[tuple(phrase.split())] = (field, priority)
+
+        labels = []
+        for row_index, row in enumerate(rows):
+            tokens = [fold(word.text).strip(":.") for word in row]
+            position = 0
+            while position < len(tokens):
+                for length in range(min(MAX_LABEL_WORDS, len(tokens) - position), 0, -1):
+                    match = phrases.get(tuple(tokens[position:position + length]))
+                    if match:
+                        labels.append((*match, row_index, row[position:position + length]))
+                        position += length
+                        break
+                else:
+                    position += 1
+        return labels
+
+    def amount_for(self, label_words, row, index, line_height, right_edge):
+        label_end = label_words[-1].x1
+        same_row = [word for word in row if word.x0 >= label_end and self.amount(word.text) is not None]
+        if same_row:
+            return self.amount(same_row[-1].text)
+        if any(word.x0 >= label_end for word in row):
+            # Something other than an amount follows the label ("Thanh toán: Tiền mặt")
+            return None
+        top = max(word.y1 for word in row)
+        below = [
+            word for word in index.query(label_words[0].x0, top, right_edge, top + line_height * 2.5)
+            if self.amount(word.text) is not None
+        ]
+        if not below:
+            return None
+        nearest = min(below, key=lambda word: (word.cy, -word.x1))
+        return self.amount(nearest.text)
+
+    def extract_items(self, rows):
+        header_index, columns = self.find_header(rows)
+        body = rows[header_index + 1:] if header_index is not None else rows
+        items = []
+        previous_name = []
+        for row in body:
+            name_words, numbers = [], []
+            for word in row:
+                value = self.amount(word.text)
+                if value is None and QUANTITY.match(clean(word.text)):
+                    value = float(clean(word.text).replace(",", "."))
+                if value is not None and (name_words or previous_name):
+                    numbers.append((word, value))
+                elif not numbers:
+                    name_words.append(word)
+
+            if not numbers:
+                # Possibly a wrapped item name, completed by the next row's numbers
+                previous_name = name_words
+                continue
+            # Without a header, only rows ending in a formatted amount (12.000) are trusted as items
+            if not columns and not SEPARATED.search(clean(numbers[-1][0].text)):
+                previous_name = []
+                continue
+            name = " ".join(word.text for word in (name_words or previous_name)).strip()
+            previous_name = []
+            item = self._item(name, numbers, columns)
+            if item:
+                items.append(item)
+        return items
+
+    def find_header(self, rows):
+        """(row index, {field: column centre x}) of the item table header, (None, {}) without one"""
+        for row_index, row in enumerate(rows):
+            columns = {}
+            tokens = [fold(word.text).strip(":.") for word in row]
+            for position, token in enumerate(tokens):
+                for length in (2, 1):
+                    key = " ".join(tokens[position:position + length])
+                    if key in COLUMNS and COLUMNS[key] not in columns:
+                        words = row[position:position + length]
+                        columns[COLUMNS[key]] = (words[0].x0 + words[-1].x1) / 2
+                        break
+            if len(columns) >= 2:
+                return row_index, columns
+        return None, {}
+
+    def _item(self, name, numbers, columns):
+        if not name:
+            return None
+        values = {}
+        if columns:
+            for word, value in numbers:
+                field = min(columns, key=lambda field: abs(columns[field] - word.cx))
+                values.setdefault(field, value)
+        else:
+            values["amount"] = numbers[-1][1]
+            if len(numbers) >= 3:
+                values["quantity"], values["unit_price"] = numbers[0][1], numbers[1][1]
+            elif len(numbers) == 2:
+                values["quantity" if numbers[0][1] < 1000 else "unit_price"] = numbers[0][1]
+
+        amount = values.get("amount")
+        quantity = values.get("quantity")
+        unit_price = values.get("unit_price")
+        if amount is None and quantity and unit_price:
+            amount = quantity * unit_price
+        if amount is None:
+            return None
+        if quantity is None:
+            quantity = round(amount / unit_price, 3) if unit_price else 1.0
+        if unit_price is None:
+            unit_price = amount / quantity if quantity else amount
+        return {"name": name, "quantity": quantity, "unit_price": unit_price, "amount": amount}
+
+    def amount(self, text):
+        cleaned = clean(text)
+        # Leading zeros mean a phone number or tax code, not money
+        if not AMOUNT.match(cleaned) or (cleaned.isdigit() and cleaned.startswith("0")):
+            return None
+        value = self.normalize_amount(cleaned)
+        return value if value > 0 else None
+
+def clean(text):
+    return CURRENCY_SUFFIX.sub("", text.strip().rstrip(".:")).strip()
+
+def fold(text):
+    """Lower case without Vietnamese diacritics, so OCR that drops accents still matches labels"""
+    decomposed = unicodedata.normalize("NFD", text.lower().replace("đ", "d"))
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
@@ -4,11 +4,29 @@ from datetime import datetime
 import os
 import logging
 import base64
+import tempfile
+import time
+
+from services.ocr.pdf_extractor import PDFExtractor
+from services.ocr.amount_lexer import AmountLexer
+from services.ocr.confidence import OCR_CONFIDENCE_THRESHOLD, OCR_REVIEW_THRESHOLD, ConfidenceScorer
+from services.ocr.layout_parser import LayoutParser
+from services.ocr.orchestrator import OCROrchestrator
+from services.ocr.qr_decoder import QR_FIELDS, QRDecoder
 
 logger = logging.getLogger(__name__)
 
+QR_FAST_PATH = os.getenv("QR_FAST_PATH", "1") == "1"
+# Stored with each invoice's raw OCR output; bump it when parse_texts changes so
+# reparse_invoices.py can find the invoices parsed by an older version
+PARSER_VERSION = 1
+# Low-confidence images are re-OCR'd upscaled when their long side is below this
+OCR_UPSCALE_BELOW = int(os.getenv("OCR_UPSCALE_BELOW", "2000"))
+# Images with a QR code get one OCR pass, for seller and items only, on a copy no bigger than this
+QR_OCR_MAX_SIDE = int(os.getenv("QR_OCR_MAX_SIDE", "1600"))
+
 class OCRService:
-    def __init__(self):
+    def __init__(self, load_engines=True):
         # Load environment variables - try multiple paths
         from dotenv import load_dotenv
         from pathlib import Path
@@ -40,7 +58,21 @@ class OCRService:
         self.api_key = os.getenv("GOOGLE_CLOUD_VISION_API_KEY")
         self.use_google_vision = False
         self.client = None
-        
+        self.use_tesseract = False
+        
+        # Re-parsing stored OCR output (reparse_invoices.py) needs the parser only
+        if load_engines:
+            self._load_engines()
+        
+        self.pdf_extractor = PDFExtractor(self)
+        self.qr_decoder = QRDecoder() if QR_FAST_PATH and load_engines else None
+        self.confidence_scorer = ConfidenceScorer()
+        self.orchestrator = OCROrchestrator(self)
+        self.amount_lexer = AmountLexer()
+        self.layout_parser = LayoutParser(self._normalize_amount)
+    
+    def _load_engines(self):
+        """Set up Google Vision and Tesseract, whichever are configured"""
         if self.api_key:
             # Use API key authentication via REST API
             self.use_google_vision = True
@@ -69,28 +101,14 @@ class OCRService:
             logger.warning(f"⚠️ Pytesseract initialization error: {str(e)}")
             self.use_tesseract = False
     
+    def extract(self, image_path):
+        """(best OCRResult, every attempt) from the configured engines"""
+        return self.orchestrator.extract(image_path)
+    
     def extract_text(self, image_path):
         """Extract text from image using OCR"""
-        if self.use_google_vision:
-            return self._extract_text_google_vision(image_path)
-        elif self.use_tesseract:
-            return self._extract_text_pytesseract(image_path)
-        else:
-            # Fallback: use simple image analysis
-            return self._extract_text_fallback(image_path)
-    
-    def _extract_text_google_vision(self, image_path):
-        """Use Google Cloud Vision API"""
-        try:
-            if self.api_key:
-                # Use REST API with API key
-                return self._extract_text_google_vision_rest(image_path)
-            else:
-                # Use client library with service account
-                return self._extract_text_google_vision_client(image_path)
-        except Exception as e:
-            logger.error(f"❌ Google Vision API error: {str(e)}")
-            return self._extract_text_pytesseract(image_path) if self.use_tesseract else []
+        result, _ = self.extract(image_path)
+        return result.texts
     
     def _extract_text_google_vision_rest(self, image_path):
         """Use Google Cloud Vision REST API with API key"""
@@ -127,17 +145,23 @@ class OCRService:
         
         # Extract text annotations
         texts = []
+        words = []
         if "responses" in result and len(result["responses"]) > 0:
             text_annotations = result["responses"][0].get("textAnnotations", [])
             if text_annotations:
                 # First annotation is full text, rest are individual blocks
                 full_text = text_annotations[0].get("description", "")
                 texts = [full_text] + [ann.get("description", "") for ann in text_annotations[1:]]
+                # Vision omits zero coordinates from vertices
+                words = [
+                    self._word_box(ann.get("description", ""), [(v.get("x", 0), v.get("y", 0)) for v in ann.get("boundingPoly", {}).get("vertices", [])])
+                    for ann in text_annotations[1:]
+                ]
         
         logger.info(f"📝 Google Vision extracted {len(texts)} text blocks")
         logger.debug(f"📄 Full text:\n{texts[0] if texts else 'None'}")
         
-        return texts
+        return texts, [word for word in words if word]
     
     def _extract_text_google_vision_client(self, image_path):
         """Use Google Cloud Vision client library with service account"""
@@ -151,47 +175,36 @@ class OCRService:
         
         # Get all text annotations
         texts = []
+        words = []
         if response.text_annotations:
             # First annotation is full text, rest are individual blocks
             full_text = response.text_annotations[0].description
             texts = [full_text] + [annotation.description for annotation in response.text_annotations[1:]]
+            words = [
+                self._word_box(annotation.description, [(v.x, v.y) for v in annotation.bounding_poly.vertices])
+                for annotation in response.text_annotations[1:]
+            ]
         
         logger.info(f"📝 Google Vision extracted {len(texts)} text blocks")
         logger.debug(f"📄 Full text:\n{texts[0] if texts else 'None'}")
         
-        return texts
+        return texts, [word for word in words if word]
     
-    def _extract_text_pytesseract(self, image_path):
-        """Use pytesseract for local OCR"""
-        try:
-            from PIL import Image
-            img = Image.open(image_path)
-            # Vietnamese language support
-            text = self.pytesseract.image_to_string(img, lang='vie+eng')
-            return text.split('\n')
-        except Exception as e:
-            print(f"Pytesseract error: {str(e)}")
-            return []
+    def _word_box(self, text, vertices):
+        """(text, x0, y0, x1, y1) from a bounding polygon, None without one"""
+        if not vertices:
+            return None
+        xs = [x for x, _ in vertices]
+        ys = [y for _, y in vertices]
+        return (text, min(xs), min(ys), max(xs), max(ys))
     
-    def _extract_text_fallback(self, image_path):
-        """Fallback when no OCR available"""
-        try:
-            from PIL import Image, ImageEnhance, ImageFilter
-            
-            img = Image.open(image_path)
-            
-            # Enhance image for better readability
-            enhancer = ImageEnhance.Contrast(img)
-            img = enhancer.enhance(2)
-            
-            enhancer = ImageEnhance.Sharpness(img)
-            img = enhancer.enhance(2)
-            
-            # Note: This is just preprocessing, actual OCR still needed
-            # Return empty - user should install pytesseract or use Google Vision
-            return []
-        except:
-            return []
+    def _extract_text_pytesseract(self, image_path):
+        """Use pytesseract for local OCR; errors propagate so the engine's circuit breaker sees them"""
+        from PIL import Image
+        img = Image.open(image_path)
+        # Vietnamese language support
+        text = self.pytesseract.image_to_string(img, lang='vie+eng')
+        return text.split('\n')
     
     def parse_invoice(self, image_path):
         """Parse invoice from image and extract structured data"""
@@ -200,11 +213,169 @@ class OCRService:
             img = Image.open(image_path)
             img.verify()
         except Exception as e:
-            print(f"Image validation error: {str(e)}")
-        
-        # Extract text from image
-        texts = self.extract_text(image_path)
+            logger.warning(f"⚠️ Image validation error: {str(e)}")
+        
+        started = time.perf_counter()
+        extraction = {"source": "image"}
+        
+        # E-invoice printouts carry their key fields in a QR code; those are exact, so OCR only has to
+        # fill in the rest (seller, items, subtotal, VAT): one engine on a downscaled copy, no hedging or escalation
+        if self.qr_decoder:
+            qr_data, qr_status, qr_ms = self.qr_decoder.decode(image_path)
+            extraction.update({"qr": qr_status, "qr_ms": qr_ms})
+            if qr_data:
+                logger.info(f"🔳 Invoice number, date and total read from QR code in {qr_ms}ms")
+                qr = {field: qr_data[field] for field in QR_FIELDS if qr_data.get(field)}
+                ocr_started = time.perf_counter()
+                result, attempts = self._extract_downscaled(image_path)
+                extraction["ocr_ms"] = self._elapsed_ms(ocr_started)
+                # Without OCR text only the QR fields are known; _with_qr marks them incomplete for review
+                invoice_data = self._with_qr(result.invoice_data if result.texts else None, qr)
+                invoice_data["extraction"] = {
+                    **extraction,
+                    "path": "qr+single_engine" if result.texts else "qr_only",
+                    "confidence": self.confidence_scorer.authoritative(invoice_data, qr),
+                    "engines": [attempt.summary() for attempt in attempts],
+                    "total_ms": self._elapsed_ms(started)
+                }
+                invoice_data["ocr_output"] = {"engine": result.engine, "texts": result.texts, "words": result.words, "qr": qr}
+                return invoice_data
+        
+        # Extract text from image, keeping the most complete parse across engines
+        ocr_started = time.perf_counter()
+        result, attempts = self.extract(image_path)
+        extraction["ocr_ms"] = self._elapsed_ms(ocr_started)
+        
+        # Only results that fail the confidence checks pay for another engine or a bigger image
+        escalations = []
+        if result.score < OCR_CONFIDENCE_THRESHOLD:
+            result, attempts, escalations = self._escalate(image_path, result, attempts)
+        
+        invoice_data = result.invoice_data
+        invoice_data["extraction"] = {
+            **extraction,
+            "path": result.engine,
+            "score": result.score,
+            "confidence": result.confidence,
+            "engines": [attempt.summary() for attempt in attempts],
+            "escalations": escalations,
+            "total_ms": self._elapsed_ms(started)
+        }
+        # Kept with the invoice so later parser versions can re-read it without OCR
+        invoice_data["ocr_output"] = {"engine": result.engine, "texts": result.texts, "words": result.words}
+        return invoice_data
+    
+    def _escalate(self, image_path, best, attempts):
+        """Try the engines not run yet, then an upscaled image, until one result is confident enough"""
+        escalations = []
+        tried = {attempt.engine for attempt in attempts}
+        steps = [("other_engines", lambda: self.orchestrator.extract(image_path, exclude=tried))]
+        if OCR_UPSCALE_BELOW:
+            steps.append(("upscaled", lambda: self._extract_upscaled(image_path)))
+        
+        for step, run in steps:
+            step_started = time.perf_counter()
+            candidate, step_attempts = run()
+            if not step_attempts:
+                continue
+            attempts = attempts + step_attempts
+            improved = candidate.score > best.score
+            if improved:
+                best = candidate
+            escalations.append({"step": step, "score": candidate.score, "kept": improved, "ms": self._elapsed_ms(step_started)})
+            logger.info(f"🔁 OCR escalation {step}: score {candidate.score}, best now {best.score}")
+            if best.score >= OCR_CONFIDENCE_THRESHOLD:
+                break
+        return best, attempts, escalations
+    
+    def _extract_upscaled(self, image_path):
+        """Re-OCR a 2x grayscale, contrast-stretched copy of a small image"""
+        from PIL import ImageOps
+        with Image.open(image_path) as img:
+            img = ImageOps.exif_transpose(img)
+            if max(img.size) >= OCR_UPSCALE_BELOW:
+                return None, []
+            img = ImageOps.autocontrast(img.convert("L"))
+            img = img.resize((img.width * 2, img.height * 2), Image.LANCZOS)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                upscaled_path = os.path.join(tmp_dir, "upscaled.png")
+                img.save(upscaled_path, "PNG")
+                return self.extract(upscaled_path)
+    
+    def _extract_downscaled(self, image_path):
+        """One pass of the preferred engine over a copy whose long side is at most QR_OCR_MAX_SIDE"""
+        from PIL import ImageOps
+        with Image.open(image_path) as img:
+            if max(img.size) <= QR_OCR_MAX_SIDE:
+                return self.orchestrator.extract(image_path, single=True)
+            img = ImageOps.exif_transpose(img).convert("L")
+            img.thumbnail((QR_OCR_MAX_SIDE, QR_OCR_MAX_SIDE), Image.LANCZOS)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                downscaled_path = os.path.join(tmp_dir, "downscaled.png")
+                img.save(downscaled_path, "PNG")
+                return self.orchestrator.extract(downscaled_path, single=True)
+    
+    def parse_document(self, file_path, content_type=None):
+        """Parse an uploaded invoice, PDF or image; flags it for review when confidence stays low"""
+        if content_type == "application/pdf" or (content_type is None and self._is_pdf(file_path)):
+            invoice_data = self.pdf_extractor.parse(file_path)
+        else:
+            invoice_data = self.parse_invoice(file_path)
         
+        extraction = invoice_data["extraction"]
+        if not extraction.get("confidence"):
+            extraction["confidence"] = self.confidence_scorer.score(invoice_data)
+        extraction["review"] = self.needs_review(invoice_data, extraction["confidence"])
+        return invoice_data
+    
+    def needs_review(self, invoice_data, confidence):
+        # QR fields without any OCR text: seller and items are missing however certain the rest is
+        return confidence["overall"] < OCR_REVIEW_THRESHOLD or bool(invoice_data.get("incomplete"))
+    
+    def parse_output(self, ocr_output):
+        """(invoice fields, confidence) from stored OCR output; fields read from a QR code take precedence"""
+        texts = ocr_output.get("texts") or []
+        invoice_data = self.parse_texts(texts, ocr_output.get("words"))
+        qr = ocr_output.get("qr")
+        if not qr:
+            return invoice_data, self.confidence_scorer.score(invoice_data)
+        invoice_data = self._with_qr(invoice_data if texts else None, qr)
+        return invoice_data, self.confidence_scorer.authoritative(invoice_data, qr)
+    
+    def _with_qr(self, invoice_data, qr):
+        """OCR fields with the QR code's fields taking precedence; just the QR fields without OCR text"""
+        if invoice_data is None:
+            invoice_data = {"subtotal": 0.0, "vat": 0.0, "seller_name": None, "seller_phone": None,
+                            "seller_address": None, "items": [], "incomplete": True}
+        merged = {**invoice_data, **qr}
+        if invoice_data.get("corrected"):
+            # A total the parser patched is replaced by the exact one
+            merged["corrected"] = [field for field in invoice_data["corrected"] if field not in qr]
+        return merged
+    
+    def parse_stored(self, ocr_output):
+        """Parse OCR output kept from an earlier upload of the same file, without calling OCR"""
+        started = time.perf_counter()
+        invoice_data, confidence = self.parse_output(ocr_output)
+        invoice_data["extraction"] = {
+            "source": "cache",
+            "path": "reparsed",
+            "confidence": confidence,
+            "review": self.needs_review(invoice_data, confidence),
+            "total_ms": self._elapsed_ms(started)
+        }
+        invoice_data["ocr_output"] = ocr_output
+        return invoice_data
+    
+    def _elapsed_ms(self, started):
+        return round((time.perf_counter() - started) * 1000, 1)
+    
+    def _is_pdf(self, file_path):
+        with open(file_path, "rb") as f:
+            return f.read(5) == b"%PDF-"
+    
+    def parse_texts(self, texts, words=None):
+        """Turn OCR output (full text first, then blocks or lines) into invoice fields; word boxes enable the layout parser"""
         # If no OCR results, return defaults
         if not texts:
             return {
@@ -225,8 +396,11 @@ class OCRService:
         full_text = texts[0] if texts else ""
         text_lines = full_text.split('\n') if full_text else []
         
-        # Parse extracted text with structured line-by-line approach
-        invoice_data = self._parse_structured_invoice(texts, full_text)
+        # Word positions (Vision) pair labels with amounts directly; text-only engines use the line regexes
+        invoice_data = self._parse_layout_invoice(texts, full_text, words) if words else None
+        if invoice_data is None:
+            # Parse extracted text with structured line-by-line approach
+            invoice_data = self._parse_structured_invoice(texts, full_text)
         
         # Fallback to old method if structured parsing didn't work well
         if invoice_data['total'] == 0 and invoice_data['subtotal'] == 0:
@@ -255,11 +429,13 @@ class OCRService:
                 if calculated_total > 0:
                     logger.warning(f"⚠️ Total was {invoice_data['total']}, recalculating from subtotal + VAT: {calculated_total}")
                     invoice_data['total'] = calculated_total
+                    invoice_data['corrected'] = ['total']
         
         # Ensure total is at least subtotal if both exist
         if invoice_data['subtotal'] > 0 and invoice_data['total'] > 0 and invoice_data['total'] < invoice_data['subtotal']:
             logger.warning(f"⚠️ Total ({invoice_data['total']}) is less than subtotal ({invoice_data['subtotal']}), using subtotal + VAT")
             invoice_data['total'] = invoice_data['subtotal'] + invoice_data['vat']
+            invoice_data['corrected'] = ['total']
         
         return invoice_data
     
@@ -291,35 +467,7 @@ class OCRService:
             
             line_lower = line.lower()
             
-            # Extract invoice number
-            if not invoice_data['invoice_number']:
-                invoice_num = self._extract_invoice_number_from_line(line)
-                if invoice_num:
-                    invoice_data['invoice_number'] = invoice_num
-            
-            # Extract date
-            if not invoice_data['date']:
-                date_str = self._extract_date_from_line(line)
-                if date_str:
-                    invoice_data['date'] = date_str
-            
-            # Extract seller name (usually in first few lines)
-            if not invoice_data['seller_name'] and i < 10:
-                seller = self._extract_seller_from_line(line, i)
-                if seller:
-                    invoice_data['seller_name'] = seller
-            
-            # Extract phone
-            if not invoice_data['seller_phone']:
-                phone = self._extract_phone_from_line(line)
-                if phone:
-                    invoice_data['seller_phone'] = phone
-            
-            # Extract address
-            if not invoice_data['seller_address']:
-                address = self._extract_address_from_line(line)
-                if address:
-                    invoice_data['seller_address'] = address
+            self._parse_header_line(invoice_data, line, i)
             
             # Extract subtotal - "Tổng tiền hàng: 63,325"
             if 'tổng tiền hàng' in line_lower and invoice_data['subtotal'] == 0:
@@ -434,12 +582,79 @@ class OCRService:
             if calculated_total > 0:
                 logger.warning(f"⚠️ Total was 0, calculating from subtotal + VAT: {calculated_total}")
                 invoice_data['total'] = calculated_total
+                invoice_data['corrected'] = ['total']
         
         # Log final parsed data for debugging
         logger.info(f"📋 Final parsed invoice: Total={invoice_data['total']}, Subtotal={invoice_data['subtotal']}, VAT={invoice_data['vat']}")
         
         return invoice_data
     
+    def _parse_layout_invoice(self, texts, full_text, words):
+        """Totals and items from word positions, the rest from the reconstructed rows; None if no amount is found"""
+        layout = self.layout_parser.parse(words)
+        if not layout or (layout['total'] == 0 and layout['subtotal'] == 0):
+            return None
+        
+        invoice_data = {
+            "invoice_number": None,
+            "date": None,
+            "subtotal": layout['subtotal'],
+            "vat": layout['vat'],
+            "total": layout['total'],
+            "seller_name": None,
+            "seller_phone": None,
+            "seller_address": None,
+            "items": layout['items'],
+            "raw_text": full_text
+        }
+        for i, line in enumerate(layout['rows']):
+            self._parse_header_line(invoice_data, line.strip(), i)
+        
+        # Set defaults if not found
+        if not invoice_data['invoice_number']:
+            invoice_data['invoice_number'] = self._extract_invoice_number(texts)
+        if not invoice_data['date']:
+            invoice_data['date'] = self._extract_date(texts)
+        if not invoice_data['seller_name']:
+            invoice_data['seller_name'] = self._extract_seller(texts)
+        
+        if invoice_data['total'] == 0 and invoice_data['subtotal'] > 0:
+            invoice_data['total'] = invoice_data['subtotal'] + invoice_data['vat']
+            invoice_data['corrected'] = ['total']
+        return invoice_data
+    
+    def _parse_header_line(self, invoice_data, line, i):
+        """Fill invoice number, date and seller details from one line, keeping values already found"""
+        # Extract invoice number
+        if not invoice_data['invoice_number']:
+            invoice_num = self._extract_invoice_number_from_line(line)
+            if invoice_num:
+                invoice_data['invoice_number'] = invoice_num
+        
+        # Extract date
+        if not invoice_data['date']:
+            date_str = self._extract_date_from_line(line)
+            if date_str:
+                invoice_data['date'] = date_str
+        
+        # Extract seller name (usually in first few lines)
+        if not invoice_data['seller_name'] and i < 10:
+            seller = self._extract_seller_from_line(line, i)
+            if seller:
+                invoice_data['seller_name'] = seller
+        
+        # Extract phone
+        if not invoice_data['seller_phone']:
+            phone = self._extract_phone_from_line(line)
+            if phone:
+                invoice_data['seller_phone'] = phone
+        
+        # Extract address
+        if not invoice_data['seller_address']:
+            address = self._extract_address_from_line(line)
+            if address:
+                invoice_data['seller_address'] = address
+    
     def _extract_invoice_number_from_line(self, line):
         """Extract invoice number from a single line - exclude phone numbers"""
         # First check if line contains invoice number patterns
@@ -515,54 +730,19 @@ class OCRService:
     
     def _extract_amount_from_line(self, line):
         """Extract amount from a line containing amount keywords - avoid concatenating multiple numbers"""
-        # Remove common prefixes/suffixes
-        line_clean = re.sub(r'^(tổng\s*cộng|tổng\s*tiền\s*hàng|vat|thuế)[\s:]*', '', line, flags=re.IGNORECASE)
-        line_clean = re.sub(r'\s*(vnđ|đ|dong)\s*$', '', line_clean, flags=re.IGNORECASE)
-        line_clean = line_clean.strip()
-        
-        # Priority: Look for Vietnamese number format with thousand separators first
-        # Pattern 1: Number with comma separator (68,391)
-        comma_pattern = r'([\d]{1,3}(?:,\d{3})+)'
-        comma_matches = re.findall(comma_pattern, line_clean)
-        if comma_matches:
-            for match in comma_matches:
-                amount = self._normalize_amount(match)
-                if 1000 <= amount <= 100000000:
-                    return amount
-        
-        # Pattern 2: Number with dot separator (68.391)
-        dot_pattern = r'([\d]{1,3}(?:\.\d{3})+)'
-        dot_matches = re.findall(dot_pattern, line_clean)
-        if dot_matches:
-            for match in dot_matches:
-                amount = self._normalize_amount(match)
-                if 1000 <= amount <= 100000000:
-                    return amount
-        
-        # Pattern 3: Plain number without separators (68391)
-        plain_pattern = r'(\d{4,8})'  # 4-8 digits for reasonable amounts
-        plain_matches = re.findall(plain_pattern, line_clean)
-        if plain_matches:
-            amounts = []
-            for match in plain_matches:
-                amount = float(match)
-                if 1000 <= amount <= 100000000:
-                    amounts.append(amount)
-            if amounts:
-                return max(amounts)
-        
-        # Pattern 4: Split by spaces/colons and find the first reasonable number
-        parts = re.split(r'[\s:]+', line_clean)
-        for part in parts:
-            part = part.strip()
-            # Try to find number in this part
-            num_match = re.search(r'([\d,\.]{4,})', part)
-            if num_match:
-                amount = self._normalize_amount(num_match.group(1))
-                if 1000 <= amount <= 100000000:
-                    return amount
-        
-        return 0.0
+        candidates = [
+            token for token in self.amount_lexer.tokenize(line)
+            if token.value is not None and 1000 <= token.value <= 100000000
+        ]
+        # Priority: Vietnamese thousand separators (comma, dot, then spaces), then the largest plain number
+        for separator in (",", ".", " ", "\u00a0"):
+            for token in candidates:
+                if token.kind == "thousands" and separator in token.text:
+                    return token.value
+        plain = [token.value for token in candidates if token.kind == "integer"]
+        if plain:
+            return max(plain)
+        return candidates[0].value if candidates else 0.0
     
     def _extract_items_structured(self, text_lines):
         """Extract items using structured approach"""
@@ -727,136 +907,8 @@ class OCRService:
         return datetime.now().strftime("%Y-%m-%d")
     
     def _normalize_amount(self, amount_str):
-        """Normalize Vietnamese number format to float - prevent concatenating multiple numbers"""
-        if not amount_str:
-            return 0.0
-        
-        # Convert to string and clean
-        amount_str = str(amount_str).strip()
-        
-        # Remove VNĐ, đ, and other currency symbols
-        amount_str = re.sub(r'[VNĐđdD\s]', '', amount_str, flags=re.IGNORECASE)
-        
-        # Remove all non-digit characters except comma and dot
-        amount_str = re.sub(r'[^\d,\.]', '', amount_str)
-        
-        if not amount_str:
-            return 0.0
-        
-        # Count digits only
-        digits_only = re.sub(r'[^\d]', '', amount_str)
-        
-        # Safety check: if the number is too long (more than 10 digits), it might be concatenated
-        if len(digits_only) > 10:
-            # If it looks like multiple numbers concatenated (e.g., 63325506668391)
-            # Try to find patterns that look like separate amounts
-            # Common pattern: numbers separated by dots/commas might be separate amounts
-            if '.' in amount_str or ',' in amount_str:
-                # Split by separator and take the last reasonable part
-                parts = re.split(r'[,\.]', amount_str)
-                # Find the last part that looks like an amount (4-8 digits)
-                for part in reversed(parts):
-                    part_digits = re.sub(r'[^\d]', '', part)
-                    if 4 <= len(part_digits) <= 8:
-                        amount_str = part
-                        digits_only = part_digits
-                        logger.warning(f"⚠️ Multiple numbers detected, using last reasonable part: {amount_str}")
-                        break
-                else:
-                    # If no reasonable part found, take last 8 digits
-                    logger.warning(f"⚠️ Suspiciously long number detected: {amount_str}, taking last 8 digits")
-                    digits_only = digits_only[-8:]
-                    amount_str = digits_only
-            else:
-                # No separators, likely concatenated - take last 8 digits
-                logger.warning(f"⚠️ Suspiciously long number detected: {amount_str}, taking last 8 digits")
-                digits_only = digits_only[-8:]
-                amount_str = digits_only
-        
-        # Handle Vietnamese thousand separators: 68.391 or 68,391
-        # Vietnamese typically uses dot or comma as thousand separator
-        
-        # Case 1: Both dot and comma present
-        if '.' in amount_str and ',' in amount_str:
-            # Usually: dot is thousand, comma is decimal (68.391,50)
-            # Or: comma is thousand, dot is decimal (68,391.50)
-            dot_count = amount_str.count('.')
-            comma_count = amount_str.count(',')
-            
-            if dot_count == 1 and comma_count == 1:
-                # One of each - determine which is decimal
-                dot_pos = amount_str.find('.')
-                comma_pos = amount_str.find(',')
-                if dot_pos < comma_pos:
-                    # Format: 68.391,50 -> dot is thousand, comma is decimal
-                    amount_str = amount_str.replace('.', '').replace(',', '.')
-                else:
-                    # Format: 68,391.50 -> comma is thousand, dot is decimal
-                    amount_str = amount_str.replace(',', '')
-            else:
-                # Multiple separators - check if last part is decimal (1-2 digits)
-                parts = re.split(r'[,\.]', amount_str)
-                if len(parts) > 1 and len(parts[-1]) <= 2:
-                    # Last part is decimal
-                    amount_str = ''.join(parts[:-1]) + '.' + parts[-1]
-                else:
-                    # All are thousand separators - remove all
-                    amount_str = amount_str.replace('.', '').replace(',', '')
-        
-        # Case 2: Only dots
-        elif '.' in amount_str:
-            parts = amount_str.split('.')
-            if len(parts) == 2:
-                if len(parts[1]) <= 2:
-                    # Decimal: 68.50 -> keep as is
-                    pass
-                elif len(parts[1]) == 3:
-                    # Thousand separator: 68.391 -> 68391 (Vietnamese format)
-                    amount_str = amount_str.replace('.', '')
-                else:
-                    # More than 3 digits - likely thousand separator
-                    amount_str = amount_str.replace('.', '')
-            else:
-                # Multiple dots - check if last part is decimal
-                if len(parts[-1]) <= 2:
-                    # Last part is decimal
-                    amount_str = ''.join(parts[:-1]) + '.' + parts[-1]
-                else:
-                    # All are thousand separators
-                    amount_str = amount_str.replace('.', '')
-        
-        # Case 3: Only commas
-        elif ',' in amount_str:
-            parts = amount_str.split(',')
-            if len(parts) == 2:
-                if len(parts[1]) == 3:
-                    # Thousand separator: 68,391 -> 68391 (Vietnamese format - most common)
-                    amount_str = amount_str.replace(',', '')
-                elif len(parts[1]) <= 2:
-                    # Decimal: 68,50 -> 68.50 (less common in Vietnamese invoices)
-                    amount_str = amount_str.replace(',', '.')
-                else:
-                    # More than 3 digits - likely thousand separator
-                    amount_str = amount_str.replace(',', '')
-            elif len(parts) > 2:
-                # Multiple commas - Vietnamese format uses comma as thousand separator
-                # Example: 1,234,567 -> 1234567
-                # Check if last part is decimal (1-2 digits)
-                if len(parts[-1]) <= 2:
-                    # Last part is decimal
-                    amount_str = ''.join(parts[:-1]) + '.' + parts[-1]
-                else:
-                    # All are thousand separators (Vietnamese format)
-                    amount_str = amount_str.replace(',', '')
-            else:
-                # Single comma - treat as thousand separator
-                amount_str = amount_str.replace(',', '')
-        
-        try:
-            result = float(amount_str)
-            return result if result > 0 else 0.0
-        except (ValueError, TypeError):
-            return 0.0
+        """Normalize Vietnamese number format to float; 0.0 when missing or ambiguous (see AmountLexer)"""
+        return self.amount_lexer.value(amount_str)
     
     def _extract_subtotal(self, texts):
         """Extract subtotal amount from Vietnamese invoice"""
@@ -0,0 +1,237 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from services.ocr.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# single: one engine at a time, the next only when one fails or comes back empty
+# hedge: start the next engine when the current one is slower than OCR_HEDGE_PERCENTILE of its own history
+# race: start every engine at once
+OCR_MODE = os.getenv("OCR_MODE", "hedge")
+OCR_HEDGE_PERCENTILE = float(os.getenv("OCR_HEDGE_PERCENTILE", "90"))
+# Hedge delay used until an engine has OCR_HEDGE_MIN_SAMPLES latencies recorded
+OCR_HEDGE_DEFAULT_MS = float(os.getenv("OCR_HEDGE_DEFAULT_MS", "3000"))
+OCR_HEDGE_MIN_SAMPLES = 20
+# A result whose confidence (0-1, see ConfidenceScorer) reaches this is taken without waiting for the others
+OCR_GOOD_ENOUGH = float(os.getenv("OCR_GOOD_ENOUGH", "0.75"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "8"))
+LATENCY_WINDOW = 200
+
+OCR_MODES = ("single", "hedge", "race")
+
+@dataclass
+class OCRResult:
+    engine: str
+    texts: list = field(default_factory=list)
+    words: list = field(default_factory=list)
+    invoice_data: dict = None
+    score: float = 0.0
+    confidence: dict = None
+    ms: float = 0.0
+    error: str = None
+
+    @property
+    def full_text(self):
+        return self.texts[0] if self.texts else ""
+
+    def summary(self):
+        summary = {"engine": self.engine, "ms": self.ms, "score": self.score}
+        if self.error:
+            summary["error"] = self.error
+        return summary
+
+class OCROrchestrator:
+    """Runs the configured OCR engines of an OCRService and keeps the most complete parse.
+
+    Engines run on a shared pool. Results are scored by the overall confidence
+    of their parse; the first one scoring OCR_GOOD_ENOUGH wins and the
+    others are abandoned (queued calls are cancelled, running ones finish in
+    the background and are ignored). Each engine sits behind a CircuitBreaker,
+    so during an outage uploads skip it instead of paying its timeout.
+    """
+
+    def __init__(self, ocr_service, mode=OCR_MODE):
+        if mode not in OCR_MODES:
+            raise ValueError(f"OCR_MODE must be one of {OCR_MODES}")
+        self.ocr_service = ocr_service
+        self.mode = mode
+        self.pool = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="ocr")
+        self.latencies = {}
+        self.breakers = {}
+        self.wins = {}
+        self.counters = {"requests": 0, "hedged": 0, "abandoned": 0, "no_engine": 0}
+        self.lock = threading.Lock()
+
+    def engines(self):
+        """[(name, fn)] in order of preference; each fn returns (texts with the full text first, word boxes)"""
+        service = self.ocr_service
+        engines = []
+        if service.use_google_vision:
+            vision = service._extract_text_google_vision_rest if service.api_key else service._extract_text_google_vision_client
+            engines.append(("google_vision", vision))
+        if service.use_tesseract:
+            engines.append(("tesseract", self._tesseract))
+        return engines
+
+    def breaker(self, engine):
+        with self.lock:
+            if engine not in self.breakers:
+                self.breakers[engine] = CircuitBreaker(engine)
+            return self.breakers[engine]
+
+    def extract(self, image_path, exclude=(), single=False):
+        """(best OCRResult, every attempt); single runs just the preferred available engine, no hedging or fallback"""
+        configured = [(name, fn) for name, fn in self.engines() if name not in exclude]
+        engines = [(name, fn) for name, fn in configured if self.breaker(name).available()]
+        if single:
+            engines = engines[:1]
+        self._count("requests")
+        if not engines and exclude:
+            return OCRResult(engine="none"), []
+        if not engines:
+            error = "All OCR engines are unavailable" if configured else None
+            if configured:
+                self._count("no_engine")
+                logger.warning(f"⚠️ {error}: every circuit is open")
+            return OCRResult(engine="none", invoice_data=self.ocr_service.parse_texts([]), error=error), []
+        if len(engines) == 1 or self.mode == "single":
+            best, attempts = self._sequential(engines, image_path)
+        else:
+            best, attempts = self._concurrent(engines, image_path)
+        with self.lock:
+            self.wins[best.engine] = self.wins.get(best.engine, 0) + 1
+        return best, attempts
+
+    def _sequential(self, engines, image_path):
+        attempts = []
+        for name, fn in engines:
+            result = self._run(name, fn, image_path)
+            attempts.append(result)
+            if result.texts:
+                return result, attempts
+        return max(attempts, key=lambda attempt: attempt.score), attempts
+
+    def _concurrent(self, engines, image_path):
+        waiting = list(engines)
+        pending = {}
+        attempts = []
+        best = None
+
+        def start_next():
+            name, fn = waiting.pop(0)
+            pending[self.pool.submit(self._run, name, fn, image_path)] = name
+
+        start_next()
+        while self.mode == "race" and waiting:
+            start_next()
+
+        try:
+            while pending:
+                timeout = self.hedge_delay(pending.values()) if waiting else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"⏱️ OCR hedge: no answer within {timeout * 1000:.0f}ms, starting {waiting[0][0]}")
+                    self._count("hedged")
+                    start_next()
+                    continue
+                for future in done:
+                    pending.pop(future)
+                    result = future.result()
+                    attempts.append(result)
+                    if best is None or (result.score, bool(result.texts)) > (best.score, bool(best.texts)):
+                        best = result
+                if best.score >= OCR_GOOD_ENOUGH:
+                    break
+                # Nothing good enough yet: the next engine starts now rather than after the hedge delay
+                if waiting and len(pending) == 0:
+                    start_next()
+        finally:
+            for future in pending:
+                future.cancel()
+
+        if pending:
+            self._count("abandoned", len(pending))
+            logger.info(f"✂️ OCR took {best.engine} (score {best.score}), abandoned {', '.join(pending.values())}")
+        return best, attempts
+
+    def _run(self, name, fn, image_path):
+        breaker = self.breaker(name)
+        if not breaker.acquire():
+            # Another request took the half-open probe, or the circuit opened since extract() looked
+            return OCRResult(engine=name, invoice_data=self.ocr_service.parse_texts([]), error="circuit open")
+
+        started = time.perf_counter()
+        try:
+            texts, words = fn(image_path)
+            error = None
+        except Exception as e:
+            logger.error(f"❌ OCR engine {name} failed: {str(e)}")
+            texts, words, error = [], [], str(e)
+        ms = round((time.perf_counter() - started) * 1000, 1)
+        breaker.record(error is None, ms)
+        if error is None:
+            self.record(name, ms)
+
+        invoice_data = self.ocr_service.parse_texts(texts, words)
+        confidence = self.ocr_service.confidence_scorer.score(invoice_data)
+        return OCRResult(engine=name, texts=texts, words=words, invoice_data=invoice_data,
+                         score=confidence["overall"], confidence=confidence, ms=ms, error=error)
+
+    def _tesseract(self, image_path):
+        lines = self.ocr_service._extract_text_pytesseract(image_path)
+        full_text = "\n".join(lines).strip()
+        # Same shape as Vision output: full text first, then the lines; no word boxes
+        return ([full_text] + [line for line in lines if line.strip()] if full_text else []), []
+
+    def record(self, engine, ms):
+        with self.lock:
+            self.latencies.setdefault(engine, deque(maxlen=LATENCY_WINDOW)).append(ms)
+
+    def percentile(self, engine, percentile=OCR_HEDGE_PERCENTILE, min_samples=OCR_HEDGE_MIN_SAMPLES):
+        with self.lock:
+            samples = sorted(self.latencies.get(engine, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index]
+
+    def hedge_delay(self, running):
+        """Seconds to wait on the running engines before starting the next one"""
+        delays = [self.percentile(engine) for engine in running]
+        delay_ms = max((delay for delay in delays if delay is not None), default=OCR_HEDGE_DEFAULT_MS)
+        return delay_ms / 1000
+
+    def metrics(self):
+        engines = {}
+        for name, _ in self.engines():
+            engines[name] = {
+                **self.breaker(name).stats(),
+                "wins": self.wins.get(name, 0),
+                **{f"p{percentile}_ms": self.percentile(name, percentile, min_samples=1) for percentile in (50, 90, 99)}
+            }
+        with self.lock:
+            counters = dict(self.counters)
+        return {"mode": self.mode, "engines": engines, **counters}
+
+    def health(self):
+        """ok when every engine's circuit is closed, degraded while some are open, down when none can be used"""
+        states = {name: self.breaker(name).stats()["state"] for name, _ in self.engines()}
+        if not states:
+            status = "unconfigured"
+        elif all(state == CircuitBreaker.CLOSED for state in states.values()):
+            status = "ok"
+        elif any(self.breaker(name).available() for name in states):
+            status = "degraded"
+        else:
+            status = "down"
+        return {"status": status, "mode": self.mode, "engines": states}
+
+    def _count(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
@@ -0,0 +1,137 @@
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "10"))
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "200"))
+PDF_OCR_WORKERS = int(os.getenv("PDF_OCR_WORKERS", "4"))
+# A page with less extractable text than this is treated as scanned
+PDF_TEXT_MIN_CHARS = 20
+
+class PDFExtractor:
+    """Invoice text from PDFs: the embedded text layer when there is one, OCR of rendered pages otherwise.
+
+    pypdf reads the text layer; pypdfium2 (or PyMuPDF) renders scanned pages,
+    which are OCR'd in parallel with the engines of the owning OCRService.
+    """
+
+    def __init__(self, ocr_service):
+        self.ocr_service = ocr_service
+
+        try:
+            import pypdf
+            self.pypdf = pypdf
+        except ImportError:
+            logger.warning("⚠️ pypdf not available - PDF text layers cannot be read")
+            self.pypdf = None
+
+        self.renderer = None
+        try:
+            import pypdfium2
+            self.pdfium = pypdfium2
+            self.renderer = "pdfium"
+        except ImportError:
+            try:
+                import fitz
+                self.fitz = fitz
+                self.renderer = "pymupdf"
+            except ImportError:
+                logger.warning("⚠️ No PDF renderer (pypdfium2 or PyMuPDF) - scanned PDFs cannot be OCR'd")
+
+    def parse(self, pdf_path):
+        started = time.perf_counter()
+        pages = self.text_layer(pdf_path)
+        if self.renderer and (not pages or any(len(page["text"].strip()) < PDF_TEXT_MIN_CHARS for page in pages)):
+            pages = self.ocr_pages(pdf_path, pages)
+
+        methods = {page["method"] for page in pages}
+        if not any(page["text"].strip() for page in pages):
+            path = "unavailable"
+        else:
+            path = methods.pop() if len(methods) == 1 else "mixed"
+
+        full_text = "\n".join(page["text"] for page in pages if page["text"].strip())
+        texts = [full_text] + full_text.split("\n") if full_text.strip() else []
+        invoice_data = self.ocr_service.parse_texts(texts)
+        invoice_data["ocr_output"] = {"engine": f"pdf_{path}", "texts": texts, "words": []}
+        invoice_data["extraction"] = {
+            "source": "pdf",
+            "path": path,
+            "pages": [{key: page[key] for key in ("page", "method", "chars", "ms")} for page in pages],
+            "total_ms": self._elapsed_ms(started)
+        }
+        logger.info(f"📄 PDF parsed via {path}: " + ", ".join(
+            f"p{page['page']} {page['method']} {page['ms']}ms" for page in pages
+        ) + f" (total {invoice_data['extraction']['total_ms']}ms)")
+        return invoice_data
+
+    def text_layer(self, pdf_path):
+        """[{page, method, text, chars, ms}] from the embedded text, [] if it cannot be read"""
+        if not self.pypdf:
+            return []
+        try:
+            reader = self.pypdf.PdfReader(pdf_path)
+            pages = []
+            for index, page in enumerate(reader.pages[:PDF_MAX_PAGES]):
+                page_started = time.perf_counter()
+                text = page.extract_text() or ""
+                pages.append(self._page(index, "text_layer", text, page_started))
+            return pages
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read PDF text layer: {str(e)}")
+            return []
+
+    def ocr_pages(self, pdf_path, text_pages):
+        """OCR the pages without usable text; renders sequentially, OCRs in parallel"""
+        usable = {page["page"]: page for page in text_pages if len(page["text"].strip()) >= PDF_TEXT_MIN_CHARS}
+        futures = {}
+        with tempfile.TemporaryDirectory() as tmp_dir, ThreadPoolExecutor(max_workers=PDF_OCR_WORKERS) as pool:
+            for page_number, image in self.render_pages(pdf_path):
+                if page_number in usable:
+                    continue
+                image_path = os.path.join(tmp_dir, f"page-{page_number}.png")
+                image.save(image_path, "PNG")
+                futures[page_number] = pool.submit(self._ocr_page, page_number, image_path)
+            ocr_pages = {page_number: future.result() for page_number, future in futures.items()}
+        pages = {**usable, **ocr_pages}
+        return [pages[number] for number in sorted(pages)]
+
+    def render_pages(self, pdf_path, dpi=PDF_RENDER_DPI, max_pages=PDF_MAX_PAGES):
+        """Yield (page number, PIL image) for the first max_pages pages"""
+        if self.renderer == "pdfium":
+            document = self.pdfium.PdfDocument(pdf_path)
+            try:
+                for index in range(min(len(document), max_pages)):
+                    yield index + 1, document[index].render(scale=dpi / 72).to_pil()
+            finally:
+                document.close()
+        elif self.renderer == "pymupdf":
+            from PIL import Image
+            with self.fitz.open(pdf_path) as document:
+                for index in range(min(document.page_count, max_pages)):
+                    pixmap = document[index].get_pixmap(dpi=dpi)
+                    yield index + 1, Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+
+    def render_first_page(self, pdf_path, dpi=72):
+        """PIL image of page 1 (for thumbnails), None without a renderer"""
+        if not self.renderer:
+            return None
+        for _, image in self.render_pages(pdf_path, dpi=dpi, max_pages=1):
+            return image
+        return None
+
+    def _ocr_page(self, page_number, image_path):
+        page_started = time.perf_counter()
+        result, _ = self.ocr_service.extract(image_path)
+        text = result.full_text
+        return self._page(page_number - 1, "ocr", text, page_started)
+
+    def _page(self, index, method, text, started):
+        return {"page": index + 1, "method": method, "text": text, "chars": len(text), "ms": self._elapsed_ms(started)}
+
+    def _elapsed_ms(self, started):
+        return round((time.perf_counter() - started) * 1000, 1)
@@ -0,0 +1,127 @@
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Decoding on a downscaled copy keeps the fast path fast; printed QR codes survive it well
+QR_MAX_SIDE = int(os.getenv("QR_MAX_SIDE", "1024"))
+
+TAX_CODE = re.compile(r'^\d{10}(-\d{3})?$')
+TEMPLATE = re.compile(r'^[1-6]$')
+SYMBOL = re.compile(r'^[CK]\d{2}[A-Z]{1,4}$|^[A-Z]{2}/\d{2}[A-Z]$')
+NUMBER = re.compile(r'^\d{1,8}$')
+AMOUNT = re.compile(r'^\d+(\.\d+)?$')
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%Y%m%d", "%d-%m-%Y"]
+# Invoice fields a QR payload actually carries; everything else still comes from OCR
+QR_FIELDS = ("invoice_number", "date", "total", "seller_tax_code")
+
+class QRDecoder:
+    """Finds an e-invoice QR code (tax code, symbol, number, date, total) on a receipt image"""
+
+    def __init__(self):
+        self.backend = None
+        try:
+            from pyzbar import pyzbar
+            self.pyzbar = pyzbar
+            self.backend = "pyzbar"
+        except ImportError:
+            try:
+                import cv2
+                import numpy
+                self.cv2 = cv2
+                self.numpy = numpy
+                self.detector = cv2.QRCodeDetector()
+                self.backend = "opencv"
+            except ImportError:
+                logger.warning("⚠️ No QR decoder (pyzbar or opencv) - QR fast path disabled")
+
+    @property
+    def available(self):
+        return self.backend is not None
+
+    def decode(self, image_path):
+        """(invoice fields or None, status, elapsed ms); status is found/unparsed/not_found/unavailable/error"""
+        if not self.available:
+            return None, "unavailable", 0.0
+
+        started = time.perf_counter()
+        try:
+            with Image.open(image_path) as image:
+                image = ImageOps.exif_transpose(image).convert("L")
+                image.thumbnail((QR_MAX_SIDE, QR_MAX_SIDE))
+                payloads = self._payloads(image)
+        except Exception as e:
+            logger.warning(f"⚠️ QR decoding failed: {str(e)}")
+            return None, "error", self._elapsed_ms(started)
+
+        for payload in payloads:
+            fields = self.parse_payload(payload)
+            if fields:
+                return fields, "found", self._elapsed_ms(started)
+        return None, "unparsed" if payloads else "not_found", self._elapsed_ms(started)
+
+    def _payloads(self, image):
+        if self.backend == "pyzbar":
+            symbols = self.pyzbar.decode(image, symbols=[self.pyzbar.ZBarSymbol.QRCODE])
+            return [symbol.data.decode("utf-8", errors="replace") for symbol in symbols]
+        text, _, _ = self.detector.detectAndDecode(self.numpy.array(image))
+        return [text] if text else []
+
+    def parse_payload(self, payload):
+        """Invoice fields from a QR payload like 'MST|mẫu số|ký hiệu|số|ngày|tổng tiền'; None without the key fields"""
+        tokens = [token.strip() for token in re.split(r'[|;\n\t]', payload) if token.strip()]
+        if len(tokens) < 3:
+            return None
+
+        fields = {}
+        numbers = []
+        for token in tokens:
+            if "tax_code" not in fields and TAX_CODE.match(token):
+                fields["tax_code"] = token
+            elif "template" not in fields and "symbol" not in fields and TEMPLATE.match(token):
+                fields["template"] = token
+            elif "symbol" not in fields and SYMBOL.match(token):
+                fields["symbol"] = token
+            elif "date" not in fields and self._date(token):
+                fields["date"] = self._date(token)
+            elif AMOUNT.match(token.replace(",", "")):
+                numbers.append(token.replace(",", ""))
+
+        # The invoice number comes before the amounts; the total is the last amount
+        number = next((n for n in numbers if NUMBER.match(n)), None)
+        if number is None or "date" not in fields or len(numbers) < 2:
+            return None
+        total = float(numbers[-1])
+
+        symbol = fields.get("symbol")
+        return {
+            "invoice_number": f"{symbol}-{number}" if symbol else number,
+            "date": fields["date"],
+            "subtotal": 0.0,
+            "vat": 0.0,
+            "total": total,
+            "seller_name": None,
+            "seller_tax_code": fields.get("tax_code"),
+            "seller_phone": None,
+            "seller_address": None,
+            "items": [],
+            "raw_text": payload
+        }
+
+    def _date(self, token):
+        for date_format in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(token[:10], date_format)
+            except ValueError:
+                continue
+            if 2000 <= parsed.year <= 2100:
+                return parsed.strftime("%Y-%m-%d")
+        return None
+
+    def _elapsed_ms(self, started):
+        return round((time.perf_counter() - started) * 1000, 1)
@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+import zlib
+
+from db.models import InvoiceOCR
+
+logger = logging.getLogger(__name__)
+
+OCR_RAW_ZLIB_LEVEL = int(os.getenv("OCR_RAW_ZLIB_LEVEL", "6"))
+OCR_RAW_ZSTD_LEVEL = int(os.getenv("OCR_RAW_ZSTD_LEVEL", "10"))
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+class RawOCRStore:
+    """Keeps each invoice's OCR output (text blocks and word boxes) compressed in invoice_ocr.
+
+    zstd is used when the zstandard package is installed, zlib otherwise; the
+    codec is stored per row so both can be read back whatever is installed now.
+    """
+
+    def __init__(self, prefer_zstd=True):
+        self.codec = "zstd" if prefer_zstd and ZSTD_AVAILABLE else "zlib"
+
+    def compress(self, ocr_output):
+        stored = {"texts": ocr_output.get("texts") or [], "words": ocr_output.get("words") or []}
+        if ocr_output.get("qr"):
+            # Fields read from a QR code, which a re-parse must keep over what it reads from the text
+            stored["qr"] = ocr_output["qr"]
+        data = json.dumps(stored, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if self.codec == "zstd":
+            return "zstd", zstandard.ZstdCompressor(level=OCR_RAW_ZSTD_LEVEL).compress(data)
+        return "zlib", zlib.compress(data, OCR_RAW_ZLIB_LEVEL)
+
+    def decompress(self, codec, payload):
+        """{"texts", "words"} (and "qr" when the invoice had a QR code) from a stored row's codec and payload"""
+        if codec == "zstd":
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("OCR output was stored with zstd; install zstandard to read it")
+            data = zstandard.ZstdDecompressor().decompress(payload)
+        elif codec == "zlib":
+            data = zlib.decompress(payload)
+        else:
+            raise ValueError(f"Unknown OCR payload codec '{codec}'")
+        return json.loads(data)
+
+    def save(self, db, invoice_id, ocr_output, parser_version):
+        """Add (not commit) the OCR output of an invoice"""
+        codec, payload = self.compress(ocr_output)
+        db.merge(InvoiceOCR(
+            invoice_id=invoice_id, engine=ocr_output.get("engine") or "unknown",
+            parser_version=parser_version, codec=codec, payload=payload
+        ))
+
+    def copy(self, db, from_invoice_id, to_invoice_id):
+        """Give a deduplicated upload the stored OCR output of the invoice it reuses"""
+        source = db.get(InvoiceOCR, from_invoice_id)
+        if source is None:
+            return
+        db.merge(InvoiceOCR(
+            invoice_id=to_invoice_id, engine=source.engine, parser_version=source.parser_version,
+            codec=source.codec, payload=source.payload
+        ))
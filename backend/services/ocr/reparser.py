@@ -0,0 +1,152 @@
+import logging
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime
+
+from sqlalchemy import update
+
+from db.models import Invoice, InvoiceOCR
+from services.ocr.confidence import GENERATED_NUMBER
+from services.ocr.ocr_service import PARSER_VERSION, OCRService
+from services.ocr.raw_store import RawOCRStore
+
+logger = logging.getLogger(__name__)
+
+# Per worker process: the parser without any OCR engine
+_parser = None
+_raw_store = None
+
+def _init_worker():
+    global _parser, _raw_store
+    logging.getLogger("services.ocr").setLevel(logging.WARNING)
+    _parser = OCRService(load_engines=False)
+    _raw_store = RawOCRStore()
+
+def _reparse_batch(rows):
+    """[(invoice_id, fields)] for [(invoice_id, codec, payload)]; runs in a worker"""
+    if _parser is None:
+        _init_worker()
+    results = []
+    for invoice_id, codec, payload in rows:
+        try:
+            raw = _raw_store.decompress(codec, payload)
+            invoice_data, scored = _parser.parse_output(raw)
+            confidence = scored["overall"]
+            results.append((invoice_id, {
+                "invoice_number": invoice_data.get("invoice_number"),
+                "seller_name": invoice_data.get("seller_name"),
+                "date": datetime.strptime(invoice_data["date"], "%Y-%m-%d").date(),
+                "subtotal": invoice_data.get("subtotal", 0),
+                "vat": invoice_data.get("vat", 0),
+                "total": invoice_data.get("total", 0),
+                "items": invoice_data.get("items", []),
+                "confidence": confidence,
+                "review_status": "pending" if _parser.needs_review(invoice_data, scored) else None,
+            }))
+        except Exception as e:
+            results.append((invoice_id, {"error": str(e)}))
+    return results
+
+class InvoiceReparser:
+    """Runs stored OCR output through the current parser and updates the invoices that change.
+
+    Rows are read in invoice_id order with keyset pagination, parsed on a
+    process pool (no OCR engine is loaded, so no API is called), and each
+    batch of diffs is applied and committed together. Invoices a user has
+    reviewed are never overwritten.
+    """
+
+    def __init__(self, batch_size=500, workers=None):
+        self.batch_size = batch_size
+        self.workers = os.cpu_count() if workers is None else workers
+
+    def run(self, db, dry_run=False, reparse_all=False, limit=None, show_diffs=10):
+        stats = Counter()
+        changes = Counter()
+        started = datetime.now()
+        batches = self._batches(db, reparse_all, limit)
+
+        if self.workers:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as pool:
+                pending = set()
+                for rows in batches:
+                    pending.add(pool.submit(_reparse_batch, rows))
+                    # Bounded read-ahead: the database is read no faster than the workers parse
+                    if len(pending) >= self.workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self._apply(db, future.result(), dry_run, stats, changes, show_diffs)
+                for future in pending:
+                    self._apply(db, future.result(), dry_run, stats, changes, show_diffs)
+        else:
+            for rows in batches:
+                self._apply(db, _reparse_batch(rows), dry_run, stats, changes, show_diffs)
+
+        stats["seconds"] = round((datetime.now() - started).total_seconds(), 1)
+        logger.info(f"🔁 Re-parse: {dict(stats)}, changed fields: {dict(changes)}")
+        return stats, changes
+
+    def _batches(self, db, reparse_all, limit):
+        """Lists of (invoice_id, codec, payload), read a batch at a time so memory stays flat"""
+        last_id = 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            query = db.query(InvoiceOCR.invoice_id, InvoiceOCR.codec, InvoiceOCR.payload).filter(InvoiceOCR.invoice_id > last_id)
+            if not reparse_all:
+                query = query.filter(InvoiceOCR.parser_version != PARSER_VERSION)
+            query = query.order_by(InvoiceOCR.invoice_id).limit(
+                self.batch_size if remaining is None else min(self.batch_size, remaining)
+            )
+            rows = [tuple(row) for row in query]
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+            yield rows
+
+    def _apply(self, db, results, dry_run, stats, changes, show_diffs):
+        ids = [invoice_id for invoice_id, _ in results]
+        invoices = {invoice.id: invoice for invoice in db.query(Invoice).filter(Invoice.id.in_(ids))}
+        today = date.today()
+
+        for invoice_id, fields in results:
+            stats["parsed"] += 1
+            invoice = invoices.get(invoice_id)
+            if invoice is None:
+                stats["orphaned"] += 1
+                continue
+            if "error" in fields:
+                stats["failed"] += 1
+                logger.warning(f"⚠️ Invoice {invoice_id} could not be re-parsed: {fields['error']}")
+                continue
+            if invoice.review_status == "reviewed":
+                stats["skipped_reviewed"] += 1
+                continue
+
+            # Placeholders the parser fills in when a field is missing would otherwise change on every run
+            if GENERATED_NUMBER.match(fields["invoice_number"] or "") and invoice.invoice_number:
+                fields["invoice_number"] = invoice.invoice_number
+            if fields["date"] == today and invoice.date != today:
+                fields["date"] = invoice.date
+
+            diff = {field: (getattr(invoice, field), value) for field, value in fields.items() if getattr(invoice, field) != value}
+            if not diff:
+                stats["unchanged"] += 1
+                continue
+            stats["changed"] += 1
+            changes.update(diff.keys())
+            if stats["changed"] <= show_diffs:
+                logger.info(f"🔁 Invoice {invoice_id}: " + ", ".join(f"{field} {old!r} -> {new!r}" for field, (old, new) in diff.items() if field != "items"))
+            if not dry_run:
+                for field, (_, new) in diff.items():
+                    setattr(invoice, field, new)
+
+        if dry_run:
+            db.rollback()
+            return
+        db.execute(
+            update(InvoiceOCR).where(InvoiceOCR.invoice_id.in_(ids)).values(parser_version=PARSER_VERSION)
+        )
+        db.commit()
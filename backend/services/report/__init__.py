@@ -0,0 +1 @@
+# Report service package
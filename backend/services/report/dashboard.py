@@ -0,0 +1,125 @@
+from datetime import date
+
+from sqlalchemy import case, extract, func, select
+
+from db.models import Invoice, Expense, InvoiceType
+
+DASHBOARD_RECENT_INVOICES = 5
+DASHBOARD_TREND_MONTHS = 12
+
+class DashboardService:
+    """Everything the home page shows, from a handful of aggregate queries in one session"""
+
+    def __init__(self, liability_service, recent_limit=DASHBOARD_RECENT_INVOICES, trend_months=DASHBOARD_TREND_MONTHS):
+        self.liability_service = liability_service
+        self.recent_limit = recent_limit
+        self.trend_months = trend_months
+
+    def etag(self, user, today=None):
+        """Strong validator from the user's data version; no invoice or expense query needed"""
+        today = today or date.today()
+        # The trend window and current quarter move with the date; tax figures move with the rules
+        return (f'"{user.id}-{user.data_version or 0}-dashboard-{today.isoformat()}-'
+                f'{self.liability_service.tax_engine.rules.version}"')
+
+    def build(self, db, user_id, today=None):
+        today = today or date.today()
+        quarter = (today.month - 1) // 3 + 1
+        return {
+            "counts": self._counts(db, user_id),
+            "recent_invoices": self._recent_invoices(db, user_id),
+            "category_totals": self._category_totals(db, user_id),
+            "monthly_trend": self._monthly_trend(db, user_id, today),
+            "tax_estimate": self.liability_service.compute(db, user_id, today.year, quarter)
+        }
+
+    def _counts(self, db, user_id):
+        is_sale = Invoice.invoice_type == InvoiceType.SALE
+        invoices = db.execute(
+            select(
+                func.count(Invoice.id),
+                func.coalesce(func.sum(case((is_sale, 1), else_=0)), 0),
+                func.coalesce(func.sum(case((is_sale, Invoice.total), else_=0.0)), 0.0)
+            )
+            .where(Invoice.user_id == user_id)
+        ).one()
+        expenses = db.execute(
+            select(func.count(Expense.id), func.coalesce(func.sum(Expense.amount), 0.0))
+            .where(Expense.user_id == user_id)
+        ).one()
+        revenue, expense_sum = invoices[2], expenses[1]
+        return {
+            "invoices": invoices[0],
+            "sale_invoices": invoices[1],
+            "purchase_invoices": invoices[0] - invoices[1],
+            "expenses": expenses[0],
+            "revenue": revenue,
+            "expense_total": expense_sum,
+            "profit": revenue - expense_sum
+        }
+
+    def _recent_invoices(self, db, user_id):
+        rows = db.execute(
+            select(
+                Invoice.id, Invoice.invoice_type, Invoice.invoice_number,
+                Invoice.seller_name, Invoice.date, Invoice.total
+            )
+            .where(Invoice.user_id == user_id)
+            .order_by(Invoice.date.desc(), Invoice.id.desc())
+            .limit(self.recent_limit)
+        )
+        return [
+            {
+                "id": row.id,
+                "invoice_type": row.invoice_type.value,
+                "invoice_number": row.invoice_number,
+                "seller_name": row.seller_name,
+                "date": row.date,
+                "total": row.total
+            }
+            for row in rows
+        ]
+
+    def _category_totals(self, db, user_id):
+        rows = db.execute(
+            select(Expense.category, func.count(Expense.id), func.sum(Expense.amount))
+            .where(Expense.user_id == user_id)
+            .group_by(Expense.category)
+            .order_by(func.sum(Expense.amount).desc())
+        )
+        return [{"category": category, "count": count, "total": total or 0.0} for category, count, total in rows]
+
+    def _monthly_trend(self, db, user_id, today):
+        """Revenue, purchases and expenses per month for the last trend_months months, oldest first"""
+        months = []
+        year, month = today.year, today.month
+        for _ in range(self.trend_months):
+            months.append((year, month))
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        months.reverse()
+        start = date(months[0][0], months[0][1], 1)
+        trend = {
+            key: {"year": key[0], "month": key[1], "revenue": 0.0, "purchases": 0.0, "expenses": 0.0}
+            for key in months
+        }
+
+        invoice_year, invoice_month = extract("year", Invoice.date), extract("month", Invoice.date)
+        invoice_rows = db.execute(
+            select(invoice_year, invoice_month, Invoice.invoice_type, func.sum(Invoice.total))
+            .where(Invoice.user_id == user_id, Invoice.date >= start, Invoice.date <= today)
+            .group_by(invoice_year, invoice_month, Invoice.invoice_type)
+        )
+        for row_year, row_month, invoice_type, total in invoice_rows:
+            field = "revenue" if invoice_type == InvoiceType.SALE else "purchases"
+            trend[(int(row_year), int(row_month))][field] += total or 0.0
+
+        expense_year, expense_month = extract("year", Expense.date), extract("month", Expense.date)
+        expense_rows = db.execute(
+            select(expense_year, expense_month, func.sum(Expense.amount))
+            .where(Expense.user_id == user_id, Expense.date >= start, Expense.date <= today)
+            .group_by(expense_year, expense_month)
+        )
+        for row_year, row_month, total in expense_rows:
+            trend[(int(row_year), int(row_month))]["expenses"] += total or 0.0
+
+        return [trend[key] for key in months]
@@ -0,0 +1,108 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from itertools import chain
+
+from sqlalchemy import event, func, inspect, insert, select, update
+from sqlalchemy.orm import Session
+
+from db.models import DataVersion, Invoice, Expense
+from db.user_model import User
+
+class DataVersionTracker:
+    """Per-user data version, bumped in the same transaction as every invoice/expense write.
+
+    users.data_version is loaded with the user during authentication, so read
+    endpoints can answer a conditional request with 304 before touching the
+    invoice and expense tables. Rows without an owner bump a separate shared
+    version instead of every user's; validators of endpoints that show those
+    rows include it.
+    """
+
+    CACHE_CONTROL = "private, no-cache"
+    SHARED = "shared"
+
+    def register(self):
+        event.listen(Session, "after_flush", self._bump_changed_users)
+
+    def _bump_changed_users(self, session, flush_context):
+        users = set()
+        for obj in chain(session.new, session.dirty, session.deleted):
+            if not isinstance(obj, (Invoice, Expense)):
+                continue
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            users.add(obj.user_id)
+            # A row moved to another user changes both users' data
+            users.update(inspect(obj).attrs.user_id.history.deleted or ())
+        if not users:
+            return
+
+        now = datetime.utcnow()
+        connection = session.connection()
+        owners = users - {None}
+        if owners:
+            connection.execute(
+                update(User.__table__)
+                .where(User.__table__.c.id.in_(owners))
+                .values(data_version=func.coalesce(User.__table__.c.data_version, 0) + 1, data_modified_at=now)
+            )
+        if None in users:
+            self._bump_shared(connection, now)
+
+    def _bump_shared(self, connection, now):
+        table = DataVersion.__table__
+        updated = connection.execute(
+            update(table).where(table.c.name == self.SHARED).values(version=table.c.version + 1, modified_at=now)
+        ).rowcount
+        if not updated:
+            connection.execute(insert(table).values(name=self.SHARED, version=1, modified_at=now))
+
+    def ensure_shared(self, db):
+        """Create the shared version row up front, so concurrent first writes only ever update it"""
+        if db.get(DataVersion, self.SHARED) is None:
+            db.add(DataVersion(name=self.SHARED, version=0))
+            db.commit()
+
+    def shared(self, db):
+        """(version, modified_at) of the rows without an owner"""
+        row = db.execute(
+            select(DataVersion.version, DataVersion.modified_at).where(DataVersion.name == self.SHARED)
+        ).first()
+        return (row[0], row[1]) if row else (0, None)
+
+    def etag(self, user, resource, shared=None):
+        """Strong validator for one resource of a user's data at its current version.
+
+        Pass the shared version for resources that also list rows without an owner.
+        """
+        if shared is None:
+            return f'"{user.id}-{user.data_version or 0}-{resource}"'
+        return f'"{user.id}-{user.data_version or 0}-{shared[0]}-{resource}"'
+
+    def headers(self, user, resource, shared=None):
+        headers = {"ETag": self.etag(user, resource, shared), "Cache-Control": self.CACHE_CONTROL, "Vary": "Authorization"}
+        modified = self._last_modified(user, shared)
+        if modified:
+            headers["Last-Modified"] = format_datetime(modified.replace(tzinfo=timezone.utc), usegmt=True)
+        return headers
+
+    def not_modified(self, user, resource, if_none_match=None, if_modified_since=None, shared=None):
+        """True when the client's cached copy is still current (If-None-Match wins over If-Modified-Since)"""
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag(user, resource, shared) in tags
+        modified = self._last_modified(user, shared)
+        if if_modified_since and modified:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            # HTTP dates have whole-second resolution
+            return modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+        return False
+
+    def _last_modified(self, user, shared):
+        times = [user.data_modified_at, shared[1] if shared else None]
+        return max((t for t in times if t), default=None)
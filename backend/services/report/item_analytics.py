@@ -0,0 +1,77 @@
+from sqlalchemy import extract, func, select
+
+from db.models import InvoiceLineItem, InvoiceType
+
+ITEM_ORDERS = ("amount", "quantity", "count")
+SPEND_PERIODS = ("month", "quarter", "year")
+
+class ItemAnalytics:
+    """Item-level reports, aggregated in SQL over the invoice_items table"""
+
+    def top_items(self, db, user_id, start=None, end=None, invoice_type=InvoiceType.PURCHASE, order_by="amount", limit=20):
+        """Items grouped by normalized name, largest first; bought items by default, sold ones with SALE"""
+        count = func.count(InvoiceLineItem.id)
+        quantity = func.sum(InvoiceLineItem.quantity)
+        amount = func.sum(InvoiceLineItem.amount)
+        order = {"amount": amount, "quantity": quantity, "count": count}[order_by]
+        rows = db.execute(
+            select(
+                InvoiceLineItem.name_normalized, func.max(InvoiceLineItem.name), func.max(InvoiceLineItem.category),
+                count, quantity, amount
+            )
+            .where(*self._filters(user_id, start, end, invoice_type))
+            .group_by(InvoiceLineItem.name_normalized)
+            .order_by(order.desc(), InvoiceLineItem.name_normalized)
+            .limit(limit)
+        )
+        return [
+            {
+                "name": name,
+                "normalized_name": normalized,
+                "category": category,
+                "count": row_count,
+                "quantity": row_quantity or 0.0,
+                "amount": row_amount or 0.0,
+                # Weighted by quantity, so one bulk purchase is not averaged with single units
+                "average_unit_price": (row_amount or 0.0) / row_quantity if row_quantity else 0.0
+            }
+            for normalized, name, category, row_count, row_quantity, row_amount in rows
+        ]
+
+    def spend_by_category(self, db, user_id, start=None, end=None, period="month"):
+        """Purchased item amounts per category and period, oldest period first"""
+        year, month = extract("year", InvoiceLineItem.date), extract("month", InvoiceLineItem.date)
+        rows = db.execute(
+            select(year, month, InvoiceLineItem.category, func.count(InvoiceLineItem.id), func.sum(InvoiceLineItem.amount))
+            .where(*self._filters(user_id, start, end, InvoiceType.PURCHASE))
+            .group_by(year, month, InvoiceLineItem.category)
+        )
+        # Months are rolled up here: quarters cannot be extracted portably, and there are few rows per user
+        spend = {}
+        for row_year, row_month, category, count, amount in rows:
+            row_year, row_month = int(row_year), int(row_month)
+            key = {
+                "month": (row_year, row_month),
+                "quarter": (row_year, (row_month - 1) // 3 + 1),
+                "year": (row_year, None),
+            }[period] + (category,)
+            point = spend.setdefault(key, {"period": self._label(period, *key[:2]), "year": row_year,
+                                           "category": category, "count": 0, "amount": 0.0})
+            point["count"] += count
+            point["amount"] += amount or 0.0
+        return [spend[key] for key in sorted(spend, key=lambda key: (key[0], key[1] or 0, -spend[key]["amount"]))]
+
+    def _filters(self, user_id, start, end, invoice_type):
+        filters = [InvoiceLineItem.user_id == user_id, InvoiceLineItem.invoice_type == invoice_type]
+        if start:
+            filters.append(InvoiceLineItem.date >= start)
+        if end:
+            filters.append(InvoiceLineItem.date <= end)
+        return filters
+
+    def _label(self, period, year, part):
+        if period == "month":
+            return f"{year}-{part:02d}"
+        if period == "quarter":
+            return f"{year}-Q{part}"
+        return str(year)
@@ -0,0 +1 @@
+# Search service package
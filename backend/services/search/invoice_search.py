@@ -0,0 +1,193 @@
+import logging
+import re
+
+from sqlalchemy import bindparam, event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from db.models import Invoice, InvoiceOCR
+from services.invoice.line_items import normalize_item_name
+from services.ocr.confidence import GENERATED_NUMBER
+from services.ocr.raw_store import RawOCRStore
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MAX_TERMS = 8
+# Invoice columns that go into the search document; a change to any of them rewrites it
+INDEXED_ATTRIBUTES = ("seller_name", "seller_tax_code", "buyer_name", "invoice_number", "items", "user_id")
+# bm25 column weights (seller, items, body): a seller hit outranks an item hit, which outranks OCR text
+SQLITE_WEIGHTS = "10.0, 5.0, 1.0"
+TERM = re.compile(r'[0-9a-z]+')
+
+SQLITE_SCHEMA = [
+    # Text is folded before indexing (unicode61 does not fold đ); remove_diacritics covers anything left
+    "CREATE VIRTUAL TABLE IF NOT EXISTS invoice_search USING fts5("
+    "user_id UNINDEXED, seller, items, body, tokenize='unicode61 remove_diacritics 2')",
+]
+POSTGRES_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS invoice_search ("
+    "invoice_id INTEGER PRIMARY KEY, user_id INTEGER, seller TEXT, items TEXT, body TEXT, document TSVECTOR)",
+    "CREATE INDEX IF NOT EXISTS ix_invoice_search_document ON invoice_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_invoice_search_user ON invoice_search (user_id)",
+]
+
+class InvoiceSearch:
+    """Full-text search over invoices: seller, item names and the stored OCR text.
+
+    Each invoice has one search document in invoice_search, an FTS5 table on
+    SQLite or a weighted tsvector with a GIN index on PostgreSQL. Documents
+    and queries are folded the same way (lower case, no Vietnamese
+    diacritics), so "pho bo" finds "Phở Bò". Every query term is a prefix.
+    register() rewrites an invoice's document in the flush that changes it.
+    """
+
+    def __init__(self, engine, raw_store=None):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.raw_store = raw_store or RawOCRStore()
+        self.available = False
+
+    def ensure_schema(self):
+        statements = {"sqlite": SQLITE_SCHEMA, "postgresql": POSTGRES_SCHEMA}.get(self.dialect)
+        if statements is None:
+            logger.warning(f"⚠️ Invoice search is not supported on {self.dialect}")
+            return
+        try:
+            with self.engine.begin() as conn:
+                for statement in statements:
+                    conn.execute(text(statement))
+            self.available = True
+        except Exception as e:
+            # e.g. SQLite built without FTS5
+            logger.warning(f"⚠️ Invoice search unavailable: {str(e)}")
+
+    def register(self):
+        event.listen(Session, "after_flush", self._sync_flushed)
+
+    def _sync_flushed(self, session, flush_context):
+        if not self.available:
+            return
+        changed, deleted = set(), set()
+        for obj in session.new:
+            if isinstance(obj, Invoice):
+                changed.add(obj.id)
+            elif isinstance(obj, InvoiceOCR):
+                changed.add(obj.invoice_id)
+        for obj in session.dirty:
+            if isinstance(obj, Invoice) and any(
+                inspect(obj).attrs[attribute].history.has_changes() for attribute in INDEXED_ATTRIBUTES
+            ):
+                changed.add(obj.id)
+            elif isinstance(obj, InvoiceOCR) and session.is_modified(obj):
+                changed.add(obj.invoice_id)
+        for obj in session.deleted:
+            if isinstance(obj, Invoice):
+                deleted.add(obj.id)
+        if changed or deleted:
+            self.write(session.connection(), changed - deleted, deleted)
+
+    def write(self, connection, invoice_ids, deleted_ids=()):
+        """Replace the documents of the given invoices; returns the number written"""
+        key = "rowid" if self.dialect == "sqlite" else "invoice_id"
+        connection.execute(
+            text(f"DELETE FROM invoice_search WHERE {key} IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": list(set(invoice_ids) | set(deleted_ids))}
+        )
+        documents = self.documents(connection, invoice_ids)
+        if not documents:
+            return 0
+        if self.dialect == "sqlite":
+            insert = ("INSERT INTO invoice_search (rowid, user_id, seller, items, body) "
+                      "VALUES (:invoice_id, :user_id, :seller, :items, :body)")
+        else:
+            insert = ("INSERT INTO invoice_search (invoice_id, user_id, seller, items, body, document) "
+                      "VALUES (:invoice_id, :user_id, :seller, :items, :body, "
+                      "setweight(to_tsvector('simple', :seller), 'A') || setweight(to_tsvector('simple', :items), 'B') "
+                      "|| setweight(to_tsvector('simple', :body), 'C'))")
+        connection.execute(text(insert), documents)
+        return len(documents)
+
+    def documents(self, connection, invoice_ids):
+        if not invoice_ids:
+            return []
+        invoice_ids = list(invoice_ids)
+        ocr_texts = {}
+        for invoice_id, codec, payload in connection.execute(
+            select(InvoiceOCR.invoice_id, InvoiceOCR.codec, InvoiceOCR.payload).where(InvoiceOCR.invoice_id.in_(invoice_ids))
+        ):
+            try:
+                texts = self.raw_store.decompress(codec, payload)["texts"]
+            except Exception as e:
+                logger.warning(f"⚠️ OCR text of invoice {invoice_id} not indexed: {str(e)}")
+                continue
+            # The first block is the engine's full-page text; the rest repeat it line by line
+            ocr_texts[invoice_id] = texts[0] if texts else ""
+
+        rows = connection.execute(
+            select(Invoice.id, Invoice.user_id, Invoice.seller_name, Invoice.seller_tax_code,
+                   Invoice.buyer_name, Invoice.invoice_number, Invoice.items)
+            .where(Invoice.id.in_(invoice_ids))
+        )
+        return [
+            {
+                "invoice_id": row.id,
+                "user_id": row.user_id,
+                "seller": _folded(row.seller_name, row.seller_tax_code),
+                "items": _folded(*(item.get("name") for item in row.items or [] if isinstance(item, dict))),
+                # Numbers the parser generated for invoices without one are noise
+                "body": _folded(None if GENERATED_NUMBER.match(row.invoice_number or "") else row.invoice_number,
+                                row.buyer_name, ocr_texts.get(row.id)),
+            }
+            for row in rows
+        ]
+
+    def search(self, db, user_id, query, limit=20, offset=0):
+        """[(invoice_id, score, snippet)] best first, for the user's invoices and unowned ones"""
+        terms = TERM.findall(normalize_item_name(query or ""))[:SEARCH_MAX_TERMS]
+        if not terms or not self.available:
+            return []
+        params = {"user_id": user_id, "limit": limit, "offset": offset}
+        if self.dialect == "sqlite":
+            params["query"] = " ".join(f'"{term}"*' for term in terms)
+            rows = db.execute(text(
+                f"SELECT rowid, bm25(invoice_search, {SQLITE_WEIGHTS}) AS rank, "
+                "snippet(invoice_search, -1, '[', ']', '…', 12) "
+                "FROM invoice_search WHERE invoice_search MATCH :query AND (user_id = :user_id OR user_id IS NULL) "
+                "ORDER BY rank LIMIT :limit OFFSET :offset"
+            ), params)
+            # bm25 is lower for better matches
+            return [(invoice_id, round(-rank, 4), snippet) for invoice_id, rank, snippet in rows]
+
+        params["query"] = " & ".join(f"{term}:*" for term in terms)
+        rows = db.execute(text(
+            "SELECT invoice_id, ts_rank(document, query) AS rank, "
+            "ts_headline('simple', seller || ' ' || items || ' ' || body, query, 'StartSel=[, StopSel=], MaxWords=12, MinWords=4') "
+            "FROM invoice_search, to_tsquery('simple', :query) AS query "
+            "WHERE document @@ query AND (user_id = :user_id OR user_id IS NULL) "
+            "ORDER BY rank DESC LIMIT :limit OFFSET :offset"
+        ), params)
+        return [(invoice_id, round(rank, 4), snippet) for invoice_id, rank, snippet in rows]
+
+    def rebuild(self, db, batch_size=1000):
+        """Reindex every invoice a batch at a time, dropping documents of deleted invoices"""
+        stats = {"invoices": 0, "documents": 0}
+        db.execute(text("DELETE FROM invoice_search"))
+        last_id = 0
+        while True:
+            ids = db.execute(
+                select(Invoice.id).where(Invoice.id > last_id).order_by(Invoice.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            stats["documents"] += self.write(db.connection(), ids)
+            stats["invoices"] += len(ids)
+            last_id = ids[-1]
+            db.commit()
+            logger.info(f"🔍 Indexed {stats['documents']} of {stats['invoices']} invoices")
+        if self.dialect == "sqlite":
+            # Merge the b-trees written batch by batch into one
+            db.execute(text("INSERT INTO invoice_search (invoice_search) VALUES ('optimize')"))
+        db.commit()
+        return stats
+
+def _folded(*parts):
+    return " ".join(normalize_item_name(str(part)) for part in parts if part)
@@ -0,0 +1 @@
+# Storage service package
@@ -0,0 +1,241 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from PIL import Image, ImageOps
+from sqlalchemy import func, update
+
+from db.models import Invoice, StoredFile
+from services.ocr.pdf_extractor import PDFExtractor
+from services.storage.backends import create_archive_backend
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_FORMAT = os.getenv("ARCHIVE_FORMAT", "webp")
+# Quality and size that still OCR cleanly; receipts are rarely sharper than this
+ARCHIVE_QUALITY = int(os.getenv("ARCHIVE_QUALITY", "85"))
+ARCHIVE_MAX_SIDE = int(os.getenv("ARCHIVE_MAX_SIDE", "2400"))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))
+THUMBNAIL_QUALITY = 75
+
+ARCHIVE_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"optimize": True, "progressive": True}),
+}
+
+class UploadArchiver:
+    """Moves old receipt images to the archive tier, recompressed, leaving a thumbnail behind.
+
+    Per image: write the archive copy and the thumbnail, then repoint every
+    invoice using it in one transaction, and only after the commit delete the
+    original. A failed commit removes the archive copy instead.
+    """
+
+    def __init__(self, upload_store, archive_backend=None, after_days=ARCHIVE_AFTER_DAYS,
+                 image_format=ARCHIVE_FORMAT, quality=ARCHIVE_QUALITY, max_side=ARCHIVE_MAX_SIDE):
+        if image_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"ARCHIVE_FORMAT must be one of {sorted(ARCHIVE_FORMATS)}")
+        self.upload_store = upload_store
+        self.backend = upload_store.backend
+        self.archive_backend = archive_backend or create_archive_backend()
+        self.after_days = after_days
+        self.image_format = image_format
+        self.quality = quality
+        self.max_side = max_side
+        # Only used to render PDF first pages for thumbnails
+        self.pdf = PDFExtractor(ocr_service=None)
+
+    def candidates(self, db, today=None, limit=None):
+        """Distinct image paths whose invoices are all older than the cutoff and not archived yet"""
+        cutoff = (today or date.today()) - timedelta(days=self.after_days)
+        query = (
+            db.query(Invoice.image_path)
+            .filter(Invoice.image_path.isnot(None), Invoice.image_archived_at.is_(None))
+            .group_by(Invoice.image_path)
+            .having(func.max(Invoice.date) < cutoff)
+            .order_by(Invoice.image_path)
+        )
+        if limit:
+            query = query.limit(limit)
+        return [image_path for (image_path,) in query]
+
+    def run(self, db, today=None, limit=None, dry_run=False):
+        stats = {"images": 0, "archived": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+        for image_path in self.candidates(db, today, limit):
+            stats["images"] += 1
+            if dry_run:
+                logger.info(f"📦 Would archive {image_path}")
+                continue
+            try:
+                before, after = self.archive(db, image_path)
+            except Exception as e:
+                db.rollback()
+                stats["failed"] += 1
+                logger.error(f"❌ Archiving {image_path} failed: {str(e)}")
+                continue
+            stats["archived"] += 1
+            stats["bytes_before"] += before
+            stats["bytes_after"] += after
+        logger.info(f"📦 Archive run: {stats}")
+        return stats
+
+    def archive(self, db, image_path):
+        """Archive one image; returns (original bytes, archived bytes)"""
+        key = self.backend.key_for(image_path)
+        with self._original(image_path, key) as local_path:
+            with open(local_path, "rb") as f:
+                original = f.read()
+        sha256 = hashlib.sha256(original).hexdigest()
+
+        archived, content_type, extension = self.recompress(original)
+        archive_key = f"{self.upload_store.key_for(sha256)}.{extension}"
+        self._put_bytes(self.archive_backend, archive_key, archived, content_type)
+        thumbnail_key = self.thumbnail_key(sha256)
+        if not self.backend.exists(thumbnail_key):
+            thumbnail = self.thumbnail(original)
+            if thumbnail:
+                self._put_bytes(self.backend, thumbnail_key, thumbnail, "image/jpeg")
+
+        archive_uri = self.archive_backend.uri(archive_key)
+        try:
+            # Through the ORM, not a bulk UPDATE, so flush listeners (data versions, caches) see the change
+            archived_at = datetime.utcnow()
+            for invoice in db.query(Invoice).filter(Invoice.image_path == image_path):
+                invoice.image_path = archive_uri
+                invoice.image_sha256 = sha256
+                invoice.image_archived_at = archived_at
+            db.execute(
+                update(StoredFile)
+                .where(StoredFile.sha256 == sha256, StoredFile.path == image_path)
+                .values(path=archive_uri, size=len(archived), content_type=content_type)
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.archive_backend.delete(archive_key)
+            raise
+
+        # Only now is nothing pointing at the original any more
+        if key is not None:
+            self.backend.delete(key)
+        elif os.path.exists(image_path):
+            os.unlink(image_path)
+        logger.info(f"📦 Archived {image_path} -> {archive_uri} ({len(original)} -> {len(archived)} bytes)")
+        return len(original), len(archived)
+
+    def recompress(self, original):
+        """(bytes, content type, extension); the original is kept when recompressing does not pay off"""
+        if original.startswith(b"%PDF-"):
+            # PDFs are archived as they are: their text layer is what audits need
+            return original, "application/pdf", "pdf"
+        pil_format, content_type, options = ARCHIVE_FORMATS[self.image_format]
+        with Image.open(io.BytesIO(original)) as image:
+            source_format = (image.format or "").lower()
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            if max(image.size) > self.max_side:
+                image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, pil_format, quality=self.quality, **options)
+        if buffer.tell() >= len(original):
+            extension = {"jpeg": "jpg"}.get(source_format, source_format or "bin")
+            return original, Image.MIME.get(source_format.upper(), "application/octet-stream"), extension
+        return buffer.getvalue(), content_type, self.image_format
+
+    def thumbnail(self, original):
+        """JPEG thumbnail bytes; None for a PDF that cannot be rendered"""
+        if original.startswith(b"%PDF-"):
+            return self._pdf_thumbnail(original)
+        with Image.open(io.BytesIO(original)) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+        return buffer.getvalue()
+
+    def _pdf_thumbnail(self, original):
+        fd, tmp_path = tempfile.mkstemp(dir=self.upload_store.tmp_dir, suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(original)
+            image = self.pdf.render_first_page(tmp_path)
+        finally:
+            os.unlink(tmp_path)
+        if image is None:
+            return None
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+        return buffer.getvalue()
+
+    def thumbnail_key(self, sha256):
+        return f"thumbs/{self.upload_store.key_for(sha256)}.jpg"
+
+    def get_thumbnail(self, invoice):
+        """Thumbnail bytes for an invoice, generated on first request for images not archived yet"""
+        if not invoice.image_path:
+            return None
+        sha256 = invoice.image_sha256
+        if sha256 and self.backend.exists(self.thumbnail_key(sha256)):
+            with self.backend.open(self.thumbnail_key(sha256)) as stream:
+                return stream.read()
+
+        try:
+            with self.original(invoice) as local_path:
+                with open(local_path, "rb") as f:
+                    original = f.read()
+        except FileNotFoundError:
+            return None
+        thumbnail = self.thumbnail(original)
+        if thumbnail and sha256:
+            self._put_bytes(self.backend, self.thumbnail_key(sha256), thumbnail, "image/jpeg")
+        return thumbnail
+
+    def delete_image(self, db, sha256, path):
+        """Delete a released image (see UploadStore.release) from its tier, and its thumbnail; call after commit"""
+        # An upload of the same file may have stored it again since the release
+        if db.get(StoredFile, sha256) is not None:
+            return
+        archive_key = self.archive_backend.key_for(path)
+        if archive_key is not None:
+            self.archive_backend.delete(archive_key)
+        else:
+            key = self.backend.key_for(path)
+            if key is not None:
+                self.backend.delete(key)
+        self.backend.delete(self.thumbnail_key(sha256))
+        logger.info(f"🗑️ Deleted {path}, no invoice uses it any more")
+
+    def original(self, invoice):
+        """Context manager yielding a local file with an invoice's image, archived or not"""
+        source_backend = self.archive_backend if invoice.image_archived_at else self.backend
+        return self._original(invoice.image_path, source_backend.key_for(invoice.image_path), source_backend)
+
+    @contextmanager
+    def _original(self, image_path, key, backend=None):
+        """Local file for an image, whether it is a backend key or a pre-storage-layer path on disk"""
+        if key is not None:
+            with (backend or self.backend).local_path(key) as local_path:
+                yield local_path
+        else:
+            if not os.path.exists(image_path):
+                raise FileNotFoundError(image_path)
+            yield image_path
+
+    def _put_bytes(self, backend, key, data, content_type):
+        fd, tmp_path = tempfile.mkstemp(dir=self.upload_store.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            backend.put_file(key, tmp_path, content_type)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
@@ -0,0 +1,279 @@
+import logging
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from jose import JWTError, jwt
+
+from services.auth.auth_service import SECRET_KEY, ALGORITHM
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+# Base URL the browser uses to reach this API, for local direct uploads; empty means same origin
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+# Set to a MinIO (or other S3-compatible) URL to use it instead of AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION") or None
+# Archive tier for old receipts: a separate directory locally, a cheaper storage class on S3
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", str(UPLOAD_DIR / "archive")))
+S3_ARCHIVE_BUCKET = os.getenv("S3_ARCHIVE_BUCKET") or S3_BUCKET
+S3_ARCHIVE_PREFIX = os.getenv("S3_ARCHIVE_PREFIX", "archive/")
+S3_ARCHIVE_STORAGE_CLASS = os.getenv("S3_ARCHIVE_STORAGE_CLASS", "STANDARD_IA")
+
+class UploadRejectedError(ValueError):
+    """Upload refused before being stored"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+class StorageBackend(ABC):
+    """Where stored files live; keys are relative paths such as 'ab/cd/<sha256>'"""
+
+    @abstractmethod
+    def exists(self, key):
+        """Whether an object is stored under key"""
+
+    @abstractmethod
+    def size(self, key):
+        """Size in bytes of a stored object"""
+
+    @abstractmethod
+    def put_file(self, key, local_path, content_type=None):
+        """Store a finished local file under key, consuming the local file"""
+
+    @abstractmethod
+    def open(self, key):
+        """Binary stream of a stored file, usable as a context manager"""
+
+    @abstractmethod
+    def move(self, src_key, dst_key):
+        """Move an object within the backend, server-side where the backend allows it"""
+
+    @abstractmethod
+    def delete(self, key):
+        """Delete an object; a missing key is not an error"""
+
+    @abstractmethod
+    def uri(self, key):
+        """Value recorded in the database for a key"""
+
+    @abstractmethod
+    def key_for(self, uri):
+        """Inverse of uri(); None if the uri belongs to another backend"""
+
+    @abstractmethod
+    def local_path(self, key):
+        """Context manager giving a local file with the stored contents, for code that needs a real file (OCR)"""
+
+    @abstractmethod
+    def presign_upload(self, key, content_type, max_size, expires_in):
+        """Form POST target {url, fields} that lets a browser upload straight to key"""
+
+class LocalStorageBackend(StorageBackend):
+    """Files under a local directory; direct uploads go to /api/uploads/content with a signed token"""
+
+    def __init__(self, root=UPLOAD_DIR, public_url=PUBLIC_API_URL):
+        self.root = Path(root)
+        self.public_url = public_url.rstrip("/")
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key):
+        return self.root / key
+
+    def exists(self, key):
+        return self.path(key).exists()
+
+    def size(self, key):
+        return self.path(key).stat().st_size
+
+    def put_file(self, key, local_path, content_type=None):
+        target = self.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(local_path, target)
+        except OSError:
+            # Temp files on another filesystem cannot be renamed into place
+            shutil.move(local_path, target)
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    def move(self, src_key, dst_key):
+        target = self.path(dst_key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.path(src_key), target)
+
+    def delete(self, key):
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def uri(self, key):
+        return str(self.path(key))
+
+    def key_for(self, uri):
+        try:
+            return Path(uri).relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    @contextmanager
+    def local_path(self, key):
+        yield str(self.path(key))
+
+    def presign_upload(self, key, content_type, max_size, expires_in):
+        token = jwt.encode({
+            "purpose": "upload",
+            "key": key,
+            "content_type": content_type,
+            "max_size": max_size,
+            "exp": datetime.utcnow() + timedelta(seconds=expires_in)
+        }, SECRET_KEY, algorithm=ALGORITHM)
+        return {
+            "url": f"{self.public_url}/api/uploads/content",
+            "fields": {"key": key, "Content-Type": content_type, "token": token}
+        }
+
+    def accept_upload(self, key, token, content_type, fileobj, chunk_size=64 * 1024):
+        """Receive a direct upload authorized by presign_upload(), enforcing its conditions"""
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise UploadRejectedError("Invalid or expired upload token", 403)
+        if claims.get("purpose") != "upload" or claims.get("key") != key or claims.get("content_type") != content_type:
+            raise UploadRejectedError("Upload token does not match this upload", 403)
+
+        target = self.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while chunk := fileobj.read(chunk_size):
+                    size += len(chunk)
+                    if size > claims["max_size"]:
+                        raise UploadRejectedError(f"File exceeds the {claims['max_size']} byte limit", 413)
+                    out.write(chunk)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return size
+
+class S3StorageBackend(StorageBackend):
+    """S3-compatible object storage (AWS S3, MinIO); credentials come from the usual AWS settings"""
+
+    def __init__(self, bucket=S3_BUCKET, prefix=S3_PREFIX, endpoint_url=S3_ENDPOINT_URL, region=S3_REGION,
+                 storage_class=None):
+        try:
+            import boto3
+            from botocore.config import Config
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+        if not bucket:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.storage_class = storage_class
+        self.client_error = ClientError
+        # Path-style addressing works with MinIO and other endpoints without wildcard DNS
+        config = Config(s3={"addressing_style": "path"}) if endpoint_url else None
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region, config=config)
+        logger.info(f"✅ S3 storage: bucket={bucket} endpoint={endpoint_url or 'aws'}")
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def _head(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except self.client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        return head["ContentLength"] if head else None
+
+    def put_file(self, key, local_path, content_type=None):
+        extra_args = {}
+        if content_type:
+            extra_args["ContentType"] = content_type
+        if self.storage_class:
+            extra_args["StorageClass"] = self.storage_class
+        self.client.upload_file(local_path, self.bucket, self._key(key), ExtraArgs=extra_args or None)
+        os.unlink(local_path)
+
+    def open(self, key):
+        return closing(self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"])
+
+    def move(self, src_key, dst_key):
+        # Server-side copy: the bytes never pass through this process
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=self._key(dst_key),
+            CopySource={"Bucket": self.bucket, "Key": self._key(src_key)}
+        )
+        self.delete(src_key)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def uri(self, key):
+        return f"s3://{self.bucket}/{self._key(key)}"
+
+    def key_for(self, uri):
+        base = f"s3://{self.bucket}/{self.prefix}"
+        return uri[len(base):] if uri.startswith(base) else None
+
+    @contextmanager
+    def local_path(self, key):
+        fd, tmp_path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, self._key(key), tmp_path)
+            yield tmp_path
+        finally:
+            os.unlink(tmp_path)
+
+    def presign_upload(self, key, content_type, max_size, expires_in):
+        return self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=self._key(key),
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_size]],
+            ExpiresIn=expires_in
+        )
+
+def create_backend(name=STORAGE_BACKEND):
+    if name == "local":
+        return LocalStorageBackend()
+    if name == "s3":
+        return S3StorageBackend()
+    raise RuntimeError(f"Unknown STORAGE_BACKEND '{name}', expected 'local' or 's3'")
+
+def create_archive_backend(name=STORAGE_BACKEND):
+    if name == "local":
+        return LocalStorageBackend(root=ARCHIVE_DIR)
+    if name == "s3":
+        return S3StorageBackend(
+            bucket=S3_ARCHIVE_BUCKET, prefix=S3_ARCHIVE_PREFIX, storage_class=S3_ARCHIVE_STORAGE_CLASS
+        )
+    raise RuntimeError(f"Unknown STORAGE_BACKEND '{name}', expected 'local' or 's3'")
@@ -0,0 +1,221 @@
+import hashlib
+import logging
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, replace
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from db.models import StoredFile
+from services.storage.backends import UPLOAD_DIR, UploadRejectedError, create_backend
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(10 * 1024 * 1024)))
+DIRECT_UPLOAD_EXPIRES = int(os.getenv("DIRECT_UPLOAD_EXPIRES", "900"))
+CHUNK_SIZE = 64 * 1024
+
+# (content type, magic prefix); WebP is "RIFF????WEBP" and is checked separately
+MAGIC_BYTES = [
+    ("image/jpeg", b"\xff\xd8\xff"),
+    ("image/png", b"\x89PNG\r\n\x1a\n"),
+    ("image/gif", b"GIF87a"),
+    ("image/gif", b"GIF89a"),
+    ("image/bmp", b"BM"),
+    ("image/tiff", b"II*\x00"),
+    ("image/tiff", b"MM\x00*"),
+    ("application/pdf", b"%PDF-"),
+]
+ACCEPTED_CONTENT_TYPES = {"image/webp"} | {content_type for content_type, _ in MAGIC_BYTES}
+
+@dataclass(frozen=True)
+class StoredUpload:
+    sha256: str
+    key: str
+    path: str
+    size: int
+    content_type: str
+    deduplicated: bool
+    # A local copy already on disk (see finalize), used for OCR instead of reading the backend again
+    local_file: str = None
+
+def sniff_content_type(head):
+    """Content type from the first bytes of a file, None if it is not an accepted format"""
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for content_type, magic in MAGIC_BYTES:
+        if head.startswith(magic):
+            return content_type
+    return None
+
+class UploadStore:
+    """Content-addressed upload storage: files live at ab/cd/<sha256> and are shared by refcount.
+
+    The body is hashed while it streams to a temporary file, then handed to the
+    storage backend; identical uploads end up as one stored object. Browsers can
+    also upload straight to the backend and finalize afterwards, which reads the
+    object once for both hashing and OCR.
+    """
+
+    def __init__(self, backend=None, max_size=MAX_UPLOAD_SIZE, tmp_dir=None):
+        self.backend = backend or create_backend()
+        self.max_size = max_size
+        # Next to the files for the local backend, so that finished uploads are renamed into place
+        self.tmp_dir = tmp_dir or UPLOAD_DIR / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def key_for(self, sha256):
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+    def save(self, db, fileobj, declared_size=None, source_key=None):
+        """Store an upload and take a reference on it; the caller commits the transaction.
+
+        With source_key the bytes are already in the backend (a direct upload):
+        they are only hashed here and the object is moved, not re-uploaded.
+        """
+        if declared_size is not None and declared_size > self.max_size:
+            raise UploadRejectedError(f"File exceeds the {self.max_size} byte limit", 413)
+
+        head = fileobj.read(CHUNK_SIZE)
+        content_type = sniff_content_type(head)
+        if content_type is None:
+            raise UploadRejectedError("Unsupported file type, expected an image or PDF", 415)
+
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = None
+        try:
+            out = None
+            if source_key is None:
+                fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+                out = os.fdopen(fd, "wb")
+            try:
+                chunk = head
+                while chunk:
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise UploadRejectedError(f"File exceeds the {self.max_size} byte limit", 413)
+                    digest.update(chunk)
+                    if out:
+                        out.write(chunk)
+                    chunk = fileobj.read(CHUNK_SIZE)
+            finally:
+                if out:
+                    out.close()
+
+            sha256 = digest.hexdigest()
+            key = self.key_for(sha256)
+            deduplicated = self.backend.exists(key)
+            if deduplicated:
+                if source_key is not None:
+                    self.backend.delete(source_key)
+            elif source_key is not None:
+                self.backend.move(source_key, key)
+            else:
+                self.backend.put_file(key, tmp_path, content_type)
+                tmp_path = None
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+        path = self.backend.uri(key)
+        self.acquire(db, sha256, path, size, content_type)
+        if deduplicated:
+            logger.info(f"♻️ Upload {sha256[:12]} already stored, reusing {path}")
+        return StoredUpload(sha256, key, path, size, content_type, deduplicated)
+
+    def presign(self, user_id, content_type, size=None):
+        """Start a direct upload: an upload id plus the form POST the browser sends to the backend"""
+        if content_type not in ACCEPTED_CONTENT_TYPES:
+            raise UploadRejectedError("Unsupported file type, expected an image or PDF", 415)
+        if size is not None and size > self.max_size:
+            raise UploadRejectedError(f"File exceeds the {self.max_size} byte limit", 413)
+
+        upload_id = uuid.uuid4().hex
+        target = self.backend.presign_upload(
+            self.incoming_key(user_id, upload_id), content_type, self.max_size, DIRECT_UPLOAD_EXPIRES
+        )
+        return {
+            "upload_id": upload_id,
+            "url": target["url"],
+            "fields": target["fields"],
+            "expires_in": DIRECT_UPLOAD_EXPIRES
+        }
+
+    @contextmanager
+    def finalize(self, db, user_id, upload_id):
+        """Turn a finished direct upload into a content-addressed stored file.
+
+        A context manager: the object is fetched once through backend.local_path,
+        hashed from that local copy and moved server-side, and the copy serves
+        local_path(stored) for OCR until the block exits.
+        """
+        key = self.incoming_key(user_id, upload_id)
+        size = self.backend.size(key) if self.backend.exists(key) else None
+        if size is None:
+            raise UploadRejectedError("Upload not found or not finished", 404)
+
+        with self.backend.local_path(key) as local_file:
+            try:
+                with open(local_file, "rb") as stream:
+                    stored = self.save(db, stream, declared_size=size, source_key=key)
+            except UploadRejectedError:
+                self.backend.delete(key)
+                raise
+            # The local backend's "copy" is the incoming file itself, which save() has just moved
+            yield replace(stored, local_file=local_file if os.path.exists(local_file) else None)
+
+    def incoming_key(self, user_id, upload_id):
+        try:
+            upload_id = uuid.UUID(hex=upload_id).hex
+        except ValueError:
+            raise UploadRejectedError("Invalid upload id", 404)
+        return f"incoming/{user_id}/{upload_id}"
+
+    def local_path(self, stored):
+        """Context manager yielding a local file for a stored upload"""
+        if stored.local_file:
+            return nullcontext(stored.local_file)
+        return self.backend.local_path(stored.key)
+
+    def acquire(self, db, sha256, path, size, content_type):
+        """Take a reference on a stored file, creating its row on first use"""
+        # The path moves back to the hot tier when an archived image is uploaded again
+        updated = db.execute(
+            update(StoredFile)
+            .where(StoredFile.sha256 == sha256)
+            .values(ref_count=StoredFile.ref_count + 1, path=path, size=size, content_type=content_type)
+        ).rowcount
+        if updated:
+            return
+        try:
+            with db.begin_nested():
+                db.add(StoredFile(sha256=sha256, path=path, size=size, content_type=content_type, ref_count=1))
+        except IntegrityError:
+            # A concurrent upload of the same file created the row first
+            db.execute(
+                update(StoredFile).where(StoredFile.sha256 == sha256).values(ref_count=StoredFile.ref_count + 1)
+            )
+
+    def release(self, db, sha256):
+        """Drop a reference; returns the stored path to delete (after commit) when it was the last one"""
+        db.execute(
+            update(StoredFile).where(StoredFile.sha256 == sha256).values(ref_count=StoredFile.ref_count - 1)
+        )
+        stored = db.get(StoredFile, sha256, populate_existing=True)
+        if stored and stored.ref_count <= 0:
+            path = stored.path
+            db.delete(stored)
+            db.flush()
+            return path
+        return None
+
+    def discard(self, db, stored):
+        """Undo save() for an upload that is rejected before its invoice is committed"""
+        db.rollback()
+        # Only a file this upload created, and only if no other upload has committed a reference since
+        if not stored.deduplicated and db.get(StoredFile, stored.sha256) is None:
+            self.backend.delete(stored.key)
@@ -0,0 +1,208 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from sqlalchemy import event, extract, func, inspect, select
+from sqlalchemy.orm import Session
+
+from db.models import Invoice, Expense, InvoiceType
+from db.user_model import User
+
+LIABILITY_CACHE_SIZE = 2048
+
+class LiabilityService:
+    """Quarterly/annual tax liability per user, computed from stored invoices and expenses.
+
+    Revenue comes from SALE invoices and expenses from deductible Expense rows,
+    both summed in SQL per business type and month. Results are memoized per
+    (user, data version, period, rules version). users.data_version is bumped
+    by every process that writes the user's rows (other API workers, CLI
+    scripts), so a stale entry is never served; the local flush listeners
+    only free memory early.
+    """
+
+    def __init__(self, tax_engine, cache_size=LIABILITY_CACHE_SIZE):
+        self.tax_engine = tax_engine
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compute(self, db, user_id, year, quarter=None):
+        rules = self.tax_engine.rules
+        # One primary key lookup; cheaper than any of the aggregates it saves
+        data_version = db.execute(select(User.data_version).where(User.id == user_id)).scalar()
+        key = (user_id, data_version or 0, year, quarter, rules.version)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        result = self._compute(db, rules, user_id, year, quarter)
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == user_id]:
+                del self._cache[key]
+
+    def _compute(self, db, rules, user_id, year, quarter):
+        start, end = self._period(year, quarter)
+        default_type = rules.default_business_type
+        month = extract("month", Invoice.date)
+
+        revenue_by_type = {}
+        revenue_by_type_month = {}
+        revenue_rows = db.execute(
+            select(
+                func.coalesce(Invoice.business_type, default_type),
+                month,
+                func.sum(Invoice.total)
+            )
+            .where(
+                Invoice.user_id == user_id,
+                Invoice.invoice_type == InvoiceType.SALE,
+                Invoice.date >= start,
+                Invoice.date <= end
+            )
+            .group_by(func.coalesce(Invoice.business_type, default_type), month)
+        )
+        for business_type, invoice_month, total in revenue_rows:
+            revenue_by_type[business_type] = revenue_by_type.get(business_type, 0.0) + (total or 0.0)
+            revenue_by_type_month.setdefault(business_type, [0.0] * 13)[int(invoice_month)] += total or 0.0
+
+        expense_month = extract("month", Expense.date)
+        expenses_by_month = [0.0] * 13
+        expense_rows = db.execute(
+            select(expense_month, func.sum(Expense.amount))
+            .where(
+                Expense.user_id == user_id,
+                Expense.is_deductible == 1,
+                Expense.date >= start,
+                Expense.date <= end
+            )
+            .group_by(expense_month)
+        )
+        for expense_month_value, total in expense_rows:
+            expenses_by_month[int(expense_month_value)] += total or 0.0
+
+        revenue = sum(revenue_by_type.values())
+        expenses = sum(expenses_by_month)
+        by_type = self._by_business_type(rules, year, quarter, revenue_by_type, revenue, expenses)
+
+        result = {
+            "user_id": user_id,
+            "year": year,
+            "quarter": quarter,
+            "period_start": start,
+            "period_end": end,
+            "rules_version": rules.version,
+            "revenue": revenue,
+            "deductible_expenses": expenses,
+            "by_business_type": by_type,
+            "estimated_tax": self._sum_taxes(item["estimated_tax"] for item in by_type),
+            "quarters": [],
+            "disclaimer": "Kết quả mang tính tham khảo, phụ thuộc quyết định cơ quan thuế"
+        }
+
+        if quarter is None:
+            # Breakdown per quarter: VAT/PIT on that quarter's revenue, a quarter of the license fee
+            license_fee = result["estimated_tax"]["license_fee"]
+            for q in range(1, 5):
+                months = range(3 * q - 2, 3 * q + 1)
+                q_revenue = 0.0
+                q_tax = {"vat": 0.0, "pit": 0.0}
+                for item in by_type:
+                    type_months = revenue_by_type_month.get(item["business_type"])
+                    type_revenue = sum(type_months[m] for m in months) if type_months else 0.0
+                    q_revenue += type_revenue
+                    if not item["exempt"]:
+                        q_tax["vat"] += type_revenue * item["vat_rate"]
+                        q_tax["pit"] += type_revenue * item["pit_rate"]
+                q_tax["license_fee"] = license_fee / 4
+                q_tax["total"] = q_tax["vat"] + q_tax["pit"] + q_tax["license_fee"]
+                result["quarters"].append({
+                    "quarter": q,
+                    "revenue": q_revenue,
+                    "deductible_expenses": sum(expenses_by_month[m] for m in months),
+                    "estimated_tax": q_tax
+                })
+
+        return result
+
+    def _by_business_type(self, rules, year, quarter, revenue_by_type, revenue, expenses):
+        """VAT/PIT per business type; one license fee per household, from the main business type"""
+        items = []
+        main_type = max(revenue_by_type, key=revenue_by_type.get) if revenue_by_type else rules.default_business_type
+        # License fee bands are defined on annual revenue
+        annual_revenue = revenue * 4 if quarter else revenue
+        main_rule = rules.lookup_year(main_type, year)
+        license_fee = main_rule.license_fee(annual_revenue)
+        if quarter:
+            license_fee /= 4
+        # The VAT/PIT threshold applies to the household's total revenue
+        exempt = main_rule.exempt(annual_revenue)
+
+        for business_type, type_revenue in sorted(revenue_by_type.items()):
+            rule = rules.lookup_year(business_type, year)
+            vat = 0.0 if exempt else type_revenue * rule.vat_rate
+            pit = 0.0 if exempt else type_revenue * rule.pit_rate
+            fee = license_fee if business_type == main_type else 0.0
+            items.append({
+                "business_type": business_type,
+                "revenue": type_revenue,
+                "deductible_expenses": expenses * type_revenue / revenue if revenue else 0.0,
+                "vat_rate": rule.vat_rate,
+                "pit_rate": rule.pit_rate,
+                "exempt": exempt,
+                "estimated_tax": {"vat": vat, "pit": pit, "license_fee": fee, "total": vat + pit + fee}
+            })
+
+        if not items:
+            items.append({
+                "business_type": main_type,
+                "revenue": 0.0,
+                "deductible_expenses": expenses,
+                "vat_rate": main_rule.vat_rate,
+                "pit_rate": main_rule.pit_rate,
+                "exempt": exempt,
+                "estimated_tax": {"vat": 0.0, "pit": 0.0, "license_fee": license_fee, "total": license_fee}
+            })
+        return items
+
+    def _sum_taxes(self, taxes):
+        total = {"vat": 0.0, "pit": 0.0, "license_fee": 0.0, "total": 0.0}
+        for tax in taxes:
+            for field in total:
+                total[field] += tax[field]
+        return total
+
+    def _period(self, year, quarter):
+        if quarter is None:
+            return date(year, 1, 1), date(year, 12, 31)
+        start = date(year, 3 * quarter - 2, 1)
+        end = date(year + 1, 1, 1) if quarter == 4 else date(year, 3 * quarter + 1, 1)
+        return start, date.fromordinal(end.toordinal() - 1)
+
+    def register_invalidation(self):
+        """Drop cached results of users whose invoices or expenses are flushed"""
+        event.listen(Session, "after_flush", self._collect_changed_users)
+        event.listen(Session, "after_commit", self._invalidate_changed_users)
+        event.listen(Session, "after_rollback", lambda session: session.info.pop("liability_users", None))
+
+    def _collect_changed_users(self, session, flush_context):
+        users = session.info.setdefault("liability_users", set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, (Invoice, Expense)):
+                users.add(obj.user_id)
+                # A row moved to another user changes both users' totals
+                users.update(inspect(obj).attrs.user_id.history.deleted or ())
+
+    def _invalidate_changed_users(self, session):
+        for user_id in session.info.pop("liability_users", set()):
+            if user_id is not None:
+                self.invalidate_user(user_id)
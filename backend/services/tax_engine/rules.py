@@ -0,0 +1,170 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date
+import hashlib
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+class TaxRuleError(ValueError):
+    """Raised when a tax rule file fails validation"""
+
+# Revenue from which a household should become an enterprise, for rule files that do not set it
+DEFAULT_ENTERPRISE_THRESHOLD = 3_000_000_000
+
+@dataclass(frozen=True, slots=True)
+class BusinessRule:
+    """Tax rates for one business type over one effective-date range"""
+    business_type: str
+    effective_from: date
+    effective_to: Optional[date]
+    vat_rate: float
+    pit_rate: float
+    threshold: float
+    # License fee bands: fee_amounts[i] applies from fee_floors[i] (inclusive) upwards
+    fee_floors: Tuple[float, ...]
+    fee_amounts: Tuple[float, ...]
+
+    def license_fee(self, revenue):
+        return self.fee_amounts[max(bisect_right(self.fee_floors, revenue) - 1, 0)]
+
+    def exempt(self, annual_revenue):
+        """Households at or below the threshold pay no VAT/PIT, only the license fee"""
+        return annual_revenue <= self.threshold
+
+    def covers(self, on):
+        return self.effective_from <= on and (self.effective_to is None or on <= self.effective_to)
+
+@dataclass(frozen=True, slots=True)
+class RuleSet:
+    """Compiled, immutable rules; each business type keeps its periods sorted by start date"""
+    version: str
+    default_business_type: str
+    # Read-only view: a RuleSet is shared by every request until the next reload
+    periods: Mapping
+    enterprise_threshold: float = DEFAULT_ENTERPRISE_THRESHOLD
+
+    def business_types(self):
+        return tuple(self.periods)
+
+    def lookup(self, business_type, on=None):
+        """Rule in effect on a date (default today); unknown types use the default type"""
+        starts, rules = self.periods.get(business_type) or self.periods[self.default_business_type]
+        on = on or date.today()
+        index = bisect_right(starts, on) - 1
+        if index < 0 or not rules[index].covers(on):
+            raise TaxRuleError(f"No tax rule for '{business_type}' effective on {on.isoformat()}")
+        return rules[index]
+
+    def lookup_year(self, business_type, tax_year):
+        """Rule for a tax year: the one in effect on 1 January"""
+        return self.lookup(business_type, date(tax_year, 1, 1))
+
+PERIOD_KEYS = {"effective_from", "effective_to", "vat_rate", "pit_rate", "threshold", "license_fee", "license_fee_bands"}
+
+def compile_rules(raw, version=None):
+    """Validate a parsed rule document strictly and compile it into a RuleSet"""
+    if not isinstance(raw, dict):
+        raise TaxRuleError("Rule file must be a mapping")
+    unknown = set(raw) - {"version", "default_business_type", "license_fee_bands", "business_types", "enterprise_threshold"}
+    if unknown:
+        raise TaxRuleError(f"Unknown top-level keys: {sorted(unknown)}")
+    if raw.get("version") != 2:
+        raise TaxRuleError("Unsupported rule file version, expected 'version: 2'")
+
+    business_types = raw.get("business_types")
+    if not isinstance(business_types, dict) or not business_types:
+        raise TaxRuleError("'business_types' must be a non-empty mapping")
+
+    periods = {}
+    for business_type, entries in business_types.items():
+        if not isinstance(entries, list) or not entries:
+            raise TaxRuleError(f"{business_type}: expected a non-empty list of effective periods")
+        rules = sorted(
+            (_compile_period(business_type, entry, raw.get("license_fee_bands")) for entry in entries),
+            key=lambda rule: rule.effective_from
+        )
+        for previous, current in zip(rules, rules[1:]):
+            if previous.effective_to is None or previous.effective_to >= current.effective_from:
+                raise TaxRuleError(
+                    f"{business_type}: period starting {previous.effective_from} overlaps {current.effective_from}"
+                )
+        periods[business_type] = (tuple(rule.effective_from for rule in rules), tuple(rules))
+
+    default_business_type = raw.get("default_business_type", next(iter(periods)))
+    if default_business_type not in periods:
+        raise TaxRuleError(f"default_business_type '{default_business_type}' is not defined")
+
+    enterprise_threshold = _number(raw.get("enterprise_threshold", DEFAULT_ENTERPRISE_THRESHOLD), "enterprise_threshold")
+
+    if version is None:
+        version = hashlib.sha256(repr(raw).encode("utf-8")).hexdigest()[:12]
+    return RuleSet(version=version, default_business_type=default_business_type,
+                   periods=MappingProxyType(periods), enterprise_threshold=enterprise_threshold)
+
+def _compile_period(business_type, entry, shared_bands):
+    where = f"{business_type}"
+    if not isinstance(entry, dict):
+        raise TaxRuleError(f"{where}: each period must be a mapping")
+    unknown = set(entry) - PERIOD_KEYS
+    if unknown:
+        raise TaxRuleError(f"{where}: unknown keys {sorted(unknown)}")
+
+    effective_from = _date(entry.get("effective_from"), f"{where}.effective_from", required=True)
+    effective_to = _date(entry.get("effective_to"), f"{where}.effective_to", required=False)
+    if effective_to is not None and effective_to < effective_from:
+        raise TaxRuleError(f"{where}: effective_to is before effective_from")
+
+    if "license_fee" in entry and "license_fee_bands" in entry:
+        raise TaxRuleError(f"{where}: use either license_fee or license_fee_bands, not both")
+    if "license_fee" in entry:
+        bands = [{"min_revenue": 0, "fee": entry["license_fee"]}]
+    else:
+        bands = entry.get("license_fee_bands", shared_bands)
+    floors, amounts = _fee_bands(bands, f"{where}.license_fee_bands")
+
+    return BusinessRule(
+        business_type=business_type,
+        effective_from=effective_from,
+        effective_to=effective_to,
+        vat_rate=_number(entry.get("vat_rate"), f"{where}.vat_rate", maximum=1),
+        pit_rate=_number(entry.get("pit_rate"), f"{where}.pit_rate", maximum=1),
+        threshold=_number(entry.get("threshold"), f"{where}.threshold"),
+        fee_floors=floors,
+        fee_amounts=amounts
+    )
+
+def _fee_bands(bands, where):
+    if not isinstance(bands, list) or not bands:
+        raise TaxRuleError(f"{where}: expected a non-empty list of bands")
+    floors, amounts = [], []
+    for band in bands:
+        if not isinstance(band, dict) or set(band) != {"min_revenue", "fee"}:
+            raise TaxRuleError(f"{where}: each band needs exactly 'min_revenue' and 'fee'")
+        floors.append(_number(band["min_revenue"], f"{where}.min_revenue"))
+        amounts.append(_number(band["fee"], f"{where}.fee"))
+    if floors[0] != 0:
+        raise TaxRuleError(f"{where}: the first band must start at min_revenue 0")
+    if any(b <= a for a, b in zip(floors, floors[1:])):
+        raise TaxRuleError(f"{where}: bands must be sorted by strictly increasing min_revenue")
+    return tuple(floors), tuple(amounts)
+
+def _number(value, where, maximum=None):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TaxRuleError(f"{where}: expected a number, got {value!r}")
+    if value < 0 or (maximum is not None and value > maximum):
+        raise TaxRuleError(f"{where}: {value} is out of range")
+    return float(value)
+
+def _date(value, where, required):
+    if value is None:
+        if required:
+            raise TaxRuleError(f"{where}: required")
+        return None
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
+    raise TaxRuleError(f"{where}: expected a YYYY-MM-DD date, got {value!r}")
@@ -1,49 +1,125 @@
+import hashlib
+import logging
+import os
+import threading
+import time
 import yaml
+from datetime import date
 from pathlib import Path
 
+from services.tax_engine.rules import compile_rules, TaxRuleError
+
+logger = logging.getLogger(__name__)
+
+TAX_RULES_RELOAD_INTERVAL = float(os.getenv("TAX_RULES_RELOAD_INTERVAL", "2"))
+
+DEFAULT_RULES = {
+    "version": 2,
+    "default_business_type": "food_service",
+    "enterprise_threshold": 3000000000,
+    "license_fee_bands": [
+        {"min_revenue": 0, "fee": 1000000},
+        {"min_revenue": 100000000, "fee": 2000000},
+        {"min_revenue": 300000000, "fee": 3000000}
+    ],
+    "business_types": {
+        "food_service": [
+            {"effective_from": "2021-01-01", "vat_rate": 0.025, "pit_rate": 0.015, "threshold": 100000000}
+        ],
+        "retail": [
+            {"effective_from": "2021-01-01", "vat_rate": 0.02, "pit_rate": 0.01, "threshold": 100000000}
+        ]
+    }
+}
+
 class TaxEngine:
     def __init__(self, config_path=None):
         if config_path is None:
             config_path = Path(__file__).parent.parent.parent / "configs" / "tax_rules.yaml"
-        self.rules = self._load_rules(config_path)
+        self.config_path = Path(config_path)
+        self._reload_lock = threading.Lock()
+        self._file_stamp = None
+        self._next_check = 0.0
+        # Strict at startup: an invalid rule file stops the worker instead of silently using defaults
+        self._rules = self._load_rules(self.config_path)
+    
+    @property
+    def rules(self):
+        """Current compiled RuleSet, swapped atomically when the rule file changes"""
+        if time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        return self._rules
+    
+    @property
+    def rules_version(self):
+        return self.rules.version
     
     def _load_rules(self, config_path):
-        default_rules = {
-            "food_service": {
-                "vat_rate": 0.025,
-                "pit_rate": 0.015,
-                "license_fee": 1000000,
-                "threshold": 100000000
-            },
-            "retail": {
-                "vat_rate": 0.02,
-                "pit_rate": 0.01,
-                "license_fee": 1000000,
-                "threshold": 100000000
-            }
-        }
+        if not config_path.exists():
+            logger.warning(f"⚠️ Tax rules not found at {config_path}, using built-in defaults")
+            return compile_rules(DEFAULT_RULES, version="default")
         
+        self._file_stamp = self._stamp(config_path)
+        content = config_path.read_bytes()
         try:
-            if Path(config_path).exists():
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    return yaml.safe_load(f)
-        except:
-            pass
-        
-        return default_rules
+            raw = yaml.safe_load(content)
+        except yaml.YAMLError as e:
+            raise TaxRuleError(f"{config_path}: invalid YAML: {e}")
+        return compile_rules(raw, version=hashlib.sha256(content).hexdigest()[:12])
     
-    def calculate_tax(self, revenue, expenses, business_type="food_service"):
-        rules = self.rules.get(business_type, self.rules["food_service"])
-        
-        vat = revenue * rules["vat_rate"]
-        pit = revenue * rules["pit_rate"]
-        license_fee = rules["license_fee"]
+    def _maybe_reload(self):
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + TAX_RULES_RELOAD_INTERVAL
+            if not self.config_path.exists() or self._stamp(self.config_path) == self._file_stamp:
+                return
+            try:
+                rules = self._load_rules(self.config_path)
+            except (OSError, TaxRuleError) as e:
+                # Keep serving the last good rules; the broken file is retried when it changes again
+                logger.error(f"❌ Tax rules reload failed, keeping version {self._rules.version}: {str(e)}")
+                return
+            self._rules = rules
+            logger.info(f"🔄 Tax rules reloaded, version {rules.version}")
+        finally:
+            self._reload_lock.release()
+    
+    def _stamp(self, config_path):
+        stat = config_path.stat()
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def get_rule(self, business_type="food_service", tax_year=None):
+        """Rule for a business type in a tax year (default: current year)"""
+        return self.rules.lookup_year(business_type, tax_year or date.today().year)
+    
+    def calculate_tax(self, revenue, expenses, business_type="food_service", tax_year=None):
+        rules = self.rules
+        rule = rules.lookup_year(business_type, tax_year or date.today().year)
+        return self._calculate(rule, revenue, expenses)
+    
+    def calculate_batch(self, entries):
+        """Calculate many (revenue, expenses, business_type, tax_year) entries against one rules snapshot"""
+        rules = self.rules
+        today = date.today()
+        return [
+            self._calculate(rules.lookup_year(business_type, tax_year or today.year), revenue, expenses)
+            for revenue, expenses, business_type, tax_year in entries
+        ]
+    
+    def _calculate(self, rule, revenue, expenses):
+        exempt = rule.exempt(revenue)
+        vat = 0.0 if exempt else revenue * rule.vat_rate
+        pit = 0.0 if exempt else revenue * rule.pit_rate
+        license_fee = rule.license_fee(revenue)
         
         total_tax = vat + pit + license_fee
         
         notes = []
-        if revenue > rules["threshold"]:
-            notes.append(f"Doanh thu vượt ngưỡng {rules['threshold']:,.0f} VNĐ")
+        if exempt:
+            notes.append(f"Doanh thu không vượt ngưỡng {rule.threshold:,.0f} VNĐ, không phải nộp thuế GTGT, TNCN")
+        else:
+            notes.append(f"Doanh thu vượt ngưỡng {rule.threshold:,.0f} VNĐ")
             notes.append("Cần đăng ký hóa đơn điện tử")
         
         return {
@@ -58,3 +134,22 @@ class TaxEngine:
             "notes": notes,
             "disclaimer": "Kết quả mang tính tham khảo, phụ thuộc quyết định cơ quan thuế"
         }
+    
+    def get_rule_advice(self, revenue, expenses, business_type=None):
+        """Rule-based advice from the revenue thresholds of the current rules"""
+        rules = self.rules
+        threshold = rules.lookup(business_type or rules.default_business_type).threshold
+        advice = []
+        
+        if revenue <= threshold:
+            advice.append(f"✅ Doanh thu không quá {threshold:,.0f} VNĐ, không nộp thuế GTGT, TNCN, chỉ nộp lệ phí môn bài")
+        elif revenue < rules.enterprise_threshold:
+            advice.append(f"📊 Doanh thu {revenue:,.0f} VNĐ - nên nộp thuế khoán")
+            advice.append("💡 Cân nhắc đăng ký HĐĐT để minh bạch")
+        else:
+            advice.append(f"⚠️ Doanh thu từ {rules.enterprise_threshold:,.0f} VNĐ trở lên - cần chuyển thành doanh nghiệp")
+        
+        if expenses > revenue * 0.7:
+            advice.append("💡 Chi phí cao, nên chuyển sang kê khai để giảm thuế")
+        
+        return advice
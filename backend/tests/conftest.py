@@ -0,0 +1,87 @@
+import io
+import itertools
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Set before main (and db.database) are imported: every test run gets its own database and upload directory
+TEST_DIR = Path(tempfile.mkdtemp(prefix="aitax-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DIR / 'test.db'}"
+os.environ["UPLOAD_DIR"] = str(TEST_DIR / "uploads")
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["CHATBOT_MODEL_CACHE"] = str(TEST_DIR / "gemini_model.json")
+os.environ.pop("GEMINI_API_KEY", None)
+os.environ.pop("GOOGLE_CLOUD_VISION_API_KEY", None)
+
+_emails = itertools.count()
+
+@pytest.fixture(scope="session")
+def app():
+    import main
+    return main
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+    with TestClient(app.app) as client:
+        yield client
+
+@pytest.fixture
+def db(client):
+    from db.database import SessionLocal
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def user(db):
+    from db.user_model import User
+    user = User(email=f"user{next(_emails)}@example.vn", name="Test")
+    db.add(user)
+    db.commit()
+    return user
+
+@pytest.fixture
+def auth_headers(user):
+    from services.auth.auth_service import create_access_token
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}
+
+# What a receipt reads as when OCR is stubbed out with fake_ocr
+RECEIPT_TEXT = "CỬA HÀNG MINH ANH\nHĐ: 0001234\nNgày 06/05/2024\nTổng tiền hàng: 70.000\nVAT: 7.000\nTổng cộng: 77.000"
+
+@pytest.fixture
+def fake_ocr(app, monkeypatch):
+    """OCR without engines: every image reads as RECEIPT_TEXT (set fake_ocr.text to change it)"""
+    class FakeOCR:
+        text = RECEIPT_TEXT
+        calls = 0
+
+        def engine(self, image_path):
+            self.calls += 1
+            return [self.text], []
+
+    fake = FakeOCR()
+    monkeypatch.setattr(app.ocr_service.orchestrator, "engines", lambda: [("tesseract", fake.engine)])
+    monkeypatch.setattr(app.ocr_service, "qr_decoder", None)
+    return fake
+
+def image_bytes(seed=None, size=(240, 320)):
+    """A PNG no other test uploads: random blocks, so neither its bytes nor its perceptual hash repeat"""
+    from PIL import Image
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, "white")
+    for _ in range(12):
+        x, y = rng.randrange(size[0] - 40), rng.randrange(size[1] - 40)
+        image.paste(tuple(rng.randrange(256) for _ in range(3)), (x, y, x + 40, y + 40))
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return out.getvalue()
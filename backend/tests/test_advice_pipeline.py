@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from services.chatbot.advice_pipeline import ADVICE_MAX_BUDGET_MS, AdvicePipeline
+from services.chatbot.chatbot_service import TaxChatbot
+from services.chatbot.llm_gateway import LLMGateway
+from services.tax_engine.tax_calculator import TaxEngine
+
+class SlowChatbot(TaxChatbot):
+    def __init__(self, delay):
+        super().__init__(TaxEngine())
+        self.status = self.STATUS_READY
+        self.delay = delay
+
+    def generate(self, prompt):
+        time.sleep(self.delay)
+        return "Nên giữ hóa đơn chi phí đầy đủ\nCân nhắc chuyển sang kê khai"
+
+def pipelines(delay, **kwargs):
+    """Two pipelines sharing only the database, like two uvicorn workers"""
+    chatbot = SlowChatbot(delay)
+    return (AdvicePipeline(chatbot.tax_engine, chatbot, LLMGateway(), **kwargs),
+            AdvicePipeline(chatbot.tax_engine, chatbot, LLMGateway(), **kwargs))
+
+def test_deferred_advice_is_served_by_another_worker(client):
+    first, second = pipelines(delay=0.3)
+
+    async def scenario():
+        response = await first.advise(500_000_000, 100_000_000, "retail", budget_ms=10)
+        assert response["ai_status"] == "pending"
+        assert second.get_result(response["advice_id"])["ai_status"] == "pending"
+        while first._saving:
+            await asyncio.sleep(0.05)
+        return response["advice_id"]
+
+    advice_id = asyncio.run(scenario())
+    result = second.get_result(advice_id)
+    assert result["ai_status"] == "complete"
+    assert "Nên giữ hóa đơn chi phí đầy đủ" in result["advice"]
+    assert result["timings"]["ai_ms"] >= 300
+
+def test_expired_advice_is_not_found(client):
+    first, _ = pipelines(delay=0.2, result_ttl=0)
+
+    async def scenario():
+        response = await first.advise(200_000_000, 0, "retail", budget_ms=0)
+        while first._saving:
+            await asyncio.sleep(0.05)
+        return response["advice_id"]
+
+    assert first.get_result(asyncio.run(scenario())) is None
+    assert first.get_result("unknown") is None
+
+def test_budget_is_capped(client):
+    first, _ = pipelines(delay=0)
+    response = asyncio.run(first.advise(200_000_000, 0, "retail", budget_ms=10 ** 9))
+    assert response["ai_status"] == "complete"
+    assert response["timings"]["budget_ms"] == ADVICE_MAX_BUDGET_MS
+
+def test_negative_budget_is_rejected(client, app):
+    if not app.CHATBOT_AVAILABLE:
+        pytest.skip("chatbot not installed")
+    response = client.post("/api/chatbot/advice", json={"revenue": 1, "expenses": 0, "ai_budget_ms": -1})
+    assert response.status_code == 422
@@ -0,0 +1,136 @@
+import pytest
+from hypothesis import example, given, strategies as st
+
+from benchmark_amounts import legacy_normalize_amount, random_amount
+from services.ocr.amount_lexer import MAX_DIGITS, AmountLexer
+from services.ocr.ocr_service import OCRService
+
+lexer = AmountLexer()
+normalize_amount = OCRService(load_engines=False)._normalize_amount
+
+SUFFIXES = st.sampled_from(["", "đ", " đ", "₫", "VNĐ", " VNĐ", " vnd", " dong", " đồng"])
+POINTS = st.sampled_from(".,")
+SPACES = st.sampled_from([" ", "\u00a0", "\u202f"])
+# Up to MAX_DIGITS digits, so no amount below is too long
+VALUES = st.integers(min_value=1, max_value=10 ** MAX_DIGITS - 1)
+
+def grouped(value, separator):
+    return f"{value:,}".replace(",", separator)
+
+@st.composite
+def amounts(draw):
+    """Amounts written the ways receipts write them, each with the value it stands for"""
+    value = draw(VALUES)
+    shape = draw(st.sampled_from(["integer", "thousands", "spaces", "decimal", "mixed"]))
+    if shape == "integer":
+        text = str(value)
+    elif shape == "thousands":
+        text = grouped(value, draw(POINTS))
+    elif shape == "spaces":
+        text = grouped(value, draw(SPACES))
+    elif shape == "decimal":
+        value = draw(st.integers(min_value=1, max_value=10 ** 6))
+        cents = draw(st.integers(min_value=0, max_value=99))
+        text = f"{value}{draw(POINTS)}{cents:02d}"
+        value += cents / 100
+    else:
+        value = draw(st.integers(min_value=1000, max_value=10 ** 8 - 1))
+        cents = draw(st.integers(min_value=0, max_value=99))
+        thousands, decimal = draw(st.sampled_from([(".", ","), (",", "."), (" ", ","), (" ", ".")]))
+        text = f"{grouped(value, thousands)}{decimal}{cents:02d}"
+        value += cents / 100
+    return text + draw(SUFFIXES), value
+
+@st.composite
+def irregular_groupings(draw):
+    """Numbers whose digit groups fit no rule, such as 12.34.567 or 1,2345"""
+    separator = draw(POINTS)
+    # At most MAX_DIGITS digits in all, or the number is too long before it is irregular
+    groups = draw(st.lists(st.integers(min_value=1, max_value=3), min_size=2, max_size=3))
+    # One separator with a 1-2 digit tail is a decimal, so that shape needs a third group
+    if all(size == 3 for size in groups[1:]):
+        groups[-1] = draw(st.sampled_from([1, 2, 4]))
+    if len(groups) == 2 and groups[1] <= 2:
+        groups.append(3)
+    digits = draw(st.lists(st.sampled_from("123456789"), min_size=sum(groups), max_size=sum(groups)))
+    parts, position = [], 0
+    for size in groups:
+        parts.append("".join(digits[position:position + size]))
+        position += size
+    return separator.join(parts)
+
+@given(amounts())
+@example(("68.391", 68391))
+@example(("68,391", 68391))
+@example(("68 391", 68391))
+@example(("1.234.567,50", 1234567.5))
+@example(("68,391.50", 68391.5))
+@example(("55.000đ", 55000))
+def test_reads_every_amount_shape(case):
+    text, value = case
+    token = lexer.parse(text)
+    assert token.ambiguity is None
+    assert token.value == pytest.approx(value)
+    assert normalize_amount(text) == pytest.approx(value)
+
+@given(st.randoms(use_true_random=False))
+def test_agrees_with_the_legacy_normalizer_whenever_it_reads_a_value(rng):
+    # random_amount also produces glued and irregular strings: those may be ambiguous, never different
+    text = random_amount(rng)
+    token = lexer.parse(text)
+    if token.ambiguity is None:
+        assert normalize_amount(text) == legacy_normalize_amount(text)
+    else:
+        assert normalize_amount(text) == 0.0
+
+@given(amounts())
+def test_agrees_with_the_legacy_normalizer_on_unambiguous_amounts(case):
+    text, _ = case
+    assert normalize_amount(text) == legacy_normalize_amount(text)
+
+@given(st.integers(min_value=10 ** MAX_DIGITS, max_value=10 ** 15), st.sampled_from(["", ".", ","]))
+@example(12345678901, "")
+def test_too_long_runs_are_not_guessed(value, separator):
+    # The legacy code kept the last 8 digits of these
+    text = grouped(value, separator) if separator else str(value)
+    assert lexer.parse(text).ambiguity == "too_long"
+    assert normalize_amount(text) == 0.0
+
+@given(irregular_groupings())
+@example("12.34.567")
+@example("1,2345")
+@example("1234.567.890")
+def test_irregular_grouping_is_not_guessed(text):
+    assert lexer.parse(text).ambiguity == "irregular_grouping"
+    assert normalize_amount(text) == 0.0
+
+@given(st.text(alphabet=st.characters(blacklist_categories=("Nd",))))
+def test_text_without_digits_has_no_number(text):
+    assert lexer.parse(text).ambiguity == "no_number"
+    assert normalize_amount(text) == 0.0
+
+@given(amounts(), amounts(), st.sampled_from([" x ", " - ", " SL ", "\n"]))
+@example(("2", 2), ("50.000", 50000), " ")
+def test_several_numbers_are_not_guessed(first, second, between):
+    text = f"{first[0]}{between}{second[0]}"
+    assert lexer.parse(text).ambiguity == "multiple_numbers"
+    assert normalize_amount(text) == 0.0
+
+@given(st.text(alphabet="0123456789., \u00a0\u202f\t\nđĐvnVNdongồ₫x:"))
+def test_tokens_are_ordered_slices_of_the_text(text):
+    end = 0
+    for token in lexer.tokenize(text):
+        assert end <= token.start < token.end <= len(text)
+        assert text[token.start:token.end] == token.text
+        assert (token.value is None) == (token.ambiguity is not None)
+        end = token.end
+
+@given(amounts())
+def test_amounts_are_found_inside_a_line(case):
+    text, value = case
+    tokens = list(lexer.tokenize(f"Tổng cộng: {text} (đã gồm VAT)"))
+    assert [token.value for token in tokens] == [pytest.approx(value)]
+    assert tokens[0].currency == (text.rstrip()[-1] not in "0123456789")
+
+def test_digits_after_a_point_do_not_start_an_amount():
+    assert [token.text for token in lexer.tokenize("Bản v1.2 - mã .500 - 70.000đ")] == ["1.2", "70.000đ"]
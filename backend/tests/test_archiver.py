@@ -0,0 +1,31 @@
+import io
+from datetime import date
+
+from conftest import image_bytes
+from db.models import Invoice, InvoiceType
+from db.user_model import User
+from services.storage.archiver import UploadArchiver
+from services.storage.backends import LocalStorageBackend
+
+def test_archiving_bumps_the_owner_data_version(app, client, db, user, auth_headers, tmp_path):
+    stored = app.upload_store.save(db, io.BytesIO(image_bytes(seed="archive", size=(800, 1000))))
+    invoice = Invoice(invoice_type=InvoiceType.PURCHASE, date=date(2020, 1, 2), total=10_000,
+                      image_path=stored.path, image_sha256=stored.sha256, user_id=user.id)
+    db.add(invoice)
+    db.commit()
+
+    first = client.get("/api/invoices", headers=auth_headers)
+    etag = first.headers["etag"]
+    version = db.get(User, user.id, populate_existing=True).data_version
+
+    archiver = UploadArchiver(app.upload_store, archive_backend=LocalStorageBackend(root=tmp_path / "archive"))
+    archiver.archive(db, stored.path)
+
+    db.refresh(invoice)
+    assert invoice.image_archived_at is not None
+    assert invoice.image_path.startswith(str(tmp_path / "archive"))
+    assert db.get(User, user.id, populate_existing=True).data_version > version
+    # Cached list responses are not served for the old image path
+    assert client.get("/api/invoices", headers={**auth_headers, "If-None-Match": etag}).status_code == 200
+    with archiver.original(invoice) as path:
+        assert path.startswith(str(tmp_path / "archive"))
@@ -0,0 +1,101 @@
+import io
+from datetime import date
+
+from PIL import Image
+
+from conftest import image_bytes
+from db.models import Invoice, InvoiceType
+from services.invoice.duplicates import DuplicateDetector
+
+def upload(client, headers, data, **form):
+    return client.post("/api/invoices/upload", files={"file": ("receipt.png", data, "image/png")},
+                       data=form, headers=headers)
+
+def rescaled(data, scale=0.9):
+    """The same picture at another size and format, as a second photo or a messenger would produce"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.resize((int(image.width * scale), int(image.height * scale)), Image.LANCZOS)
+        out = io.BytesIO()
+        image.convert("RGB").save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+def test_same_image_is_rejected_before_ocr(client, auth_headers, fake_ocr):
+    data = image_bytes()
+    first = upload(client, auth_headers, data)
+    assert first.status_code == 200
+
+    second = upload(client, auth_headers, data)
+    assert second.status_code == 409
+    assert second.json()["detail"]["reason"] == "same_image"
+    assert second.json()["detail"]["duplicate_of"] == first.json()["id"]
+    assert fake_ocr.calls == 1
+
+def test_similar_image_is_rejected_before_ocr(client, auth_headers, fake_ocr):
+    data = image_bytes(seed=49)
+    assert upload(client, auth_headers, data).status_code == 200
+
+    response = upload(client, auth_headers, rescaled(data))
+    assert response.status_code == 409
+    detail = response.json()["detail"]
+    assert detail["reason"] == "similar_image"
+    assert 0 <= detail["distance"] <= DuplicateDetector().radius
+    assert fake_ocr.calls == 1
+
+def test_another_photo_of_the_same_invoice_is_rejected_after_ocr(client, auth_headers, fake_ocr):
+    first = upload(client, auth_headers, image_bytes())
+    second = upload(client, auth_headers, image_bytes())
+    # Different pictures, both read as RECEIPT_TEXT: same seller, number, date and total
+    assert second.status_code == 409
+    assert second.json()["detail"]["reason"] == "same_invoice"
+    assert second.json()["detail"]["duplicate_of"] == first.json()["id"]
+    assert fake_ocr.calls == 2
+
+def test_allow_duplicate_keeps_both(client, auth_headers, db, user, fake_ocr):
+    data = image_bytes()
+    assert upload(client, auth_headers, data).status_code == 200
+    assert upload(client, auth_headers, data, allow_duplicate="true").status_code == 200
+    assert upload(client, auth_headers, image_bytes(), allow_duplicate="true").status_code == 200
+    assert db.query(Invoice).filter(Invoice.user_id == user.id).count() == 3
+
+def test_other_users_invoices_are_not_duplicates(client, db, auth_headers, fake_ocr):
+    from db.user_model import User
+    from services.auth.auth_service import create_access_token
+    other = User(email="other-duplicates@example.vn", name="Other")
+    db.add(other)
+    db.commit()
+    other_headers = {"Authorization": f"Bearer {create_access_token({'sub': other.email})}"}
+
+    data = image_bytes()
+    assert upload(client, auth_headers, data).status_code == 200
+    assert upload(client, other_headers, data).status_code == 200
+
+def test_review_refreshes_the_invoice_key(client, auth_headers, db, fake_ocr):
+    first = upload(client, auth_headers, image_bytes()).json()
+    response = client.post(f"/api/invoices/{first['id']}/review", json={"total": 88000}, headers=auth_headers)
+    assert response.status_code == 200
+
+    invoice = db.get(Invoice, first["id"])
+    assert invoice.invoice_key == DuplicateDetector().key_of(invoice)
+    # The receipt now reads as another invoice than the reviewed one, so it is no duplicate any more
+    assert upload(client, auth_headers, image_bytes()).status_code == 200
+    fake_ocr.text = fake_ocr.text.replace("77.000", "88.000")
+    response = upload(client, auth_headers, image_bytes())
+    assert response.status_code == 409
+    assert response.json()["detail"]["reason"] == "same_invoice"
+    assert response.json()["detail"]["duplicate_of"] == first["id"]
+
+def test_hash_lookup_finds_neighbours_within_the_radius(db, user):
+    detector = DuplicateDetector(radius=3)
+    stored = 0x0123_4567_89AB_CDEF
+    invoice = Invoice(invoice_type=InvoiceType.PURCHASE, date=date.today(), total=1,
+                      user_id=user.id, image_sha256="0" * 64, **detector.hash_columns(stored))
+    db.add(invoice)
+    db.commit()
+
+    # One bit in each of three chunks: only one chunk still matches exactly
+    near = stored ^ (1 << 60) ^ (1 << 40) ^ (1 << 20)
+    match = detector.find_by_image(db, user.id, "1" * 64, near)
+    assert (match.invoice_id, match.reason, match.distance) == (invoice.id, "similar_image", 3)
+
+    assert detector.find_by_image(db, user.id, "1" * 64, near ^ 1) is None
+    assert detector.find_by_image(db, user.id, "0" * 64, None).reason == "same_image"
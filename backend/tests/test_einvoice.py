@@ -0,0 +1,69 @@
+import io
+import zipfile
+
+import pytest
+
+from services.invoice import einvoice
+from services.invoice.einvoice import EInvoiceParser
+
+def hdon(number, issued="2024-05-06", total="110000", seller="Công ty TNHH Minh Anh"):
+    number_tag = f"<SHDon>{number}</SHDon>" if number else ""
+    return f"""<HDon><DLHDon>
+      <TTChung><KHHDon>C24TAA</KHHDon>{number_tag}<NLap>{issued}</NLap></TTChung>
+      <NDHDon>
+        <NBan><Ten>{seller}</Ten><MST>0312345678</MST></NBan>
+        <NMua><Ten>Hộ kinh doanh A</Ten></NMua>
+        <DSHHDVu><HHDVu><THHDVu>Cà phê</THHDVu><SLuong>2</SLuong><DGia>50000</DGia><ThTien>100000</ThTien></HHDVu></DSHHDVu>
+        <TToan><TgTCThue>100000</TgTCThue><TgTThue>10000</TgTThue><TgTTTBSo>{total}</TgTTTBSo></TToan>
+      </NDHDon>
+    </DLHDon></HDon>"""
+
+def document(*invoices):
+    return f'<?xml version="1.0" encoding="UTF-8"?><DSHDon>{"".join(invoices)}</DSHDon>'.encode("utf-8")
+
+def parse(data, filename="batch.xml"):
+    return list(EInvoiceParser().parse_upload(io.BytesIO(data), filename))
+
+def test_invalid_invoice_does_not_abort_the_rest_of_the_file():
+    results = parse(document(hdon("0000001"), hdon(None), hdon("0000003", issued="06/05/2024"), hdon("0000004")))
+    imported = [invoice["invoice_number"] for _, invoice, error in results if not error]
+    errors = [(source, error) for source, _, error in results if error]
+    assert imported == ["C24TAA-0000001", "C24TAA-0000004"]
+    assert errors == [
+        ("batch.xml#2", "Missing invoice number (SHDon) or issue date (NLap)"),
+        ("batch.xml#3", "Invalid issue date '06/05/2024'"),
+    ]
+
+def test_fields_and_items():
+    [(_, invoice, error)] = parse(document(hdon("0000009")))
+    assert error is None
+    assert invoice["total"] == 110000 and invoice["vat"] == 10000 and invoice["subtotal"] == 100000
+    assert invoice["seller_tax_code"] == "0312345678"
+    assert invoice["items"] == [{"name": "Cà phê", "quantity": 2.0, "unit_price": 50000.0, "amount": 100000.0}]
+
+def test_zip_batch_reports_each_file():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("good.xml", document(hdon("0000010")))
+        archive.writestr("broken.xml", b"<HDon><TTChung>")
+    results = parse(buffer.getvalue(), "batch.zip")
+    assert [(source, error is None) for source, _, error in results] == [("good.xml", True), ("broken.xml", False)]
+
+def test_entity_expansion_is_rejected():
+    bomb = b'<?xml version="1.0"?><!DOCTYPE x [<!ENTITY a "aaaaaaaaaa"><!ENTITY b "&a;&a;&a;&a;">]><HDon>&b;</HDon>'
+    [(_, invoice, error)] = parse(bomb)
+    assert invoice is None and error
+
+def test_xml_is_refused_without_defusedxml(monkeypatch):
+    monkeypatch.setattr(einvoice, "DEFUSEDXML_AVAILABLE", False)
+    [(_, invoice, error)] = parse(document(hdon("0000011")))
+    assert invoice is None and "defusedxml" in error
+
+def test_import_endpoint_keeps_valid_invoices(client, auth_headers):
+    data = document(hdon("1000001", seller="Nhà sách Bình Minh"), hdon(None), hdon("1000003", seller="Nhà sách Bình Minh"))
+    response = client.post("/api/invoices/einvoice", files={"file": ("batch.xml", data, "application/xml")},
+                           headers=auth_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert [invoice["invoice_number"] for invoice in body["imported"]] == ["C24TAA-1000001", "C24TAA-1000003"]
+    assert [error["source"] for error in body["errors"]] == ["batch.xml#2"]
@@ -0,0 +1,61 @@
+import pytest
+
+from services.chatbot.intent_router import TaxIntentRouter
+from services.tax_engine.tax_calculator import TaxEngine
+
+@pytest.fixture(scope="module")
+def router():
+    return TaxIntentRouter(TaxEngine())
+
+@pytest.mark.parametrize("question", [
+    # Salary income tax, not household business tax
+    "Thuế TNCN cho thu nhập 15 triệu/tháng là bao nhiêu?",
+    "Lương 20 triệu thì nộp thuế bao nhiêu?",
+    # Penalties and follow-ups need an explanation
+    "phạt chậm nộp thuế 5 triệu thì sao",
+    "Nộp thuế trễ bị phạt 2 triệu đúng không",
+    "Doanh thu 500 triệu thì sao, có phải nộp thuế không?",
+    "Tại sao doanh thu 200 triệu phải nộp thuế?",
+    # An amount with neither a revenue keyword nor a business type
+    "Thuế 200 triệu bao nhiêu?",
+])
+def test_questions_for_the_llm(router, question):
+    assert router.extract(question) is None
+    assert router.answer(question) is None
+
+def test_revenue_keyword(router):
+    intent = router.extract("Doanh thu 500 triệu thì phải nộp thuế bao nhiêu?")
+    assert intent["revenue"] == 500_000_000
+    assert intent["business_type_assumed"]
+
+def test_business_type_without_revenue_keyword(router):
+    intent = router.extract("Quán ăn 300 triệu một năm nộp thuế bao nhiêu?")
+    assert intent["revenue"] == 300_000_000
+    assert intent["business_type"] == "food_service"
+
+def test_monthly_revenue_and_expenses(router):
+    intent = router.extract("Cửa hàng tạp hóa doanh thu 50 triệu/tháng, chi phí 30 triệu thì nộp thuế bao nhiêu?")
+    assert intent["revenue"] == 600_000_000
+    assert intent["expenses"] == 360_000_000
+    assert intent["business_type"] == "retail"
+
+def test_expense_before_revenue(router):
+    intent = router.extract("Chi phí 100 triệu, doanh thu 1 tỷ 200 triệu nộp thuế bao nhiêu")
+    assert intent["revenue"] == 1_200_000_000
+    assert intent["expenses"] == 100_000_000
+
+def test_year_is_not_an_amount(router):
+    intent = router.extract("Năm 2024 doanh thu 400 triệu phải nộp thuế bao nhiêu?")
+    assert intent["revenue"] == 400_000_000
+
+def test_exempt_answer_shows_only_the_license_fee(router):
+    answer = router.answer("Doanh thu 80 triệu một năm nộp thuế bao nhiêu?")["answer"]
+    assert "không vượt ngưỡng" in answer
+    assert "Chỉ nộp lệ phí môn bài: 1.000.000 VNĐ/năm" in answer
+    assert "Thuế GTGT:" not in answer
+
+def test_taxable_answer(router):
+    answer = router.answer("Bán lẻ doanh thu 500 triệu nộp thuế bao nhiêu?")["answer"]
+    assert "Thuế GTGT: 500.000.000 VNĐ × 2% = 10.000.000 VNĐ" in answer
+    assert "Thuế TNCN: 500.000.000 VNĐ × 1% = 5.000.000 VNĐ" in answer
+    assert "Tổng cộng: 18.000.000 VNĐ/năm" in answer
@@ -0,0 +1,82 @@
+from datetime import date
+
+import pytest
+
+from conftest import image_bytes
+from db.models import Invoice, InvoiceType
+
+@pytest.fixture(autouse=True)
+def search_available(app):
+    if not app.invoice_search.available:
+        pytest.skip("SQLite without FTS5")
+
+def add_invoice(db, user_id, seller_name, items=()):
+    invoice = Invoice(invoice_type=InvoiceType.PURCHASE, date=date(2024, 5, 6), total=1, user_id=user_id,
+                      seller_name=seller_name, items=[{"name": name, "quantity": 1, "unit_price": 1, "amount": 1} for name in items])
+    db.add(invoice)
+    db.commit()
+    return invoice
+
+def search(client, headers, q):
+    response = client.get("/api/invoices/search", params={"q": q}, headers=headers)
+    assert response.status_code == 200
+    return [hit["id"] for hit in response.json()]
+
+def test_finds_sellers_without_accents_and_by_prefix(client, auth_headers, db, user):
+    invoice = add_invoice(db, user.id, "Quán Phở Bò Đồng Xuân")
+
+    for q in ("pho bo", "PHỞ BÒ", "dong xuan", "Đồng Xu", "quan ph"):
+        assert search(client, auth_headers, q) == [invoice.id], q
+    assert search(client, auth_headers, "pho ga") == []
+
+def test_seller_hits_rank_above_item_hits(client, auth_headers, db, user):
+    by_item = add_invoice(db, user.id, "Tạp hoá Lan", items=["Bún chả Hàng Mành"])
+    by_seller = add_invoice(db, user.id, "Bún chả Hàng Mành")
+
+    assert search(client, auth_headers, "bun cha hang manh") == [by_seller.id, by_item.id]
+
+def test_edits_reindex_the_invoice(client, auth_headers, db, user):
+    invoice = add_invoice(db, user.id, "Nhà sách Kim Đồng")
+
+    invoice.seller_name = "Văn phòng phẩm Hồng Hà"
+    db.commit()
+    assert search(client, auth_headers, "kim dong") == []
+    assert search(client, auth_headers, "hong ha") == [invoice.id]
+
+    invoice.items = [{"name": "Bút bi Thiên Long", "quantity": 1, "unit_price": 5000, "amount": 5000}]
+    db.commit()
+    assert search(client, auth_headers, "thien long") == [invoice.id]
+
+def test_deleted_and_rolled_back_invoices_are_not_found(client, auth_headers, db, user):
+    invoice = add_invoice(db, user.id, "Điện máy Xanh Lá")
+    db.delete(invoice)
+    db.commit()
+    assert search(client, auth_headers, "xanh la") == []
+
+    db.add(Invoice(invoice_type=InvoiceType.PURCHASE, date=date(2024, 5, 6), total=1, user_id=user.id,
+                   seller_name="Nhà thuốc Long Châu"))
+    db.flush()
+    db.rollback()
+    assert search(client, auth_headers, "long chau") == []
+
+def test_only_own_and_unowned_invoices_are_found(client, auth_headers, db, user):
+    from db.user_model import User
+    other = User(email="other-search@example.vn", name="Other")
+    db.add(other)
+    db.commit()
+    add_invoice(db, other.id, "Siêu thị Co.opmart Cống Quỳnh")
+    unowned = add_invoice(db, None, "Siêu thị Co.opmart Cống Quỳnh")
+    try:
+        assert search(client, auth_headers, "cong quynh") == [unowned.id]
+    finally:
+        # Unowned invoices show up in every user's lists
+        db.delete(unowned)
+        db.commit()
+
+def test_ocr_text_of_uploads_is_searchable(client, auth_headers, fake_ocr):
+    fake_ocr.text = fake_ocr.text.replace("Tổng cộng", "Bánh cuốn Thanh Vân\nTổng cộng")
+    response = client.post("/api/invoices/upload", files={"file": ("receipt.png", image_bytes(), "image/png")},
+                           headers=auth_headers)
+    assert response.status_code == 200
+
+    assert search(client, auth_headers, "banh cuon thanh van") == [response.json()["id"]]
@@ -0,0 +1,84 @@
+from datetime import date
+
+from db.models import Invoice, InvoiceLineItem, InvoiceType
+
+ITEMS = [
+    {"name": "Cà Phê Sữa (ly)", "quantity": 2, "unit_price": 25000, "amount": 50000},
+    {"name": "  ", "quantity": 1, "unit_price": 1000, "amount": 1000},
+    {"name": "Bánh mì", "quantity": 1, "unit_price": "20000", "amount": 20000},
+]
+
+def rows(db, invoice_id):
+    return (
+        db.query(InvoiceLineItem)
+        .filter(InvoiceLineItem.invoice_id == invoice_id)
+        .order_by(InvoiceLineItem.position)
+        .all()
+    )
+
+def add_invoice(db, user, **fields):
+    invoice = Invoice(invoice_type=InvoiceType.PURCHASE, date=date(2024, 5, 6), total=70000,
+                      user_id=user.id, items=ITEMS, **fields)
+    db.add(invoice)
+    db.commit()
+    return invoice
+
+def test_insert_writes_one_row_per_named_item(db, user):
+    invoice = add_invoice(db, user)
+
+    items = rows(db, invoice.id)
+    assert [(item.position, item.name, item.name_normalized) for item in items] == [
+        (0, "Cà Phê Sữa (ly)", "ca phe sua ly"), (2, "Bánh mì", "banh mi")
+    ]
+    assert items[1].unit_price == 20000.0
+    assert all(item.user_id == user.id and item.date == date(2024, 5, 6) for item in items)
+    assert all(item.category for item in items)
+
+def test_changed_items_and_copied_columns_rewrite_the_rows(db, user):
+    invoice = add_invoice(db, user)
+
+    invoice.items = [{"name": "Nước cam", "quantity": 3, "unit_price": 15000, "amount": 45000}]
+    db.commit()
+    assert [item.name for item in rows(db, invoice.id)] == ["Nước cam"]
+
+    invoice.date = date(2024, 6, 1)
+    invoice.invoice_type = InvoiceType.SALE
+    db.commit()
+    db.expire_all()
+    assert [(item.date, item.invoice_type) for item in rows(db, invoice.id)] == [(date(2024, 6, 1), InvoiceType.SALE)]
+
+def test_other_changes_leave_the_rows_alone(db, user):
+    invoice = add_invoice(db, user)
+    ids = [item.id for item in rows(db, invoice.id)]
+
+    invoice.seller_name = "Cửa hàng khác"
+    db.commit()
+    assert [item.id for item in rows(db, invoice.id)] == ids
+
+def test_delete_removes_the_rows(db, user):
+    invoice = add_invoice(db, user)
+    invoice_id = invoice.id
+
+    db.delete(invoice)
+    db.commit()
+    assert rows(db, invoice_id) == []
+
+def test_rollback_discards_the_rows(db, user):
+    invoice = Invoice(invoice_type=InvoiceType.PURCHASE, date=date(2024, 5, 6), total=1, user_id=user.id, items=ITEMS)
+    db.add(invoice)
+    db.flush()
+    invoice_id = invoice.id
+    assert rows(db, invoice_id)
+
+    db.rollback()
+    assert rows(db, invoice_id) == []
+
+def test_reviewed_items_reach_the_item_report(client, auth_headers, db, user):
+    invoice = add_invoice(db, user)
+    response = client.post(f"/api/invoices/{invoice.id}/review", headers=auth_headers, json={
+        "items": [{"name": "Trà đá", "quantity": 10, "unit_price": 5000, "amount": 50000}]
+    })
+    assert response.status_code == 200
+
+    top = client.get("/api/reports/items/top", params={"order_by": "quantity"}, headers=auth_headers).json()
+    assert [(item["name"], item["quantity"]) for item in top] == [("Trà đá", 10.0)]
@@ -0,0 +1,67 @@
+from PIL import Image
+
+from conftest import image_bytes
+
+QR_DATA = {
+    "invoice_number": "C24TAA-123",
+    "date": "2024-05-06",
+    "total": 77000.0,
+    "seller_tax_code": "0101234567",
+}
+
+class FakeQRDecoder:
+    def decode(self, image_path):
+        return dict(QR_DATA), "found", 1.0
+
+class FakeEngine:
+    def __init__(self, text):
+        self.text = text
+        self.sizes = []
+
+    def __call__(self, image_path):
+        with Image.open(image_path) as image:
+            self.sizes.append(image.size)
+        return ([self.text] if self.text else []), []
+
+def upload(tmp_path, size):
+    path = tmp_path / "receipt.png"
+    path.write_bytes(image_bytes(size=size))
+    return str(path)
+
+def qr_service(app, monkeypatch, *engines):
+    service = app.ocr_service
+    monkeypatch.setattr(service.orchestrator, "engines", lambda: list(engines))
+    monkeypatch.setattr(service, "qr_decoder", FakeQRDecoder())
+    return service
+
+def test_qr_runs_only_the_preferred_engine_on_a_downscaled_copy(app, monkeypatch, tmp_path):
+    from conftest import RECEIPT_TEXT
+    from services.ocr.ocr_service import QR_OCR_MAX_SIDE
+    vision, tesseract = FakeEngine(RECEIPT_TEXT), FakeEngine(RECEIPT_TEXT)
+    service = qr_service(app, monkeypatch, ("google_vision", vision), ("tesseract", tesseract))
+
+    invoice = service.parse_document(upload(tmp_path, (QR_OCR_MAX_SIDE * 2, 400)))
+
+    assert len(vision.sizes) == 1 and tesseract.sizes == []
+    assert max(vision.sizes[0]) == QR_OCR_MAX_SIDE
+    assert invoice["extraction"]["path"] == "qr+single_engine"
+    assert [engine["engine"] for engine in invoice["extraction"]["engines"]] == ["google_vision"]
+    # The QR code's fields win over what OCR read
+    assert invoice["invoice_number"] == QR_DATA["invoice_number"]
+    assert invoice["seller_tax_code"] == QR_DATA["seller_tax_code"]
+    assert invoice["seller_name"]
+    assert "escalations" not in invoice["extraction"]
+
+def test_qr_without_ocr_text_is_queued_for_review(app, monkeypatch, tmp_path):
+    vision, tesseract = FakeEngine(""), FakeEngine("unused")
+    service = qr_service(app, monkeypatch, ("google_vision", vision), ("tesseract", tesseract))
+
+    invoice = service.parse_document(upload(tmp_path, (240, 320)))
+
+    # No fallback to the next engine: the QR fields are kept and a person fills in the rest
+    assert tesseract.sizes == []
+    assert invoice["extraction"]["path"] == "qr_only"
+    assert invoice["extraction"]["review"] is True
+    assert invoice["total"] == QR_DATA["total"]
+    assert invoice["items"] == []
+    assert invoice["ocr_output"]["qr"] == QR_DATA
@@ -0,0 +1,39 @@
+import json
+from datetime import date
+
+from api import serialization
+from api.schemas import InvoiceResponse
+from db.models import Invoice, InvoiceType
+
+def make_invoice(db, user):
+    invoice = Invoice(
+        invoice_type=InvoiceType.PURCHASE, invoice_number="0001234", seller_name="Cà phê Sữa Đá",
+        date=date(2024, 5, 6), subtotal=50_000, vat=5_000, total=55_000, user_id=user.id,
+        items=[{"name": "Cà phê sữa", "quantity": 2, "unit_price": 25_000, "amount": 50_000}]
+    )
+    db.add(invoice)
+    db.commit()
+    return invoice
+
+def test_orjson_is_installed():
+    # requirements.txt installs it; without it every list endpoint takes the slow fallback
+    assert serialization.ORJSON_AVAILABLE
+
+def test_fallback_encoder_renders_the_same_json(monkeypatch):
+    content = [{"date": date(2024, 5, 6), "type": InvoiceType.SALE, "name": "Phở bò", "total": 55000.0, "items": None}]
+    fast = serialization.FastJSONResponse(content).body
+    monkeypatch.setattr(serialization, "ORJSON_AVAILABLE", False)
+    slow = serialization.FastJSONResponse(content).body
+    assert json.loads(fast) == json.loads(slow) == [
+        {"date": "2024-05-06", "type": "SALE", "name": "Phở bò", "total": 55000.0, "items": None}
+    ]
+
+def test_trusted_rows_match_the_validated_response(client, db, user, auth_headers, monkeypatch):
+    invoice = make_invoice(db, user)
+    trusted = client.get("/api/invoices", headers=auth_headers).json()
+
+    monkeypatch.setattr(serialization, "TRUSTED_SERIALIZATION", False)
+    validated = client.get("/api/invoices", headers=auth_headers).json()
+    assert trusted == validated
+    assert [row["id"] for row in trusted] == [invoice.id]
+    assert InvoiceResponse.model_validate(trusted[0]).items[0].name == "Cà phê sữa"
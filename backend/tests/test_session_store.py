@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from db.chat_model import ChatMessage, ChatSession
+from db.database import SessionLocal
+from services.chatbot.session_store import ChatSessionStore
+
+@pytest.fixture
+def store():
+    return ChatSessionStore(history_turns=3)
+
+def test_concurrent_turns_keep_both_increments(store, db, user):
+    session = store.get_or_create(db, None, user.id)
+    other = SessionLocal()
+    try:
+        # Both requests loaded the session before either recorded its turn
+        same_session = store.get(other, session.id, user.id)
+        assert same_session.message_count == 0
+        store.record_turn(db, session, "Câu hỏi 1", "Trả lời 1")
+        store.record_turn(other, same_session, "Câu hỏi 2", "Trả lời 2")
+    finally:
+        other.close()
+    db.refresh(session)
+    assert session.message_count == 4
+    assert session.title == "Câu hỏi 1"
+
+def test_context_is_capped_when_compaction_never_runs(store, db, user):
+    session = store.get_or_create(db, None, user.id)
+    for turn in range(20):
+        store.record_turn(db, session, f"Câu hỏi {turn}", f"Trả lời {turn}")
+    assert store.needs_compaction(session)
+
+    summary, history = store.get_context(db, session)
+    assert summary is None
+    assert len(history) == store.max_context_messages
+    assert history[-2:] == [("user", "Câu hỏi 19"), ("assistant", "Trả lời 19")]
+
+def test_compaction_folds_all_but_the_window(store, db, user):
+    session = store.get_or_create(db, None, user.id)
+    for turn in range(5):
+        store.record_turn(db, session, f"Câu hỏi {turn}", f"Trả lời {turn}")
+
+    async def summarize(summary, messages):
+        return f"{len(messages)} tin nhắn"
+
+    asyncio.run(store.compact(session.id, summarize))
+    db.refresh(session)
+    summary, history = store.get_context(db, session)
+    assert summary == "4 tin nhắn"
+    assert len(history) == store.history_turns * 2
+    assert session.summarized_count == 4
+    assert not store.needs_compaction(session)
+
+def test_sessions_are_bound_to_their_owner(store, db, user):
+    owned = store.get_or_create(db, None, user.id)
+    assert store.get(db, owned.id, user.id + 1000) is None
+    assert store.get(db, owned.id, None, token="anything") is None
+
+    anonymous = store.get_or_create(db, None, None)
+    assert anonymous.token
+    assert store.get(db, anonymous.id, None) is None
+    assert store.get(db, anonymous.id, user.id) is None
+    assert store.get(db, anonymous.id, None, token=anonymous.token).id == anonymous.id
@@ -0,0 +1,118 @@
+import hashlib
+
+import pytest
+
+from conftest import image_bytes
+from db.models import StoredFile
+from services.storage.backends import LocalStorageBackend, S3StorageBackend, StorageBackend
+from services.storage.upload_store import UploadStore
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+BUCKET = "receipts"
+
+@pytest.fixture
+def s3_backend(monkeypatch):
+    """S3StorageBackend against moto's in-process S3, standing in for MinIO"""
+    for name, value in {"AWS_ACCESS_KEY_ID": "test", "AWS_SECRET_ACCESS_KEY": "test",
+                        "AWS_DEFAULT_REGION": "us-east-1"}.items():
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield S3StorageBackend(bucket=BUCKET, prefix="uploads/", region="us-east-1")
+
+@pytest.fixture(params=["local", "s3"])
+def backend(request, tmp_path):
+    if request.param == "local":
+        return LocalStorageBackend(root=tmp_path / "store")
+    return request.getfixturevalue("s3_backend")
+
+def write(tmp_path, data, name="file.bin"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+    class Incomplete(StorageBackend):
+        def exists(self, key):
+            return False
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_backend_contract(backend, tmp_path):
+    data = b"%PDF-1.4 receipt"
+    local = write(tmp_path, data)
+    backend.put_file("ab/cd/abcd", local, "application/pdf")
+    assert backend.exists("ab/cd/abcd")
+    assert backend.size("ab/cd/abcd") == len(data)
+    with backend.open("ab/cd/abcd") as stream:
+        assert stream.read() == data
+    with backend.local_path("ab/cd/abcd") as path, open(path, "rb") as f:
+        assert f.read() == data
+    assert backend.key_for(backend.uri("ab/cd/abcd")) == "ab/cd/abcd"
+    assert backend.key_for("s3://elsewhere/x") is None
+
+    backend.move("ab/cd/abcd", "ef/gh/efgh")
+    assert not backend.exists("ab/cd/abcd")
+    assert backend.exists("ef/gh/efgh")
+    backend.delete("ef/gh/efgh")
+    backend.delete("ef/gh/efgh")
+    assert not backend.exists("ef/gh/efgh")
+
+def test_s3_presigned_post(s3_backend):
+    target = s3_backend.presign_upload("incoming/1/abc", "image/png", 1024, 60)
+    assert target["fields"]["key"] == "uploads/incoming/1/abc"
+    assert target["fields"]["Content-Type"] == "image/png"
+
+def test_s3_finalize_reads_the_object_once(s3_backend, tmp_path, db, monkeypatch):
+    store = UploadStore(backend=s3_backend, tmp_dir=tmp_path)
+    data = image_bytes(seed="finalize")
+    upload = store.presign(7, "image/png", len(data))
+    incoming = store.incoming_key(7, upload["upload_id"])
+    s3_backend.client.put_object(Bucket=BUCKET, Key=s3_backend._key(incoming), Body=data)
+
+    downloads = []
+    original_local_path = s3_backend.local_path
+    monkeypatch.setattr(s3_backend, "local_path", lambda key: downloads.append(key) or original_local_path(key))
+    monkeypatch.setattr(s3_backend, "open", lambda key: pytest.fail("finalize streamed the object through the API"))
+
+    with store.finalize(db, 7, upload["upload_id"]) as stored:
+        with store.local_path(stored) as path, open(path, "rb") as f:
+            assert f.read() == data
+    db.commit()
+
+    assert downloads == [incoming]
+    assert stored.sha256 == hashlib.sha256(data).hexdigest()
+    assert s3_backend.exists(stored.key) and not s3_backend.exists(incoming)
+    assert db.get(StoredFile, stored.sha256).path == f"s3://{BUCKET}/uploads/{stored.key}"
+
+def test_local_direct_upload_and_finalize(client, auth_headers, user, fake_ocr):
+    data = image_bytes(seed="direct")
+    upload = client.post("/api/uploads/presign", json={"content_type": "image/png", "size": len(data)},
+                         headers=auth_headers).json()
+    response = client.post(upload["url"] or "/api/uploads/content", data=upload["fields"],
+                           files={"file": ("receipt.png", data, "image/png")})
+    assert response.status_code == 204
+
+    response = client.post(f"/api/uploads/{upload['upload_id']}/finalize", json={}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["total"] == 77000
+    assert fake_ocr.calls == 1
+
+def test_ocr_failure_deletes_the_stored_file(app, client, db, auth_headers, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("OCR engine crashed")
+
+    monkeypatch.setattr(app.ocr_service, "parse_document", broken)
+    data = image_bytes(seed="ocr-failure")
+    sha256 = hashlib.sha256(data).hexdigest()
+    with pytest.raises(RuntimeError):
+        client.post("/api/invoices/upload", files={"file": ("receipt.png", data, "image/png")}, headers=auth_headers)
+
+    assert db.get(StoredFile, sha256) is None
+    assert not app.upload_store.backend.exists(app.upload_store.key_for(sha256))
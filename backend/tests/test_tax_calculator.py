@@ -0,0 +1,40 @@
+import pytest
+
+from services.tax_engine.tax_calculator import TaxEngine
+
+@pytest.fixture(scope="module")
+def engine():
+    return TaxEngine()
+
+@pytest.mark.parametrize("revenue", [0, 50_000_000, 100_000_000])
+def test_no_vat_or_pit_at_or_below_the_threshold(engine, revenue):
+    tax = engine.calculate_tax(revenue, 0, "retail", 2024)["estimated_tax"]
+    assert tax["vat"] == 0 and tax["pit"] == 0
+    assert tax["total"] == tax["license_fee"]
+
+def test_vat_and_pit_on_the_whole_revenue_above_the_threshold(engine):
+    tax = engine.calculate_tax(100_000_001, 0, "retail", 2024)["estimated_tax"]
+    assert tax["vat"] == pytest.approx(2_000_000.02)
+    assert tax["pit"] == pytest.approx(1_000_000.01)
+
+def test_calculate_endpoint_exempt(client):
+    response = client.post("/api/tax/calculate", json={
+        "revenue": 100_000_000, "expenses": 0, "business_type": "food_service", "tax_year": 2024
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["estimated_tax"] == {"vat": 0.0, "pit": 0.0, "license_fee": 2_000_000.0, "total": 2_000_000.0}
+    assert any("không phải nộp thuế GTGT, TNCN" in note for note in body["notes"])
+
+def test_calculate_endpoint_taxable(client):
+    response = client.post("/api/tax/calculate", json={
+        "revenue": 400_000_000, "expenses": 0, "business_type": "food_service", "tax_year": 2024
+    })
+    assert response.status_code == 200
+    assert response.json()["estimated_tax"] == {
+        "vat": 10_000_000.0, "pit": 6_000_000.0, "license_fee": 3_000_000.0, "total": 19_000_000.0
+    }
+
+def test_calculate_endpoint_without_a_rule_for_the_year(client):
+    response = client.post("/api/tax/calculate", json={"revenue": 1, "expenses": 0, "tax_year": 2000})
+    assert response.status_code == 400
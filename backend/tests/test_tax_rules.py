@@ -0,0 +1,54 @@
+import pytest
+import yaml
+
+from services.tax_engine import tax_calculator
+from services.tax_engine.rules import TaxRuleError, compile_rules
+from services.tax_engine.tax_calculator import DEFAULT_RULES, TaxEngine
+
+def rule_file(threshold, enterprise_threshold):
+    raw = {
+        **DEFAULT_RULES,
+        "enterprise_threshold": enterprise_threshold,
+        "business_types": {
+            "retail": [{"effective_from": "2021-01-01", "vat_rate": 0.02, "pit_rate": 0.01, "threshold": threshold}]
+        },
+        "default_business_type": "retail",
+    }
+    return yaml.safe_dump(raw)
+
+def test_periods_are_read_only():
+    rules = compile_rules(DEFAULT_RULES)
+    with pytest.raises(TypeError):
+        rules.periods["retail"] = rules.periods["food_service"]
+    with pytest.raises(TypeError):
+        del rules.periods["retail"]
+
+def test_enterprise_threshold_is_validated():
+    with pytest.raises(TaxRuleError):
+        compile_rules({**DEFAULT_RULES, "enterprise_threshold": -1})
+    assert compile_rules({**DEFAULT_RULES, "enterprise_threshold": 2e9}).enterprise_threshold == 2e9
+
+def test_advice_follows_the_loaded_rules(tmp_path, monkeypatch):
+    monkeypatch.setattr(tax_calculator, "TAX_RULES_RELOAD_INTERVAL", 0)
+    path = tmp_path / "tax_rules.yaml"
+    path.write_text(rule_file(threshold=150_000_000, enterprise_threshold=3_000_000_000))
+    engine = TaxEngine(path)
+
+    assert engine.get_rule_advice(120_000_000, 0)[0].startswith("✅ Doanh thu không quá 150,000,000 VNĐ")
+    assert engine.get_rule_advice(2_500_000_000, 0)[0].startswith("📊")
+
+    # Hot reload: a lower threshold and enterprise threshold change the advice without a restart
+    path.write_text(rule_file(threshold=100_000_000, enterprise_threshold=2_000_000_000) + "\n")
+    assert engine.get_rule_advice(120_000_000, 0)[0].startswith("📊")
+    assert engine.get_rule_advice(2_500_000_000, 0)[0] == "⚠️ Doanh thu từ 2,000,000,000 VNĐ trở lên - cần chuyển thành doanh nghiệp"
+
+def test_advice_uses_the_business_type_threshold(tmp_path):
+    raw = {**DEFAULT_RULES, "business_types": {
+        **DEFAULT_RULES["business_types"],
+        "service": [{"effective_from": "2021-01-01", "vat_rate": 0.05, "pit_rate": 0.02, "threshold": 200_000_000}],
+    }}
+    path = tmp_path / "tax_rules.yaml"
+    path.write_text(yaml.safe_dump(raw))
+    engine = TaxEngine(path)
+    assert engine.get_rule_advice(150_000_000, 0, "service")[0].startswith("✅")
+    assert engine.get_rule_advice(150_000_000, 0, "retail")[0].startswith("📊")
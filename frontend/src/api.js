@@ -27,15 +27,40 @@ api.interceptors.response.use(
 );
 
 export const invoiceAPI = {
-  upload: (file) => {
+  // A duplicate of an existing invoice is rejected with 409 (detail.duplicate_of) unless allowDuplicate is set
+  upload: (file, allowDuplicate = false) => {
     const formData = new FormData();
     formData.append('file', file);
+    formData.append('allow_duplicate', allowDuplicate);
     return api.post('/api/invoices/upload', formData, {
       headers: { 'Content-Type': 'multipart/form-data' }
     });
   },
+  // Browser -> storage directly (S3/MinIO presigned POST, or this API when stored locally), then OCR
+  uploadDirect: async (file, businessType, allowDuplicate = false) => {
+    const { data: target } = await api.post('/api/uploads/presign', { content_type: file.type, size: file.size });
+    const formData = new FormData();
+    Object.entries(target.fields).forEach(([name, value]) => formData.append(name, value));
+    formData.append('file', file);
+    const url = target.url.startsWith('/') ? `${API_URL}${target.url}` : target.url;
+    await axios.post(url, formData);
+    return api.post(`/api/uploads/${target.upload_id}/finalize`, { business_type: businessType, allow_duplicate: allowDuplicate });
+  },
+  importEInvoice: (file, invoiceType = 'PURCHASE', allowDuplicate = false) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('invoice_type', invoiceType);
+    formData.append('allow_duplicate', allowDuplicate);
+    return api.post('/api/invoices/einvoice', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' }
+    });
+  },
   getAll: () => api.get('/api/invoices'),
-  getById: (id) => api.get(`/api/invoices/${id}`)
+  search: (q, limit = 20, offset = 0) => api.get('/api/invoices/search', { params: { q, limit, offset } }),
+  getById: (id) => api.get(`/api/invoices/${id}`),
+  delete: (id) => api.delete(`/api/invoices/${id}`),
+  getReviewQueue: () => api.get('/api/invoices/review'),
+  review: (id, corrections = {}) => api.post(`/api/invoices/${id}/review`, corrections)
 };
 
 export const expenseAPI = {
@@ -44,15 +69,24 @@ export const expenseAPI = {
 };
 
 export const taxAPI = {
-  calculate: (data) => api.post('/api/tax/calculate', data)
+  calculate: (data) => api.post('/api/tax/calculate', data),
+  getLiability: (year, quarter) => api.get('/api/tax/liability', { params: { year, quarter } })
 };
 
 export const reportAPI = {
-  getSummary: () => api.get('/api/reports/summary')
+  getSummary: () => api.get('/api/reports/summary'),
+  getTopItems: (params) => api.get('/api/reports/items/top', { params }),
+  getSpendByCategory: (params) => api.get('/api/reports/items/categories', { params })
+};
+
+export const dashboardAPI = {
+  get: () => api.get('/api/dashboard')
 };
 
 export const chatbotAPI = {
-  ask: (question) => api.post('/api/chatbot/ask', { question }),
+  ask: (question, sessionId, sessionToken) => api.post('/api/chatbot/ask', { question, session_id: sessionId, session_token: sessionToken }),
+  getSessions: (beforeId) => api.get('/api/chatbot/sessions', { params: { before_id: beforeId } }),
+  getMessages: (sessionId, beforeId) => api.get(`/api/chatbot/sessions/${sessionId}/messages`, { params: { before_id: beforeId } }),
   getAdvice: (data) => api.post('/api/chatbot/advice', data)
 };
 
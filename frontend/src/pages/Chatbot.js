@@ -9,6 +9,8 @@ function Chatbot() {
   const [messages, setMessages] = useState([]);
   const [question, setQuestion] = useState('');
   const [loading, setLoading] = useState(false);
+  const [sessionId, setSessionId] = useState(null);
+  const [sessionToken, setSessionToken] = useState(null);
   const [suggestedQuestions, setSuggestedQuestions] = useState([
     "Doanh thu 200 triệu/năm phải nộp bao nhiêu thuế?",
     "Chi phí nào được khấu trừ?",
@@ -31,7 +33,9 @@ function Chatbot() {
     setLoading(true);
     
     try {
-      const res = await chatbotAPI.ask(q);
+      const res = await chatbotAPI.ask(q, sessionId, sessionToken);
+      setSessionId(res.data.session_id);
+      setSessionToken(res.data.session_token);
       setMessages(prev => [...prev, { 
         type: 'bot', 
         text: res.data.answer, 
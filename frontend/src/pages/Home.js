@@ -1,19 +1,21 @@
 import React, { useEffect, useState } from 'react';
-import { reportAPI } from '../api';
+import { dashboardAPI } from '../api';
 import { Link } from 'react-router-dom';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '../components/ui/card';
 import { FaFileInvoice, FaMoneyBill, FaChartLine, FaCoins, FaCamera, FaWallet, FaCalculator, FaComments } from 'react-icons/fa';
 
 function Home() {
-  const [summary, setSummary] = useState(null);
+  const [dashboard, setDashboard] = useState(null);
 
   useEffect(() => {
-    reportAPI.getSummary().then(res => setSummary(res.data)).catch(console.error);
+    dashboardAPI.get().then(res => setDashboard(res.data)).catch(console.error);
   }, []);
 
+  const summary = dashboard?.counts;
+
   const stats = summary ? [
-    { icon: FaFileInvoice, label: 'Hóa đơn', value: summary.total_invoices, color: 'text-cyan-400', bg: 'bg-cyan-500/10', border: 'border-cyan-500/20' },
-    { icon: FaMoneyBill, label: 'Chi phí', value: summary.total_expenses, color: 'text-emerald-400', bg: 'bg-emerald-500/10', border: 'border-emerald-500/20' },
+    { icon: FaFileInvoice, label: 'Hóa đơn', value: summary.invoices, color: 'text-cyan-400', bg: 'bg-cyan-500/10', border: 'border-cyan-500/20' },
+    { icon: FaMoneyBill, label: 'Chi phí', value: summary.expenses, color: 'text-emerald-400', bg: 'bg-emerald-500/10', border: 'border-emerald-500/20' },
     { icon: FaChartLine, label: 'Doanh thu', value: `${(summary.revenue / 1000000).toFixed(1)}M`, color: 'text-purple-400', bg: 'bg-purple-500/10', border: 'border-purple-500/20' },
     { icon: FaCoins, label: 'Lợi nhuận', value: `${(summary.profit / 1000000).toFixed(1)}M`, color: 'text-orange-400', bg: 'bg-orange-500/10', border: 'border-orange-500/20' },
   ] : [];
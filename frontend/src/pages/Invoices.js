@@ -24,7 +24,7 @@ function Invoices() {
     
     setLoading(true);
     try {
-      await invoiceAPI.upload(file);
+      await invoiceAPI.uploadDirect(file);
       setMessage('Upload thành công!');
       setFile(null);
       loadInvoices();
@@ -57,7 +57,7 @@ function Invoices() {
               <label className="text-sm font-medium text-slate-300">Chọn file ảnh</label>
               <input 
                 type="file" 
-                accept="image/*" 
+                accept="image/*,application/pdf" 
                 onChange={(e) => setFile(e.target.files[0])} 
                 className="flex h-10 w-full rounded-md border border-slate-600 bg-slate-700/50 px-3 py-2 text-sm text-slate-300 file:border-0 file:bg-transparent file:text-sm file:font-medium file:text-cyan-400 hover:file:text-cyan-300"
               />